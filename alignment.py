@@ -4,55 +4,43 @@ import io
 import re
 import tempfile
 import platform
-from Bio import AlignIO
-from visualization import format_newick_string
+from newick import format_newick_string
+from profiling import span
+from compact_alignment import CompactAlignment
 
-def run_clustalw(fasta_file):
-    # Create temporary file for alignment output
-    with tempfile.NamedTemporaryFile(suffix='.aln', delete=False) as temp_aln:
-        output_file_path = temp_aln.name
+BIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin")
+
+# Executable names per platform for each external tool
+EXECUTABLES = {
+    "ClustalW": {"Windows": "clustalw2.exe", "Linux": "clustalw2"},
+    "MUSCLE": {"Windows": "muscle3.8.31_i86win32.exe", "Linux": "muscle3.8.31_i86linux64"},
+    "FastTree": {"Windows": os.path.join(BIN_DIR, "FastTree"), "Linux": os.path.join(BIN_DIR, "FastTree")},
+}
+
+# guide_tree_source of the Progressive engine and of MUSCLE results
+PROGRESSIVE_TREE = "k-mer distances, UPGMA (built-in)"
+FASTTREE_TREE = "FastTree on the alignment"
+
+def get_executable(tool):
+    """Return the executable name of an external tool for the current platform."""
     try:
-        # ClustalW will create the guide tree file with .dnd extension in the same location as input
-        guide_tree_file = os.path.splitext(fasta_file)[0] + '.dnd'
-
-        print(f"ClustalW alignment file created: {output_file_path}")
-        print(f"ClustalW guide tree file expected: {guide_tree_file}")
-
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        if platform.system() == 'Windows':
-            # On Windows, use the Windows-specific executable
-            clustalw2 = "clustalw2.exe"
-        elif platform.system() == 'Linux':
-            # On Linux, use the Linux-specific executable
-            clustalw2 = "clustalw2"
-        else:
-            raise ValueError("Unsupported operating system")
-        
-        #clustalw2 = os.path.join(script_dir, r"bin\clustalw2")
-        command = f"{clustalw2} -INFILE={fasta_file} -OUTFILE={output_file_path}"
-        print(f"Running command: {command}")
-    
-        subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {e}")
+        return EXECUTABLES[tool][platform.system()]
+    except KeyError:
+        raise ValueError("Unsupported operating system")
 
-    if os.path.exists(output_file_path):
-        with open(output_file_path, "r") as file:
-            alignment_data = io.StringIO(file.read())
-        
-        alignment = AlignIO.read(alignment_data, "clustal")
+def run_clustalw(fasta_file, timeout=None):
+    """Align with ClustalW in an isolated working directory (see clustalw.py).
 
-        # Check if guide tree was created and is not empty
-        if os.path.exists(guide_tree_file) and os.path.getsize(guide_tree_file) > 0:
-            return alignment, output_file_path, guide_tree_file
-        else:
-            print("Warning: Guide tree file was not created or is empty")
-            return alignment, output_file_path, None
-    else:
-        print("Error: Alignment output file was not created.")
+    Returns (alignment, output_file_path, guide_tree_file), or (None, None, None)
+    when ClustalW is missing or fails.
+    """
+    result = _run_pipeline("ClustalW", fasta_file, timeout=timeout)
+    if result is None:
         return None, None, None
+    output_file, guide_tree_file = result.materialize()
+    return result.alignment.to_alignment(), output_file, guide_tree_file
 
-def run_muscle(fasta_file):
+def run_muscle(fasta_file, timeout=None):
     # Create temporary files for MUSCLE alignment output
     with tempfile.NamedTemporaryFile(suffix='.aln', delete=True) as temp_aln:
         output_file_path = temp_aln.name
@@ -61,27 +49,21 @@ def run_muscle(fasta_file):
 
     try:
         # Determine the platform (Windows or Linux)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        if platform.system() == 'Windows':
-            # On Windows, use the Windows-specific executable
-            muscle_exe = "muscle3.8.31_i86win32.exe"
-        elif platform.system() == 'Linux':
-            # On Linux, use the Linux-specific executable
-            muscle_exe = "muscle3.8.31_i86linux64"
-            #
-        else:
-            raise ValueError("Unsupported operating system")
+        muscle_exe = get_executable("MUSCLE")
 
         print(f"Using MUSCLE executable: {muscle_exe}")
         
         # Run the MUSCLE command
         command = [muscle_exe, '-in', fasta_file, '-out', output_file_path]
-        result = subprocess.run(command, capture_output=True, text=True)
+        with span("muscle.subprocess"):
+            result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
         
         if result.returncode == 0 and os.path.isfile(output_file_path):
             with open(output_file_path, "r") as file:
                 alignment_data = io.StringIO(file.read())
-            alignment = AlignIO.read(alignment_data, "fasta")
+            with span("alignio.parse", format="fasta"):
+                from Bio import AlignIO
+                alignment = AlignIO.read(alignment_data, "fasta")
             return alignment, output_file_path
         else:
             print("Error running MUSCLE:", result.stderr)
@@ -91,15 +73,16 @@ def run_muscle(fasta_file):
         # Files will be cleaned up after the app is done using them
         pass
 
-def generate_tree_with_fasttree(alignment_file):
+def generate_tree_with_fasttree(alignment_file, timeout=None):
     guide_tree_file = re.sub(r"\.aln$", ".dnd", alignment_file)
     print(f"FastTree guide tree file created: {guide_tree_file}")
     
     # Set path to FastTree executable (adjust as needed)
-    fasttree_exe = r"bin\FastTree"  # Replace with full path if FastTree is not in PATH
+    fasttree_exe = get_executable("FastTree")
 
     command = [fasttree_exe, "-out", guide_tree_file, alignment_file]
-    result = subprocess.run(command, capture_output=True, text=True)
+    with span("fasttree.subprocess"):
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
     
     if result.returncode == 0 and os.path.isfile(guide_tree_file):
         return guide_tree_file
@@ -107,27 +90,163 @@ def generate_tree_with_fasttree(alignment_file):
         print("Error generating guide tree:", result.stderr)
         return None
 
-def run_alignment(algorithm, fasta_file):
+class AlignmentResult:
+    """Everything one alignment job produced, parsed once and held in memory.
+
+    ``alignment_text`` and ``tree_text`` are the raw aligner and (formatted)
+    guide tree outputs; ``alignment`` is the parsed alignment stored as a
+    CompactAlignment (use ``to_alignment()`` for Biopython objects) and
+    ``tree`` the Bio.Phylo tree, parsed on first access. ``query`` is an
+    alignment_query.AlignmentIndex for column-range and sequence-subset
+    queries, built on first access. ``guide_tree_source`` describes how the
+    guide tree was built (e.g. which ClustalW guide tree was used), or is
+    None when unknown. Files are only written when a caller needs paths,
+    via ``materialize()``.
+    """
+
+    def __init__(self, algorithm, alignment, alignment_text, alignment_format,
+                 tree_text=None, output_file=None, guide_tree_file=None, guide_tree_source=None):
+        self.algorithm = algorithm
+        self.alignment = CompactAlignment.coerce(alignment)
+        self.alignment_text = alignment_text
+        self.alignment_format = alignment_format
+        self.tree_text = tree_text
+        self.output_file = output_file
+        self.guide_tree_file = guide_tree_file
+        self.guide_tree_source = guide_tree_source
+        # Set by prefilter.align_clustered: reduction factor and time savings
+        self.prefilter_stats = None
+        self._tree = None
+        self._query = None
+
+    @property
+    def tree(self):
+        if self._tree is None and self.tree_text:
+            from Bio import Phylo
+            with span("phylo.parse"):
+                self._tree = Phylo.read(io.StringIO(self.tree_text), "newick")
+        return self._tree
+
+    @property
+    def query(self):
+        # Rebuilt if the alignment was replaced (e.g. by its on-disk store)
+        if self._query is None or self._query.alignment is not self.alignment:
+            from alignment_query import AlignmentIndex
+            with span("alignment_index"):
+                self._query = AlignmentIndex(self.alignment)
+        return self._query
+
+    def materialize(self):
+        """Write the alignment and tree to temporary files if not on disk yet; return their paths."""
+        if self.output_file is None:
+            with tempfile.NamedTemporaryFile(suffix='.aln', delete=False, mode="w") as temp_aln:
+                temp_aln.write(self.alignment_text)
+                self.output_file = temp_aln.name
+        if self.guide_tree_file is None and self.tree_text:
+            self.guide_tree_file = os.path.splitext(self.output_file)[0] + '.dnd'
+            with open(self.guide_tree_file, "w") as f:
+                f.write(self.tree_text)
+        return self.output_file, self.guide_tree_file
+
+def _parse_alignment(alignment_text, alignment_format):
+    with span("alignio.parse", format=alignment_format):
+        from Bio import AlignIO
+        return AlignIO.read(io.StringIO(alignment_text), alignment_format)
+
+def run_muscle_stream(fasta_file, timeout=None):
+    """Run MUSCLE with its alignment streamed over stdout. Returns the FASTA text or None."""
+    muscle_exe = get_executable("MUSCLE")
+    command = [muscle_exe, '-in', fasta_file, '-quiet']
+    with span("muscle.subprocess"):
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    if result.returncode == 0 and result.stdout.strip():
+        return result.stdout
+    print("Error running MUSCLE:", result.stderr)
+    return None
+
+def fasttree_from_text(alignment_text, timeout=None):
+    """Pipe an alignment into FastTree's stdin and return the Newick tree from its stdout."""
+    command = [get_executable("FastTree"), '-quiet']
+    with span("fasttree.subprocess"):
+        result = subprocess.run(command, input=alignment_text, capture_output=True, text=True, timeout=timeout)
+    if result.returncode == 0 and result.stdout.strip():
+        return result.stdout
+    print("Error generating guide tree:", result.stderr)
+    return None
+
+def load_cached_result(cache, cache_key, algorithm):
+    """Return the cached AlignmentResult for ``cache_key``, or None on a miss."""
+    with span("cache.lookup"):
+        cached = cache.load(cache_key)
+    if not cached:
+        return None
+    print(f"Using cached {algorithm} result: {cache_key}")
+    alignment = _parse_alignment(cached["alignment_text"], cached["format"])
+    return AlignmentResult(algorithm, alignment, cached["alignment_text"], cached["format"],
+                           tree_text=cached["tree_text"], guide_tree_source=cached["guide_tree_source"])
+
+def run_pipeline(algorithm, fasta_file, cache=None, cache_key=None, timeout=None, cluster_threshold=None):
+    """Align ``fasta_file`` and build its guide tree. Returns an AlignmentResult or None.
+
+    ``cache`` is a result_cache.ResultCache; ``cache_key`` can be passed when the
+    caller already computed it with ``cache.key_for``. ``timeout`` (seconds) applies
+    to each external process and raises subprocess.TimeoutExpired when exceeded.
+    ``cluster_threshold`` (0..1) enables the k-mer prefilter in prefilter.py.
+    """
+    if cache is not None:
+        cache_key = cache_key or cache.key_for(fasta_file, algorithm, cluster_threshold)
+        cached = load_cached_result(cache, cache_key, algorithm)
+        if cached:
+            return cached
+
+    with span("run_alignment", algorithm=algorithm):
+        if cluster_threshold is None:
+            result = _run_pipeline(algorithm, fasta_file, timeout)
+        else:
+            from prefilter import align_clustered
+            result = align_clustered(algorithm, fasta_file, cluster_threshold, cache=cache, timeout=timeout)
+    if cache is not None and result is not None:
+        cache.put(cache_key, algorithm, alignment_text=result.alignment_text, tree_text=result.tree_text,
+                  guide_tree_source=result.guide_tree_source)
+    return result
+
+def _run_pipeline(algorithm, fasta_file, timeout=None):
     if algorithm == "ClustalW":
-        alignment, output_file, guide_tree_file = run_clustalw(fasta_file)
-        if guide_tree_file:
-            with open(guide_tree_file, 'r') as f:
-                tree_str = f.read()
-                formatted_tree = format_newick_string(tree_str)
-                # Write the formatted tree back to file
-                with open(guide_tree_file, 'w') as f:
-                    f.write(formatted_tree)
-        return alignment, output_file, guide_tree_file
+        from clustalw import run_clustalw_job
+        alignment_text, tree_text, guide_tree_source = run_clustalw_job(fasta_file, timeout=timeout)
+        if alignment_text is None:
+            return None
+        alignment = _parse_alignment(alignment_text, "clustal")
+        return AlignmentResult(algorithm, alignment, alignment_text, "clustal",
+                               tree_text=format_newick_string(tree_text) if tree_text else None,
+                               guide_tree_source=guide_tree_source)
+    elif algorithm == "Progressive":
+        # Built-in engine: runs in-process, so there is no subprocess to time out
+        from Bio import SeqIO
+        from progressive import progressive_align
+        records = list(SeqIO.parse(fasta_file, "fasta"))
+        if len(records) < 2:
+            print("Error: progressive alignment needs at least two sequences.")
+            return None
+        alignment, newick = progressive_align(records)
+        return AlignmentResult(algorithm, alignment, format(alignment, "fasta"), "fasta",
+                               tree_text=format_newick_string(newick), guide_tree_source=PROGRESSIVE_TREE)
     elif algorithm == "MUSCLE":
-        alignment, output_file = run_muscle(fasta_file)
-        if alignment:
-            guide_tree_file = generate_tree_with_fasttree(output_file)
-            if guide_tree_file:
-                with open(guide_tree_file, 'r') as f:
-                    tree_str = f.read()
-                    formatted_tree = format_newick_string(tree_str)
-                    # Write the formatted tree back to file
-                    with open(guide_tree_file, 'w') as f:
-                        f.write(formatted_tree)
-            return alignment, output_file, guide_tree_file
-        return alignment, output_file, None
+        alignment_text = run_muscle_stream(fasta_file, timeout=timeout)
+        if alignment_text is None:
+            return None
+        alignment = _parse_alignment(alignment_text, "fasta")
+        tree_text = fasttree_from_text(alignment_text, timeout=timeout)
+        if tree_text:
+            tree_text = format_newick_string(tree_text)
+        return AlignmentResult(algorithm, alignment, alignment_text, "fasta", tree_text=tree_text,
+                               guide_tree_source=FASTTREE_TREE if tree_text else None)
+
+def run_alignment(algorithm, fasta_file, cache=None, cache_key=None, timeout=None, cluster_threshold=None):
+    """File-based wrapper around run_pipeline: returns (alignment, output_file, guide_tree_file)."""
+    result = run_pipeline(algorithm, fasta_file, cache=cache, cache_key=cache_key, timeout=timeout,
+                          cluster_threshold=cluster_threshold)
+    if result is None:
+        return None, None, None
+    output_file, guide_tree_file = result.materialize()
+    return result.alignment.to_alignment(), output_file, guide_tree_file
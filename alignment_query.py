@@ -0,0 +1,164 @@
+"""Column-range and sequence-subset queries over a computed alignment.
+
+An AlignmentIndex keeps, for every sequence, the number of residues before
+every ``CHECKPOINT_COLUMNS``-th column (cumulative non-gap counts). Mapping a
+residue number to its alignment column, or a column to the residues before
+it, then reads one checkpoint and scans at most one checkpoint interval,
+and sub-alignments, identity and similarity matrices and conservation
+scores only touch the selected rows and columns:
+
+    index = alignment_result.query
+    start, stop = index.residue_range_to_columns("P69905", 10, 60)
+    window = index.sub_alignment(["P69905", "P68871"], (start, stop))
+    index.identity_matrix(["P69905", "P68871"], (start, stop))
+    index.similarity_matrix(["P69905", "P68871"], (start, stop), "PAM250")
+    index.conservation((start, stop))
+"""
+import numpy as np
+from benchmark import identity_rows
+from column_profile import ColumnProfile
+from compact_alignment import GAP_CODE, CompactAlignment, row_tiles
+from similarity import DEFAULT_MATRIX, similarity_rows
+
+CHECKPOINT_COLUMNS = 64
+
+
+class AlignmentIndex:
+    """Residue/column index of an alignment (CompactAlignment, MemmapAlignment or MultipleSeqAlignment).
+
+    ``profile`` (the alignment's ColumnProfile) and ``identity_matrix`` (its
+    full percent identity matrix) are used when given, so that queries over
+    all sequences, or over all columns, slice them instead of recounting.
+    Rows are selected by sequence ID or row number; residue positions and
+    columns are 0-based, ranges are (start, stop) with ``stop`` excluded.
+    """
+
+    def __init__(self, alignment, profile=None, identity_matrix=None):
+        self.alignment = CompactAlignment.coerce(alignment)
+        self.profile = profile
+        self.identity = None
+        if identity_matrix is not None:
+            self.set_identity_matrix(identity_matrix)
+        self.row_of = {record_id: row for row, record_id in enumerate(self.alignment.ids)}
+        data = self.alignment.data
+        boundaries = np.arange(0, data.shape[1], CHECKPOINT_COLUMNS)
+        # checkpoints[i, j]: residues of sequence i before column j * CHECKPOINT_COLUMNS
+        self.checkpoints = np.zeros((data.shape[0], len(boundaries) + 1), dtype=np.int32)
+        for start, stop in row_tiles(*data.shape):
+            if len(boundaries):
+                per_interval = np.add.reduceat((np.asarray(data[start:stop]) != GAP_CODE).astype(np.int32),
+                                               boundaries, axis=1)
+                np.cumsum(per_interval, axis=1, out=self.checkpoints[start:stop, 1:])
+
+    def set_identity_matrix(self, identity_matrix):
+        """Use the alignment's full identity matrix (nested lists, array or np.memmap) for row subsets."""
+        if isinstance(identity_matrix, np.ndarray):
+            self.identity = identity_matrix
+        else:
+            self.identity = np.array(identity_matrix, dtype=np.float64)
+
+    @property
+    def nbytes(self):
+        """Bytes held in memory; an np.memmap identity matrix stays on disk."""
+        in_memory = self.identity is not None and not isinstance(self.identity, np.memmap)
+        return self.checkpoints.nbytes + (self.identity.nbytes if in_memory else 0)
+
+    def rows(self, selection=None):
+        """Row numbers of ``selection`` (sequence IDs and/or row numbers; None means every row).
+
+        Raises ValueError for unknown IDs or row numbers out of range.
+        """
+        if selection is None:
+            return np.arange(len(self.alignment))
+        rows = []
+        for item in selection:
+            if isinstance(item, str):
+                if item not in self.row_of:
+                    raise ValueError(f"Unknown sequence: {item}")
+                rows.append(self.row_of[item])
+            else:
+                if not 0 <= item < len(self.alignment):
+                    raise ValueError(f"Row {item} out of range")
+                rows.append(int(item))
+        return np.array(rows, dtype=np.int64)
+
+    def _columns(self, columns):
+        length = self.alignment.get_alignment_length()
+        if columns is None:
+            return 0, length
+        start, stop = columns
+        if not 0 <= start <= stop <= length:
+            raise ValueError(f"Column range {start}..{stop} outside 0..{length}")
+        return int(start), int(stop)
+
+    def _block(self, rows, columns):
+        """(rows, start, stop, data) of a selection; data is a view when every row is selected."""
+        start, stop = self._columns(columns)
+        if rows is None:
+            return self.rows(), start, stop, self.alignment.data[:, start:stop]
+        rows = self.rows(rows)
+        return rows, start, stop, np.asarray(self.alignment.data[rows, start:stop])
+
+    def residue_count(self, row):
+        """Number of residues of a sequence."""
+        return int(self.checkpoints[self.rows([row])[0], -1])
+
+    def residues_before(self, column, rows=None):
+        """Residues of each selected sequence in the columns before ``column``, as an int64 array."""
+        rows = self.rows(rows)
+        column = self._columns((column, column))[0]
+        checkpoint = column // CHECKPOINT_COLUMNS
+        partial = np.asarray(self.alignment.data[rows, checkpoint * CHECKPOINT_COLUMNS:column]) != GAP_CODE
+        return self.checkpoints[rows, checkpoint].astype(np.int64) + partial.sum(axis=1)
+
+    def column_of(self, row, position):
+        """Alignment column of residue ``position`` of a sequence; raises IndexError past its end."""
+        row = self.rows([row])[0]
+        counts = self.checkpoints[row]
+        if not 0 <= position < counts[-1]:
+            raise IndexError(f"Residue {position} outside 0..{counts[-1]} of {self.alignment.ids[row]}")
+        # Last checkpoint with no more than ``position`` residues before it
+        checkpoint = int(np.searchsorted(counts, position, side="right")) - 1
+        start = checkpoint * CHECKPOINT_COLUMNS
+        residues = np.flatnonzero(self.alignment.data[row, start:start + CHECKPOINT_COLUMNS] != GAP_CODE)
+        return start + int(residues[position - counts[checkpoint]])
+
+    def residue_range_to_columns(self, row, start, stop):
+        """Columns (start, stop) spanning residues ``start``..``stop`` of a sequence."""
+        if not start < stop:
+            raise ValueError(f"Empty residue range {start}..{stop}")
+        return self.column_of(row, start), self.column_of(row, stop - 1) + 1
+
+    def sub_alignment(self, rows=None, columns=None):
+        """CompactAlignment of the selected rows (in selection order) and columns."""
+        rows, _, _, data = self._block(rows, columns)
+        return CompactAlignment(data, [self.alignment.ids[i] for i in rows],
+                                [self.alignment.descriptions[i] for i in rows])
+
+    def identity_matrix(self, rows=None, columns=None):
+        """Percent identity matrix of the selected sequences over the selected columns.
+
+        Sliced from the full matrix when one was given and every column is
+        selected, otherwise computed from the selection alone.
+        """
+        if self.identity is not None and (columns is None or self._columns(columns) == self._columns(None)):
+            rows = self.rows(rows)
+            return np.asarray(self.identity[np.ix_(rows, rows)])
+        _, _, _, data = self._block(rows, columns)
+        return identity_rows(data, 0, data.shape[0])
+
+    def similarity_matrix(self, rows=None, columns=None, matrix=DEFAULT_MATRIX):
+        """Percent similarity matrix (positive ``matrix`` score) of the selected sequences over the selected columns."""
+        _, _, _, data = self._block(rows, columns)
+        return similarity_rows(data, 0, data.shape[0], matrix)
+
+    def column_profile(self, columns=None, rows=None):
+        """ColumnProfile of the selected columns, counted over the selected sequences only."""
+        start, stop = self._columns(columns)
+        if rows is None and self.profile is not None:
+            return self.profile.region(start, stop)
+        return ColumnProfile.from_encoded(self._block(rows, columns)[3])
+
+    def conservation(self, columns=None, rows=None, method="groups"):
+        """Per-column conservation scores of a region by one of column_profile.CONSERVATION_METHODS."""
+        return self.column_profile(columns, rows).scores(method)
@@ -0,0 +1,172 @@
+"""Memory-mapped on-disk store for alignments too large to hold in memory.
+
+An aligned FASTA or Clustal file is converted, in two streaming passes, into
+
+    <store>.npy   (N, L) uint8 matrix of ASCII codes, gaps as '-'
+    <store>.json  index: record IDs, descriptions, shape and the byte offset
+                  of every record's row inside the .npy file
+
+Opening the store gives a MemmapAlignment, a CompactAlignment whose buffer
+is a read-only np.memmap. ColumnProfile.from_encoded, iter_identity_blocks
+and the output_manager renderer all work through it in tiles, so peak memory
+follows the tile size rather than the alignment size:
+
+    store = convert_to_store("aligned.aln", "clustal", "family")
+    profile = ColumnProfile.from_encoded(store.data)
+    identity = store.identity_matrix()
+"""
+import glob
+import json
+import os
+import numpy as np
+from compact_alignment import GAP_CODE, CompactAlignment
+from profiling import span, timed
+
+
+class MemmapAlignment(CompactAlignment):
+    """A CompactAlignment backed by a store on disk instead of a heap buffer."""
+
+    def __init__(self, store_path):
+        with open(store_path + ".json") as f:
+            index = json.load(f)
+        super().__init__(np.load(store_path + ".npy", mmap_mode="r"), index["ids"], index["descriptions"])
+        self.store_path = store_path
+        self.record_offsets = index["record_offsets"]
+
+    def identity_matrix(self, block_size=256):
+        """Percent identity matrix as a memmap in ``<store>.identity.npy``, computed once."""
+        from benchmark import identity_matrix_from_encoded
+
+        path = self.store_path + ".identity.npy"
+        if os.path.exists(path):
+            return np.load(path, mmap_mode="r")
+        out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float64, shape=(len(self), len(self)))
+        identity_matrix_from_encoded(self.data, block_size=block_size, out=out)
+        out.flush()
+        del out
+        os.replace(path + ".tmp", path)
+        return np.load(path, mmap_mode="r")
+
+    def similarity_matrix(self, matrix="BLOSUM62", block_size=256):
+        """Percent similarity matrix as a memmap in ``<store>.similarity.<matrix>.npy``, computed once."""
+        from similarity import similarity_matrix_from_encoded
+
+        path = f"{self.store_path}.similarity.{matrix}.npy"
+        if os.path.exists(path):
+            return np.load(path, mmap_mode="r")
+        out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float64, shape=(len(self), len(self)))
+        similarity_matrix_from_encoded(self.data, matrix, block_size=block_size, out=out)
+        out.flush()
+        del out
+        os.replace(path + ".tmp", path)
+        return np.load(path, mmap_mode="r")
+
+
+def _iter_fasta_rows(path):
+    """Yield (id, description, sequence line) for each line of sequence in an aligned FASTA file."""
+    record_id = description = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                description = line[1:]
+                record_id = description.split(None, 1)[0] if description else ""
+                yield record_id, description, None
+            elif line and record_id is not None:
+                yield record_id, description, line
+
+
+def _iter_clustal_rows(path):
+    """Yield (id, id, sequence chunk) for each sequence line of an interleaved Clustal file."""
+    with open(path) as f:
+        for line in f:
+            # Skip the header, blank lines and the indented conservation lines
+            if not line.strip() or line[0].isspace() or line.startswith(("CLUSTAL", "MUSCLE")):
+                continue
+            fields = line.split()
+            if len(fields) >= 2:
+                yield fields[0], fields[0], fields[1]
+
+
+def _scan(rows, is_fasta):
+    """First pass: record order, IDs, descriptions and the alignment length."""
+    ids, descriptions, lengths = [], [], {}
+    for record_id, description, chunk in rows:
+        if is_fasta and chunk is None:
+            ids.append(record_id)
+            descriptions.append(description)
+            lengths[len(ids) - 1] = 0
+        elif is_fasta:
+            lengths[len(ids) - 1] += len(chunk)
+        else:
+            if record_id not in lengths:
+                ids.append(record_id)
+                descriptions.append(description)
+                lengths[record_id] = 0
+            lengths[record_id] += len(chunk)
+    return ids, descriptions, max(lengths.values(), default=0)
+
+
+@timed("alignment_store.convert")
+def convert_to_store(alignment_file, alignment_format, store_path):
+    """Convert an aligned FASTA or Clustal file into a memory-mapped store and open it.
+
+    The file is read twice, line by line, and rows are written straight into
+    the memmap, so the alignment is never held in memory as a whole. Rows
+    shorter than the longest one are padded with gaps.
+    """
+    if alignment_format not in ("fasta", "clustal"):
+        raise ValueError(f"Unsupported alignment format: {alignment_format}")
+    is_fasta = alignment_format == "fasta"
+    iter_rows = _iter_fasta_rows if is_fasta else _iter_clustal_rows
+
+    with span("alignment_store.scan"):
+        ids, descriptions, length = _scan(iter_rows(alignment_file), is_fasta)
+    if not ids:
+        raise ValueError(f"No sequences found in {alignment_file}")
+
+    with span("alignment_store.write", num_sequences=len(ids), length=length):
+        data = np.lib.format.open_memmap(
+            store_path + ".npy", mode="w+", dtype=np.uint8, shape=(len(ids), length)
+        )
+        data[:] = GAP_CODE
+        row_of = {record_id: i for i, record_id in enumerate(ids)}
+        filled = [0] * len(ids)
+        row = -1
+        for record_id, _, chunk in iter_rows(alignment_file):
+            if is_fasta and chunk is None:
+                row += 1
+                continue
+            if not is_fasta:
+                row = row_of[record_id]
+            encoded = chunk.encode("ascii", "replace")
+            data[row, filled[row]:filled[row] + len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+            filled[row] += len(encoded)
+        header_size = data.offset
+        data.flush()
+        del data
+
+    with open(store_path + ".json", "w") as f:
+        json.dump({
+            "source": os.path.abspath(alignment_file),
+            "format": alignment_format,
+            "shape": [len(ids), length],
+            "ids": ids,
+            "descriptions": descriptions,
+            "record_offsets": [header_size + i * length for i in range(len(ids))],
+        }, f)
+    return MemmapAlignment(store_path)
+
+
+def open_store(store_path):
+    """Open an existing store written by convert_to_store."""
+    return MemmapAlignment(store_path)
+
+
+def remove_store(store_path):
+    """Delete a store's files."""
+    for suffix in (".npy", ".json", ".identity.npy"):
+        if os.path.exists(store_path + suffix):
+            os.remove(store_path + suffix)
+    for path in glob.glob(glob.escape(store_path) + ".similarity.*.npy"):
+        os.remove(path)
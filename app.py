@@ -2,213 +2,573 @@ import streamlit as st
 import os
 import tempfile
 import time
-from alignment import run_alignment
-from benchmark import evaluate_alignment
-from visualization import calculate_conservation_score, plot_guide_tree, plot_plotly_heatmap
-from output_manager import format_alignment_to_clustal_with_and_without_colors
+import numpy as np
+from alignment import run_pipeline
+from async_pipeline import run_pipeline_concurrent
+from compare import DEFAULT_ENGINES as COMPARED_ENGINES, run_comparison
+from result_cache import get_default_cache
+from fasta_io import FastaValidationError, iter_chunks, stream_fasta
+from benchmark import evaluate_records
+from visualization import calculate_conservation_score, plot_guide_tree, plot_plotly_heatmap, plot_plotly_tree
+from newick import clades_at_depth, parse_newick
+from column_profile import ColumnProfile
+from conservation_pyramid import ConservationPyramid
+from similarity import column_sp_scores
+from memo import ArtifactMemo
+from alignment_query import AlignmentIndex
+from alignment_store import MemmapAlignment, convert_to_store
+from output_manager import LINE_WIDTH, iter_identity_rows, render_alignment_window
+from exporters import (
+    open_output, write_clustal, write_fasta, write_identity_matrix, write_identity_npz, write_phylip,
+    write_stockholm, write_text_view, write_tree,
+)
+import profiling
+from profiling import span
 
 st.title("Multiple Protein Sequence Alignment App")
 
-if 'example_input' not in st.session_state:
-    st.session_state.example_input = ""
-if 'input_file_name' not in st.session_state:
-    st.session_state.input_file_name = ""
-if 'sequence_input' not in st.session_state:
-    st.session_state.sequence_input = ""
-
-if st.button("Use Example"):
-    example_file_path = r"temp_sequences.fasta" 
-    with open(example_file_path, "r") as example_file:
-        st.session_state.example_input = example_file.read()
-    st.session_state.sequence_input = st.session_state.example_input 
-
-with st.form("alignment_form"):
-    uploaded_file = st.file_uploader("Upload your FASTA file", type=["fasta", "fa"])
-    
-    # Text area uses the value from session state for persistence
-    sequence_input = st.text_area(
-        "Or type your protein sequences here (in FASTA format):", 
-        height=150, 
-        value=st.session_state.sequence_input
-    )
-    
-    algorithm = st.radio(
-        "Select Alignment Algorithm", 
-        ["ClustalW", "MUSCLE"],
-        help='ClustalW: Reliable but slower for large datasets.\n\nMUSCLE: Faster and more accurate, ideal for large sequences.'
-    )
-
-    submit_button = st.form_submit_button("Run Alignment")
-
-# After form submission, process alignment
-if submit_button:
-    st.session_state["overall_start_time"] = time.time()
-    
-    # Store text input back to session state to ensure persistence
-    st.session_state.sequence_input = sequence_input
-
-    # Save sequence data to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".fa", mode="w") as tmp_file:
+# Window shown by default in the Tool Output tab; rendered while the guide tree is built
+DEFAULT_COLUMNS = 10 * LINE_WIDTH
+DEFAULT_SEQUENCES = 100
+
+COMPARE_MODE = "Compare MUSCLE vs ClustalW"
+# Result Files downloads: label -> (extension, streaming writer)
+EXPORT_ALIGNMENT_FORMATS = {
+    "Clustal view (text)": ("aln", write_text_view),
+    "Clustal": ("clustal.aln", lambda alignment, handle, profile: write_clustal(alignment, handle, profile)),
+    "FASTA": ("fasta", lambda alignment, handle, profile: write_fasta(alignment, handle)),
+    "Stockholm": ("sto", lambda alignment, handle, profile: write_stockholm(alignment, handle)),
+    "PHYLIP (relaxed)": ("phy", lambda alignment, handle, profile: write_phylip(alignment, handle, relaxed=True)),
+}
+EXPORT_MATRIX_FORMATS = {
+    "Text": ("txt", write_identity_matrix),
+    "TSV": ("tsv", lambda matrix, names, handle: write_identity_matrix(matrix, names, handle, "tsv")),
+    "NumPy (.npz)": ("npz", write_identity_npz),
+}
+# Heatmap and region summary scores: label -> ColumnProfile.scores method
+CONSERVATION_SCORES = {
+    "ClustalW groups": "groups",
+    "Shannon entropy": "entropy",
+    "Jensen–Shannon divergence": "jensen-shannon",
+}
+# Trees with more leaves than this show their Newick text collapsed and open as the WebGL view
+LARGE_TREE_LEAVES = 200
+
+# Every script run records its own stage timings; the submitting run's are kept for the Evaluation tab.
+# request() stops the profiler and resets the recorder however the run ends, including st.stop()
+with profiling.request("streamlit_run") as run_timings:
+    if 'example_input' not in st.session_state:
+        st.session_state.example_input = ""
+    if 'input_file_name' not in st.session_state:
+        st.session_state.input_file_name = ""
+    if 'sequence_input' not in st.session_state:
+        st.session_state.sequence_input = ""
+
+    if st.button("Use Example"):
+        example_file_path = r"temp_sequences.fasta" 
+        with open(example_file_path, "r") as example_file:
+            st.session_state.example_input = example_file.read()
+        st.session_state.sequence_input = st.session_state.example_input 
+
+    with st.form("alignment_form"):
+        uploaded_file = st.file_uploader("Upload your FASTA file", type=["fasta", "fa"])
+
+        # Text area uses the value from session state for persistence
+        sequence_input = st.text_area(
+            "Or type your protein sequences here (in FASTA format):", 
+            height=150, 
+            value=st.session_state.sequence_input
+        )
+
+        algorithm = st.radio(
+            "Select Alignment Algorithm", 
+            ["ClustalW", "MUSCLE", "Progressive", COMPARE_MODE],
+            help='ClustalW: Reliable but slower for large datasets.\n\nMUSCLE: Faster and more accurate, ideal for large sequences.'
+                 '\n\nProgressive: Built-in engine, no external binaries; fastest for small jobs.'
+                 '\n\nCompare: Runs MUSCLE and ClustalW at the same time and compares their results.'
+        )
+
+        use_prefilter = st.checkbox(
+            "Cluster similar sequences before aligning",
+            help="Aligns one representative per cluster of similar sequences, then adds the other "
+                 "members back by profile alignment. Much faster for large, redundant inputs."
+        )
+        cluster_identity = st.slider("Cluster identity threshold (%)", 50, 100, 90, step=5)
+
+        use_store = st.checkbox(
+            "Memory-map the alignment on disk",
+            help="For very large alignments: keeps the aligned sequences and identity matrix in files "
+                 "and processes them in tiles instead of holding them in memory."
+        )
+
+        submit_button = st.form_submit_button("Run Alignment")
+
+    # After form submission, process alignment
+    if submit_button:
+        st.session_state["overall_start_time"] = time.time()
+
+        # Store text input back to session state to ensure persistence
+        st.session_state.sequence_input = sequence_input
+
+        # Stream sequence data straight into a temporary file while validating it
         if uploaded_file is not None:
-            content = uploaded_file.read().decode("utf-8")
+            chunks = iter_chunks(uploaded_file)
             st.session_state.input_file_name = uploaded_file.name  
         elif sequence_input:  
-            content = sequence_input
+            chunks = [sequence_input.encode("utf-8")]
             st.session_state.input_file_name = "input_sequences.fasta"  
         else:
             st.warning("Please upload a file or enter sequences.")
             st.stop()
-        
-        # Validate FASTA format
-        content = content.strip()  
-        if not content.startswith('>'):
-            st.error("Invalid FASTA format. Sequences must start with '>'")
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".fa") as tmp_file:
+            input_file_path = tmp_file.name
+        try:
+            with span("fasta.validate"):
+                fasta_stats = stream_fasta(chunks, input_file_path)
+        except FastaValidationError as e:
+            os.remove(input_file_path)
+            st.error("Invalid FASTA input:\n\n" + "\n".join(f"- {message}" for message in e.errors))
             st.stop()
-            
-        tmp_file.write(content)
-        input_file_path = tmp_file.name
-
-    sequences = content.strip().split(">")
-    sequence_count = len([seq for seq in sequences if seq.strip()])
-    if sequence_count <= 1:
-        st.error("Only one sequence found. Please provide multiple sequences for alignment.")
-        st.stop()
-
-    alignment, output_file, guide_tree_file = run_alignment(algorithm, input_file_path)
-    
-    if alignment:
-        st.session_state["alignment"] = alignment
-        st.session_state["output_file"] = output_file
-        st.session_state["guide_tree_file"] = guide_tree_file
-        st.session_state["formatted_alignment"] = format_alignment_to_clustal_with_and_without_colors(alignment)
-        st.session_state["input_file_path"] = input_file_path 
-        st.session_state["conservation_scores"] = calculate_conservation_score(alignment)
-
-if "alignment" in st.session_state:
-    alignment = st.session_state["alignment"]
-    output_file = st.session_state["output_file"]
-    guide_tree_file = st.session_state["guide_tree_file"]
-    no_color, color = st.session_state["formatted_alignment"]
-    input_file_path = st.session_state["input_file_path"]
-    input_file_name = st.session_state.input_file_name  
-    conservation_scores = st.session_state["conservation_scores"]
-
-    tabs = st.tabs(["Tool Output", "Conserved Regions", "Dendrogram", "Evaluation Results", "Result Files"])
-
-    with tabs[0]:
-        st.header("Tool Output")
-        st.markdown("### Plain Text (No Color)")
-        st.markdown(f"```text\n{no_color}\n```", unsafe_allow_html=True)
-        st.markdown("### Color-Coded Alignment")
-        st.markdown(color, unsafe_allow_html=True)
-
-    # Conserved Regions Tab
-    with tabs[1]:
-        st.header("Conserved Regions")
-        evaluation_results = evaluate_alignment(algorithm, input_file_path)
-
-        # Identity Matrix Section
-        st.write("### Sequence Identity Matrix (%):")
-        matrix = evaluation_results['identity_matrix']
-        sequence_names = evaluation_results['sequence_names']
-        
-
-        
-        for i, row in enumerate(matrix):
-            row_str = f"{sequence_names[i][:10]:<10}"
-            for val in row:
-                row_str += f"{val:>10.1f}"
-            st.text(row_str)
-        
-        st.write("### Conservation Score Heatmap:")
-        plotly_fig = plot_plotly_heatmap(conservation_scores)
-        st.plotly_chart(plotly_fig)
-
-    with tabs[2]:
-        st.header("Dendrogram")
-        if guide_tree_file and os.path.exists(guide_tree_file):
-            with open(guide_tree_file, "r") as file:
-                guide_tree_content = file.read()
-            st.text("Phylogenetic Tree:")
-            st.markdown(f"```text\n{guide_tree_content}\n```", unsafe_allow_html=True)
-            guide_tree_fig = plot_guide_tree(guide_tree_file)
-            if guide_tree_fig:
-                st.text("Guide Tree:")
-                st.pyplot(guide_tree_fig)
+
+        if fasta_stats["record_count"] <= 1:
+            st.error("Only one sequence found. Please provide multiple sequences for alignment.")
+            st.stop()
+
+        result_cache = get_default_cache()
+        cluster_threshold = cluster_identity / 100 if use_prefilter else None
+        comparison = None
+        # One in-memory result (parsed alignment, tree text and tree object) shared by every tab
+        if algorithm == COMPARE_MODE:
+            # Both engines run concurrently; the tabs show the first one that succeeded
+            comparison = run_comparison(
+                input_file_path, COMPARED_ENGINES, cache=result_cache, cluster_threshold=cluster_threshold,
+                col_range=(0, DEFAULT_COLUMNS), seq_range=(0, DEFAULT_SEQUENCES)
+            )
+            for engine in comparison["comparison"]["engines"]:
+                if not engine["succeeded"]:
+                    st.warning(f"{engine['algorithm']} failed: {engine['error']}")
+            algorithm = next((engine for engine in COMPARED_ENGINES if comparison["outputs"][engine]),
+                             COMPARED_ENGINES[0])
+            cache_key = result_cache.key_for(input_file_path, algorithm, cluster_threshold)
+            outputs = comparison["outputs"][algorithm]
+            alignment_result = outputs["result"] if outputs else None
+            use_store = False
+        elif use_store:
+            cache_key = result_cache.key_for(input_file_path, algorithm, cluster_threshold)
+            # The analyses run later, over the on-disk store
+            outputs = None
+            alignment_result = run_pipeline(
+                algorithm, input_file_path, cache=result_cache, cache_key=cache_key,
+                cluster_threshold=cluster_threshold
+            )
         else:
-            st.write("Guide tree file not found.")
-
-    # Evaluation Results Tab
-    with tabs[3]:
-        overall_elapsed_time = (time.time() - st.session_state["overall_start_time"]) * 1000 
-        st.write("### Evaluation Results:")
-        st.write(f"**Algorithm Used:** {evaluation_results['algorithm']}")
-        st.write(f"**Overall Time (ms):** {overall_elapsed_time:.2f} ms")
-        st.write(f"**Total Sequences:** {evaluation_results['total_sequences']}")
-        st.write(f"**Total Length:** {evaluation_results['total_length']} characters")
-        # st.write(f"**Gap Count:** {evaluation_results['gap_count']}")
-
-    # Result Files Tab
-    with tabs[4]:  
-        st.header("Result Files")
-
-        if algorithm == "ClustalW":
-            aligned_sequences_file = "aligned_clustal.aln"
-            guide_tree_file_name = "guidetree_clustal.dnd"
-        else: 
-            aligned_sequences_file = "aligned_muscle.aln"
-            guide_tree_file_name = "guidetree_muscle.dnd"
-
-        matrix_content = "Sequence Identity Matrix (%)\n\n"
-        # Add header
-        matrix_content += "Sequence" + " " * 10
-        for i in range(len(sequence_names)):
-            matrix_content += f"{i+1:>10}"
-        matrix_content += "\n"
-        # Add rows
-        for i, row in enumerate(matrix):
-            row_str = f"{sequence_names[i][:10]:<10}"
-            for val in row:
-                row_str += f"{val:>10.1f}"
-            matrix_content += row_str + "\n"
-
-        output_files = [
-            ("Input File", input_file_name),
-            ("Aligned Sequences", aligned_sequences_file),
-            ("Identity Matrix", "identity_matrix.txt"),
-        ]
-        
-
-        if guide_tree_file and os.path.exists(guide_tree_file):
-            output_files.append(("Guide Tree", guide_tree_file_name))
-
-        for description, file_name in output_files:
-            col1, col2, col3 = st.columns([2, 4, 2])  
-
-            with col1:
-                st.write(description)
-            with col2:
-                st.markdown(f"<div style='text-align: center'>{file_name}</div>", unsafe_allow_html=True)
-            with col3:
-                if description == "Input File":
-                    data = open(input_file_path, "rb").read()
-                    mime = "text/plain"
-                elif description == "Aligned Sequences":
-                    data = no_color  
-                    mime = "text/plain"
-                elif description == "Guide Tree":
-                    data = open(guide_tree_file, "rb").read()
-                    mime = "text/plain"
-                elif description == "Identity Matrix":
-                    data = matrix_content
-                    mime = "text/plain"
+            cache_key = result_cache.key_for(input_file_path, algorithm, cluster_threshold)
+            # Tree, metrics, conservation and the first window are computed concurrently
+            outputs = run_pipeline_concurrent(
+                algorithm, input_file_path, cache=result_cache, cache_key=cache_key,
+                cluster_threshold=cluster_threshold,
+                col_range=(0, DEFAULT_COLUMNS), seq_range=(0, DEFAULT_SEQUENCES)
+            )
+            alignment_result = outputs["result"] if outputs else None
 
-                st.download_button(
-                    label="Download",
-                    data=data,
-                    file_name=os.path.basename(file_name),
-                    mime=mime
+        if alignment_result:
+            if use_store:
+                output_file, _ = alignment_result.materialize()
+                store_path = os.path.splitext(input_file_path)[0] + "_store"
+                alignment_result.alignment = convert_to_store(
+                    output_file, alignment_result.alignment_format, store_path
+                )
+            alignment = alignment_result.alignment
+            st.session_state["alignment_result"] = alignment_result
+            st.session_state["alignment"] = alignment
+            st.session_state["input_file_path"] = input_file_path 
+            st.session_state["cache_key"] = cache_key
+            st.session_state["fasta_stats"] = fasta_stats
+            st.session_state["pipeline_timings"] = run_timings
+            st.session_state["algorithm"] = algorithm
+            st.session_state["comparison"] = comparison
+            # Derived artifacts are memoized per alignment for the rest of the session
+            memo = st.session_state.setdefault("artifact_memo", ArtifactMemo())
+            fingerprint = cache_key + (":store" if use_store else "")
+            st.session_state["fingerprint"] = fingerprint
+            if outputs:
+                st.session_state["column_profile"] = outputs["column_profile"]
+                st.session_state["conservation_scores"] = outputs["conservation_scores"]
+                memo.put(fingerprint, "metrics", outputs["metrics"])
+                default_window = ((0, min(alignment.get_alignment_length(), DEFAULT_COLUMNS)),
+                                  (0, min(len(alignment), DEFAULT_SEQUENCES)))
+                memo.put(fingerprint, "window", outputs["rendered"], params=default_window)
+            else:
+                st.session_state["column_profile"] = ColumnProfile.from_alignment(alignment)
+                st.session_state["conservation_scores"] = calculate_conservation_score(
+                    alignment, profile=st.session_state["column_profile"]
                 )
 
-        if guide_tree_file and not os.path.exists(guide_tree_file):
-            st.write("Guide tree file not found.")
+    if "alignment" in st.session_state:
+        alignment = st.session_state["alignment"]
+        alignment_result = st.session_state["alignment_result"]
+        algorithm = st.session_state["algorithm"]
+        guide_tree_text = alignment_result.tree_text
+        input_file_path = st.session_state["input_file_path"]
+        input_file_name = st.session_state.input_file_name  
+        conservation_scores = st.session_state["conservation_scores"]
+        column_profile = st.session_state["column_profile"]
+        memo = st.session_state["artifact_memo"]
+        fingerprint = st.session_state["fingerprint"]
+
+        tabs = st.tabs(["Tool Output", "Conserved Regions", "Dendrogram", "Evaluation Results", "Result Files"])
+
+        with tabs[0]:
+            st.header("Tool Output")
+            alignment_length = alignment.get_alignment_length()
+            num_records = len(alignment)
+
+            index = memo.get_or_compute(fingerprint, "alignment_index",
+                                        lambda: AlignmentIndex(alignment, profile=column_profile))
+
+            # Only the selected window is rendered, so large alignments stay responsive
+            selected_ids = st.multiselect("Sequences to show (all when empty)", alignment.ids)
+            selected_rows = index.rows(selected_ids) if selected_ids else None
+            col_range = (0, alignment_length)
+            region_mode = st.radio("Select columns by", ["Alignment columns", "Residues of a sequence"],
+                                   horizontal=True)
+            if region_mode == "Residues of a sequence":
+                reference = st.selectbox("Reference sequence", selected_ids or alignment.ids)
+                residue_count = index.residue_count(reference)
+                residue_range = (1, residue_count)
+                if residue_count > 1:
+                    residue_range = st.slider("Residues", 1, residue_count,
+                                              (1, min(residue_count, DEFAULT_COLUMNS)))
+                col_range = index.residue_range_to_columns(reference, residue_range[0] - 1, residue_range[1])
+                st.caption(f"Residues {residue_range[0]}–{residue_range[1]} of {reference}: "
+                           f"alignment columns {col_range[0] + 1}–{col_range[1]}")
+            elif alignment_length > LINE_WIDTH:
+                col_range = st.slider(
+                    "Alignment columns", 0, alignment_length,
+                    (0, min(alignment_length, DEFAULT_COLUMNS)), step=LINE_WIDTH
+                )
+            seq_range = (0, num_records)
+            if selected_ids:
+                no_color_window, color_window = memo.get_or_compute(
+                    fingerprint, "window",
+                    lambda: tuple(
+                        render_alignment_window(alignment, color=color, col_range=col_range, profile=column_profile,
+                                                rows=selected_rows,
+                                                start_positions=index.residues_before(col_range[0], selected_rows))
+                        for color in (False, True)
+                    ),
+                    params=(tuple(col_range), ("rows",) + tuple(selected_ids)),
+                )
+            else:
+                if num_records > 2:
+                    seq_range = st.slider("Sequences", 0, num_records, (0, min(num_records, DEFAULT_SEQUENCES)))
+                no_color_window, color_window = memo.get_or_compute(
+                    fingerprint, "window",
+                    lambda: tuple(
+                        render_alignment_window(alignment, color=color, col_range=col_range, seq_range=seq_range,
+                                                profile=column_profile)
+                        for color in (False, True)
+                    ),
+                    params=(tuple(col_range), tuple(seq_range)),
+                )
+
+            st.markdown("### Plain Text (No Color)")
+            st.markdown(f"```text\n{no_color_window}\n```", unsafe_allow_html=True)
+            st.markdown("### Color-Coded Alignment")
+            st.markdown(color_window, unsafe_allow_html=True)
+
+        # Conserved Regions Tab
+        with tabs[1]:
+            st.header("Conserved Regions")
+            result_cache = get_default_cache()
+            on_disk = isinstance(alignment, MemmapAlignment)
+
+            def load_metrics():
+                metrics = None if on_disk else result_cache.get_metrics(st.session_state["cache_key"])
+                if metrics is None:
+                    with span("evaluate_alignment"):
+                        metrics = evaluate_records(algorithm, alignment)
+                    if not on_disk:
+                        result_cache.put_metrics(st.session_state["cache_key"], metrics)
+                return metrics
+
+            evaluation_results = memo.get_or_compute(fingerprint, "metrics", load_metrics)
+
+            # Identity / Similarity Matrix Section
+            substitution_matrix = evaluation_results['substitution_matrix']
+            matrix_kind = st.radio("Pairwise matrix", ["Identity", f"Similarity ({substitution_matrix})"],
+                                   horizontal=True)
+            matrix_key = 'identity_matrix' if matrix_kind == "Identity" else 'similarity_matrix'
+            st.write(f"### Sequence {matrix_kind.split(' ')[0]} Matrix (%):")
+            matrix = evaluation_results[matrix_key]
+            sequence_names = evaluation_results['sequence_names']
+            matrix_rows = (0, len(sequence_names))
+            if on_disk:
+                # Only the selected sequences are read from the on-disk matrix
+                matrix_rows = tuple(seq_range)
+                matrix_file = ("identity.npy" if matrix_key == 'identity_matrix'
+                               else f"similarity.{substitution_matrix}.npy")
+                st.caption(f"Sequences {seq_range[0] + 1}–{seq_range[1]} of {len(alignment)}; "
+                           f"full matrix: {alignment.store_path}.{matrix_file}")
+            if selected_ids:
+                # Subsets are sliced from the full matrix, or computed over the selected columns only
+                region_only = st.checkbox(f"Over alignment columns {col_range[0] + 1}–{col_range[1]} only")
+
+                def subset_matrix():
+                    if region_only and matrix_key == 'identity_matrix':
+                        return index.identity_matrix(selected_rows, col_range)
+                    if region_only:
+                        return index.similarity_matrix(selected_rows, col_range, substitution_matrix)
+                    full = memo.get_or_compute(fingerprint, "pairwise_array", lambda: np.asarray(matrix),
+                                               params=(matrix_key,))
+                    return full[np.ix_(selected_rows, selected_rows)]
+
+                identity_rows = memo.get_or_compute(
+                    fingerprint, "identity_rows",
+                    lambda: list(iter_identity_rows(subset_matrix(), list(selected_ids))),
+                    params=(matrix_key, ("rows",) + tuple(selected_ids), tuple(col_range) if region_only else None),
+                )
+            else:
+                identity_rows = memo.get_or_compute(
+                    fingerprint, "identity_rows",
+                    lambda: list(iter_identity_rows(
+                        np.asarray(matrix[matrix_rows[0]:matrix_rows[1], matrix_rows[0]:matrix_rows[1]]) if on_disk
+                        else matrix,
+                        sequence_names[matrix_rows[0]:matrix_rows[1]],
+                    )),
+                    params=(matrix_key,) + matrix_rows,
+                )
+            for row_str in identity_rows:
+                st.text(row_str)
+
+            conservation_label = st.selectbox("Conservation score", list(CONSERVATION_SCORES))
+            conservation_method = CONSERVATION_SCORES[conservation_label]
+
+            st.write("### Selected Region:")
+
+            def summarize_region():
+                region_profile = index.column_profile(col_range, selected_rows)
+                return region_profile.scores(conservation_method), column_sp_scores(region_profile, substitution_matrix)
+
+            region_scores, region_sp_scores = memo.get_or_compute(
+                fingerprint, "region_conservation", summarize_region,
+                params=(tuple(col_range), tuple(selected_ids), conservation_method),
+            )
+            st.table([
+                {"Metric": "Alignment columns", "Value": f"{col_range[0] + 1}–{col_range[1]}"},
+                {"Metric": "Sequences", "Value": len(selected_ids) if selected_ids else num_records},
+                {"Metric": f"Mean conservation ({conservation_label})",
+                 "Value": f"{np.mean(region_scores):.3f}" if len(region_scores) else "-"},
+                {"Metric": "Fully conserved columns", "Value": int(np.sum(np.asarray(region_scores) >= 1.0))},
+                {"Metric": f"Sum-of-pairs score ({substitution_matrix})", "Value": f"{region_sp_scores.sum():.0f}"},
+            ])
+
+            st.write("### Conservation Score Heatmap:")
+            if selected_ids:
+                st.caption(f"Conservation of the {len(selected_ids)} selected sequences")
+            heatmap_range = (0, alignment_length)
+            smoothing = 1
+            if alignment_length > LINE_WIDTH:
+                heatmap_range = st.slider("Heatmap columns", 0, alignment_length, (0, alignment_length))
+                smoothing = st.slider("Smoothing window (columns)", 1, min(alignment_length, 501), 1, step=2)
+            use_default_scores = not selected_ids and conservation_method == "groups"
+            pyramid = memo.get_or_compute(
+                fingerprint, "conservation_pyramid",
+                lambda: ConservationPyramid(conservation_scores if use_default_scores
+                                            else index.conservation(rows=selected_rows, method=conservation_method),
+                                            smoothing),
+                params=(smoothing, tuple(selected_ids), conservation_method),
+            )
+            plotly_fig = memo.get_or_compute(
+                fingerprint, "heatmap_figure",
+                lambda: plot_plotly_heatmap(pyramid, col_range=heatmap_range),
+                params=(smoothing, tuple(heatmap_range), tuple(selected_ids), conservation_method),
+            )
+            st.plotly_chart(plotly_fig)
+
+        with tabs[2]:
+            st.header("Dendrogram")
+            if guide_tree_text and alignment_result.guide_tree_source:
+                st.caption(f"Guide tree: {alignment_result.guide_tree_source}")
+            if guide_tree_text:
+                def summarize_tree():
+                    tree = parse_newick(guide_tree_text)
+                    return tree, len(tree.leaves()), max(tree.depths())
+
+                newick_tree, num_leaves, max_depth = memo.get_or_compute(fingerprint, "newick_tree", summarize_tree)
+                large_tree = num_leaves > LARGE_TREE_LEAVES
+                with st.expander(f"Phylogenetic Tree ({num_leaves} leaves)", expanded=not large_tree):
+                    st.markdown(f"```text\n{guide_tree_text}\n```", unsafe_allow_html=True)
+
+                view = st.radio("Tree view", ["Interactive", "Static"], index=0 if large_tree else 1, horizontal=True)
+                collapse_depth = 0
+                if max_depth > 1:
+                    collapse_depth = st.slider("Collapse clades below depth (0 shows every leaf)",
+                                               0, max_depth - 1, min(8, max_depth - 1) if large_tree else 0)
+                collapsed = clades_at_depth(newick_tree, collapse_depth) if collapse_depth else ()
+                plot_tree = plot_plotly_tree if view == "Interactive" else plot_guide_tree
+                guide_tree_fig = memo.get_or_compute(fingerprint, "tree_figure",
+                                                     lambda: plot_tree(newick_tree, collapsed),
+                                                     params=(view, collapse_depth))
+
+                st.text("Guide Tree:")
+                if view == "Interactive":
+                    st.plotly_chart(guide_tree_fig, use_container_width=True)
+                elif guide_tree_fig:
+                    st.pyplot(guide_tree_fig)
+            else:
+                st.write("Guide tree file not found.")
+
+        # Evaluation Results Tab
+        with tabs[3]:
+            overall_elapsed_time = (time.time() - st.session_state["overall_start_time"]) * 1000 
+            st.write("### Evaluation Results:")
+            st.write(f"**Algorithm Used:** {evaluation_results['algorithm']}")
+            st.write(f"**Overall Time (ms):** {overall_elapsed_time:.2f} ms")
+            st.write(f"**Total Sequences:** {evaluation_results['total_sequences']}")
+            st.write(f"**Total Length:** {evaluation_results['total_length']} characters")
+            fasta_stats = st.session_state["fasta_stats"]
+            st.write(f"**Input Residues:** {fasta_stats['total_residues']} "
+                     f"(sequence lengths {fasta_stats['min_length']}–{fasta_stats['max_length']})")
+            # st.write(f"**Gap Count:** {evaluation_results['gap_count']}")
+            st.write(f"**Sum-of-Pairs Score ({evaluation_results['substitution_matrix']}):** "
+                     f"{evaluation_results['sp_score']:.0f}")
+            prefilter_stats = alignment_result.prefilter_stats
+            if prefilter_stats:
+                st.write(f"**Prefilter:** {prefilter_stats['representatives']} representatives for "
+                         f"{prefilter_stats['input_sequences']} sequences "
+                         f"(reduction ×{prefilter_stats['reduction_factor']:.1f})")
+                if "estimated_saved_s" in prefilter_stats:
+                    st.write(f"**Estimated Time Saved:** {prefilter_stats['estimated_saved_s']:.2f} s "
+                             f"(clustering {prefilter_stats['cluster_s']:.2f} s, "
+                             f"adding members {prefilter_stats['add_members_s']:.2f} s)")
+
+            st.write("### Stage Timings (ms):")
+            profiling.stop(run_timings)
+            pipeline_timings = st.session_state["pipeline_timings"]
+            st.table([
+                {"Stage": stage["stage"], "Calls": stage["calls"], "Total (ms)": round(stage["total_ms"], 2)}
+                for stage in pipeline_timings.breakdown()
+            ])
+
+            st.write("### Session Memo:")
+            memo_stats = memo.stats()
+            st.write(f"**Hits:** {memo_stats['hits']} · **Misses:** {memo_stats['misses']} "
+                     f"({memo_stats['hit_rate']:.0%} hit rate) · **Evictions:** {memo_stats['evictions']} · "
+                     f"**Memory:** {memo_stats['bytes'] / 2**20:.1f} of {memo_stats['max_bytes'] / 2**20:.0f} MB")
+            st.table([
+                {"Artifact": kind, "Hits": counts["hits"], "Misses": counts["misses"]}
+                for kind, counts in memo_stats["by_kind"].items()
+            ])
+            st.download_button(
+                label="Download Timings (JSON)",
+                data=pipeline_timings.to_json(),
+                file_name="timings.json",
+                mime="application/json"
+            )
+            profile_report = pipeline_timings.profile_stats()
+            if profile_report:
+                with st.expander("cProfile report"):
+                    st.text(profile_report)
+
+            comparison = st.session_state["comparison"]
+            if comparison:
+                st.write("### Engine Comparison:")
+                summary = comparison["comparison"]
+                st.table([
+                    {
+                        "Engine": engine["algorithm"],
+                        "Wall Time (s)": round(engine["wall_time_s"], 3),
+                        "Alignment Length": engine["alignment_length"],
+                        "Gaps": engine["gap_count"],
+                        "Status": "done" if engine["succeeded"] else f"failed: {engine['error']}",
+                    }
+                    for engine in summary["engines"]
+                ])
+                sequential_time = sum(engine["wall_time_s"] for engine in summary["engines"])
+                st.write(f"**Both Engines (concurrent):** {summary['wall_time_s']:.3f} s "
+                         f"(run one after the other: {sequential_time:.3f} s)")
+                if summary["pair_agreement"] is not None:
+                    st.write(f"**Residue Pair Agreement:** {summary['pair_agreement'] * 100:.1f}%")
+                    st.write(f"**Identical Columns:** {summary['column_agreement'] * 100:.1f}%")
+                if summary["robinson_foulds"] is not None:
+                    st.write(f"**Guide Tree Robinson–Foulds Distance:** {summary['robinson_foulds']} "
+                             f"(normalized {summary['normalized_robinson_foulds']:.2f})")
+
+                engine_columns = st.columns(len(COMPARED_ENGINES))
+                for column, engine in zip(engine_columns, COMPARED_ENGINES):
+                    engine_outputs = comparison["outputs"][engine]
+                    with column:
+                        st.write(f"**{engine}**")
+                        if engine_outputs:
+                            st.markdown(f"```text\n{engine_outputs['rendered'][0]}\n```")
+                            if engine_outputs["result"].tree_text:
+                                st.markdown(f"```text\n{engine_outputs['result'].tree_text}\n```")
+                        else:
+                            st.write("Alignment failed.")
+
+        # Result Files Tab
+        with tabs[4]:  
+            st.header("Result Files")
+
+            stem = {"ClustalW": "clustal", "Progressive": "progressive"}.get(algorithm, "muscle")
+            alignment_format = st.selectbox("Alignment format", list(EXPORT_ALIGNMENT_FORMATS))
+            matrix_format = st.selectbox("Identity matrix format", list(EXPORT_MATRIX_FORMATS))
+            compress = st.checkbox("Gzip text files", value=False)
+
+            def export(kind, file_name, writer, gzipped):
+                """Stream one download to a file in the session's export directory, once per format."""
+                def write_file():
+                    if "export_dir" not in st.session_state:
+                        st.session_state["export_dir"] = tempfile.mkdtemp(prefix="msa_export_")
+                    export_dir = os.path.join(st.session_state["export_dir"], fingerprint[:16])
+                    os.makedirs(export_dir, exist_ok=True)
+                    path = os.path.join(export_dir, file_name + (".gz" if gzipped else ""))
+                    with open_output(path, gzipped) as handle:
+                        writer(handle)
+                    return path
+                return memo.get_or_compute(fingerprint, "export", write_file, params=(kind, file_name, gzipped))
+
+            extension, write_alignment = EXPORT_ALIGNMENT_FORMATS[alignment_format]
+            matrix_extension, write_matrix = EXPORT_MATRIX_FORMATS[matrix_format]
+            output_files = [
+                ("Input File", input_file_name, input_file_path),
+                ("Aligned Sequences", f"aligned_{stem}.{extension}" + (".gz" if compress else ""),
+                 export("alignment", f"aligned_{stem}.{extension}",
+                        lambda handle: write_alignment(alignment, handle, column_profile), compress)),
+                ("Identity Matrix", f"identity_matrix.{matrix_extension}"
+                                    + (".gz" if compress and matrix_extension != "npz" else ""),
+                 export("matrix", f"identity_matrix.{matrix_extension}",
+                        lambda handle: write_matrix(evaluation_results['identity_matrix'], sequence_names, handle),
+                        compress and matrix_extension != "npz")),
+            ]
+            if guide_tree_text:
+                output_files.append(("Guide Tree", f"guidetree_{stem}.dnd" + (".gz" if compress else ""),
+                                     export("tree", f"guidetree_{stem}.dnd",
+                                            lambda handle: write_tree(guide_tree_text, handle), compress)))
+
+            for description, file_name, path in output_files:
+                col1, col2, col3 = st.columns([2, 4, 2])  
+
+                with col1:
+                    st.write(description)
+                with col2:
+                    st.markdown(f"<div style='text-align: center'>{file_name}</div>", unsafe_allow_html=True)
+                with col3:
+                    mime = "text/plain"
+                    if file_name.endswith(".gz"):
+                        mime = "application/gzip"
+                    elif file_name.endswith(".npz"):
+                        mime = "application/octet-stream"
+                    with open(path, "rb") as data:
+                        st.download_button(
+                            label="Download",
+                            data=data,
+                            file_name=os.path.basename(file_name),
+                            mime=mime,
+                            key=f"download_{description}"
+                        )
+
+            if not guide_tree_text:
+                st.write("Guide tree file not found.")
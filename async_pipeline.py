@@ -0,0 +1,210 @@
+"""asyncio pipeline runner: overlap the tree builder with the alignment analyses.
+
+Once the alignment exists, three branches run concurrently:
+
+    tree      FastTree over the alignment (MUSCLE; the other engines build
+              their tree while aligning)
+    metrics   identity matrix and summary counts (benchmark.evaluate_records)
+    profile   column profile, conservation scores, then the HTML for the
+              first alignment window
+
+so end-to-end latency is that of the slowest branch rather than their sum.
+External tools are started with asyncio subprocesses; a timeout or a
+cancelled task kills the process before the error propagates, and a failure
+in any branch cancels the others.
+
+    outputs = run_pipeline_concurrent("MUSCLE", "input.fasta", timeout=600)
+    outputs["result"], outputs["metrics"], outputs["conservation_scores"]
+"""
+import asyncio
+import subprocess
+from alignment import (
+    FASTTREE_TREE, AlignmentResult, _parse_alignment, get_executable, load_cached_result,
+)
+from profiling import span
+from newick import format_newick_string
+
+
+async def _kill(process):
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+async def run_process(command, input_text=None, timeout=None, cwd=None):
+    """Run ``command`` (an argument list) in ``cwd`` and return (returncode, stdout, stderr) as text.
+
+    Raises subprocess.TimeoutExpired after ``timeout`` seconds. On timeout or
+    cancellation the process is killed and reaped before the error propagates.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE if input_text is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(input_text.encode() if input_text is not None else None), timeout
+        )
+    except asyncio.TimeoutError:
+        await _kill(process)
+        raise subprocess.TimeoutExpired(command, timeout)
+    except asyncio.CancelledError:
+        await _kill(process)
+        raise
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+async def gather_or_cancel(*aws):
+    """Like asyncio.gather, but the first failure cancels (and kills) the remaining branches."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+async def align_async(algorithm, fasta_file, timeout=None, cluster_threshold=None):
+    """Produce the AlignmentResult of one engine; MUSCLE's tree is left to the tree branch."""
+    if cluster_threshold is not None:
+        from prefilter import align_clustered
+        return await asyncio.to_thread(align_clustered, algorithm, fasta_file, cluster_threshold, timeout=timeout)
+
+    if algorithm == "MUSCLE":
+        with span("muscle.subprocess"):
+            returncode, stdout, stderr = await run_process(
+                [get_executable("MUSCLE"), "-in", fasta_file, "-quiet"], timeout=timeout
+            )
+        if returncode != 0 or not stdout.strip():
+            print("Error running MUSCLE:", stderr)
+            return None
+        alignment = await asyncio.to_thread(_parse_alignment, stdout, "fasta")
+        return AlignmentResult(algorithm, alignment, stdout, "fasta")
+
+    if algorithm == "ClustalW":
+        from clustalw import collect_job, prepare_job, remove_job
+        try:
+            job = await asyncio.to_thread(prepare_job, fasta_file)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return None
+        try:
+            with span("clustalw.subprocess"):
+                returncode, _, stderr = await run_process(job.command, timeout=timeout, cwd=job.workdir)
+            alignment_text, tree_text = collect_job(job)
+            guide_tree_source = job.guide_tree_source
+        finally:
+            remove_job(job)
+        if returncode != 0 or alignment_text is None:
+            print("Error running ClustalW:", stderr)
+            return None
+        alignment = await asyncio.to_thread(_parse_alignment, alignment_text, "clustal")
+        return AlignmentResult(algorithm, alignment, alignment_text, "clustal",
+                               tree_text=format_newick_string(tree_text) if tree_text else None,
+                               guide_tree_source=guide_tree_source)
+
+    if algorithm == "Progressive":
+        from alignment import run_pipeline
+        return await asyncio.to_thread(run_pipeline, algorithm, fasta_file)
+
+    raise ValueError(f"Unknown algorithm: {algorithm}")
+
+
+async def _tree_branch(result, timeout):
+    if result.tree_text or result.algorithm != "MUSCLE":
+        return result.tree_text
+    with span("fasttree.subprocess"):
+        returncode, stdout, stderr = await run_process(
+            [get_executable("FastTree"), "-quiet"], input_text=result.alignment_text, timeout=timeout
+        )
+    if returncode != 0 or not stdout.strip():
+        print("Error generating guide tree:", stderr)
+        return None
+    return format_newick_string(stdout)
+
+
+async def _metrics_branch(result, cache, cache_key):
+    from benchmark import evaluate_records
+
+    metrics = cache.get_metrics(cache_key) if cache is not None else None
+    if metrics is None:
+        with span("evaluate_alignment"):
+            metrics = await asyncio.to_thread(evaluate_records, result.algorithm, result.alignment)
+    return metrics
+
+
+async def _profile_branch(result, col_range, seq_range):
+    from column_profile import ColumnProfile
+    from output_manager import render_alignment_window
+    from visualization import calculate_conservation_score
+
+    profile = await asyncio.to_thread(ColumnProfile.from_alignment, result.alignment)
+    scores, plain, colored = await asyncio.gather(
+        asyncio.to_thread(calculate_conservation_score, result.alignment, profile),
+        asyncio.to_thread(render_alignment_window, result.alignment, False, col_range, seq_range, profile),
+        asyncio.to_thread(render_alignment_window, result.alignment, True, col_range, seq_range, profile),
+    )
+    return profile, scores, (plain, colored)
+
+
+async def pipeline_async(algorithm, fasta_file, cache=None, cache_key=None, timeout=None,
+                         cluster_threshold=None, col_range=None, seq_range=None):
+    """Align, then build the tree, metrics and rendered window concurrently.
+
+    Returns a dict with ``result`` (AlignmentResult), ``metrics``,
+    ``column_profile``, ``conservation_scores`` and ``rendered`` (plain and
+    colored text of the ``col_range``/``seq_range`` window), or None if the
+    alignment failed. ``timeout`` applies to each external process.
+    """
+    result = None
+    if cache is not None:
+        cache_key = cache_key or cache.key_for(fasta_file, algorithm, cluster_threshold)
+        result = load_cached_result(cache, cache_key, algorithm)
+    cached = result is not None
+
+    if result is None:
+        with span("run_alignment", algorithm=algorithm):
+            result = await align_async(algorithm, fasta_file, timeout, cluster_threshold)
+        if result is None:
+            return None
+
+    tree_text, metrics, (profile, scores, rendered) = await gather_or_cancel(
+        _tree_branch(result, timeout),
+        _metrics_branch(result, cache, cache_key),
+        _profile_branch(result, col_range, seq_range),
+    )
+    result.tree_text = tree_text
+    if tree_text and result.algorithm == "MUSCLE":
+        result.guide_tree_source = FASTTREE_TREE
+
+    if cache is not None:
+        if not cached:
+            cache.put(cache_key, algorithm, alignment_text=result.alignment_text, tree_text=result.tree_text,
+                      guide_tree_source=result.guide_tree_source)
+        cache.put_metrics(cache_key, metrics)
+    return {
+        "result": result,
+        "metrics": metrics,
+        "column_profile": profile,
+        "conservation_scores": scores,
+        "rendered": rendered,
+    }
+
+
+def run_pipeline_concurrent(algorithm, fasta_file, cache=None, cache_key=None, timeout=None,
+                            cluster_threshold=None, col_range=None, seq_range=None):
+    """Synchronous entry point for pipeline_async, for callers without an event loop."""
+    return asyncio.run(pipeline_async(
+        algorithm, fasta_file, cache=cache, cache_key=cache_key, timeout=timeout,
+        cluster_threshold=cluster_threshold, col_range=col_range, seq_range=seq_range,
+    ))
@@ -0,0 +1,219 @@
+"""Batch alignment service: run many FASTA jobs on a bounded process pool.
+
+Usage from the command line:
+
+    python batch.py --algorithm MUSCLE --output-dir results families/
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, wait
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMEOUT = "timeout"
+
+FASTA_EXTENSIONS = (".fasta", ".fa", ".faa", ".fas")
+
+
+def _align_job(algorithm, fasta_file, process_timeout, use_cache, cluster_threshold=None):
+    """Worker entry point: align one FASTA file and return a picklable summary."""
+    from alignment import run_alignment
+    from result_cache import get_default_cache
+
+    start = time.perf_counter()
+    cache = get_default_cache() if use_cache else None
+    alignment, output_file, guide_tree_file = run_alignment(
+        algorithm, fasta_file, cache=cache, timeout=process_timeout, cluster_threshold=cluster_threshold
+    )
+    if alignment is None:
+        raise RuntimeError(f"{algorithm} produced no alignment for {fasta_file}")
+    return {
+        "output_file": output_file,
+        "guide_tree_file": guide_tree_file,
+        "num_sequences": len(alignment),
+        "alignment_length": alignment.get_alignment_length(),
+        "elapsed_s": time.perf_counter() - start,
+    }
+
+
+class BatchAligner:
+    """Queue of alignment jobs executed on a bounded ProcessPoolExecutor.
+
+    Each submitted job gets an ID that can be used to poll its status, wait
+    for its result or cancel it. ``process_timeout`` limits each external
+    process (ClustalW, MUSCLE, FastTree) inside the worker, so a stuck
+    aligner is killed rather than blocking a worker forever; it is not a
+    limit on the whole job: a MUSCLE job runs MUSCLE and then FastTree, and
+    the in-process Progressive engine is not limited. Cancelling a job that
+    is already running discards its result; the aligner itself stops when it
+    finishes or times out.
+    """
+
+    def __init__(self, max_workers=None, use_cache=True):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.use_cache = use_cache
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fasta_file, algorithm="MUSCLE", process_timeout=None, cluster_threshold=None):
+        """Queue an alignment job and return its job ID; ``process_timeout`` applies to each external process."""
+        job_id = uuid.uuid4().hex[:12]
+        future = self._executor.submit(
+            _align_job, algorithm, fasta_file, process_timeout, self.use_cache, cluster_threshold
+        )
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "fasta_file": fasta_file,
+                "algorithm": algorithm,
+                "process_timeout": process_timeout,
+                "future": future,
+                "cancelled": False,
+            }
+        return job_id
+
+    def jobs(self):
+        """Return the IDs of all submitted jobs in submission order."""
+        with self._lock:
+            return list(self._jobs)
+
+    def status(self, job_id):
+        """Return one of queued, running, done, failed, cancelled or timeout."""
+        job = self._jobs[job_id]
+        future = job["future"]
+        if job["cancelled"] or future.cancelled():
+            return CANCELLED
+        if not future.done():
+            return RUNNING if future.running() else QUEUED
+        error = future.exception()
+        if error is None:
+            return DONE
+        return TIMEOUT if isinstance(error, subprocess.TimeoutExpired) else FAILED
+
+    def cancel(self, job_id):
+        """Cancel a job. Returns False if it had already finished."""
+        job = self._jobs[job_id]
+        if job["future"].done():
+            return job["cancelled"] or job["future"].cancelled()
+        job["future"].cancel()
+        job["cancelled"] = True
+        return True
+
+    def result(self, job_id, timeout=None):
+        """Block until a job finishes and return its summary dict.
+
+        Raises CancelledError for cancelled jobs and re-raises the worker's
+        exception for failed or timed out ones.
+        """
+        job = self._jobs[job_id]
+        if job["cancelled"]:
+            raise CancelledError(job_id)
+        return job["future"].result(timeout=timeout)
+
+    def info(self, job_id):
+        """Return a JSON-serializable description of a job, including its result or error."""
+        job = self._jobs[job_id]
+        status = self.status(job_id)
+        info = {key: job[key] for key in ("job_id", "fasta_file", "algorithm", "process_timeout")}
+        info["status"] = status
+        if status == DONE:
+            info.update(job["future"].result())
+        elif status in (FAILED, TIMEOUT):
+            info["error"] = str(job["future"].exception())
+        return info
+
+    def wait_all(self, timeout=None):
+        """Wait until every submitted job has finished or been cancelled."""
+        with self._lock:
+            futures = [job["future"] for job in self._jobs.values()]
+        wait(futures, timeout=timeout)
+
+    def shutdown(self, cancel_pending=False):
+        self._executor.shutdown(wait=True, cancel_futures=cancel_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown(cancel_pending=exc_info[0] is not None)
+
+
+def collect_fasta_files(paths):
+    """Expand files and directories into a sorted list of FASTA files."""
+    fasta_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(FASTA_EXTENSIONS):
+                    fasta_files.append(os.path.join(path, name))
+        else:
+            fasta_files.append(path)
+    return fasta_files
+
+
+def _export_job(info, output_dir):
+    """Copy a finished job's alignment and tree into ``output_dir`` as ``<input stem>.<job id>.aln/.dnd``.
+
+    The job ID keeps inputs with the same file name in different directories apart.
+    """
+    stem = os.path.splitext(os.path.basename(info["fasta_file"]))[0] + "." + info["job_id"]
+    aligned = os.path.join(output_dir, f"{stem}.aln")
+    shutil.copyfile(info["output_file"], aligned)
+    info["output_file"] = aligned
+    if info.get("guide_tree_file"):
+        tree = os.path.join(output_dir, f"{stem}.dnd")
+        shutil.copyfile(info["guide_tree_file"], tree)
+        info["guide_tree_file"] = tree
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Align many FASTA files in parallel.")
+    parser.add_argument("inputs", nargs="+", help="FASTA files or directories of FASTA files")
+    parser.add_argument("--algorithm", choices=["ClustalW", "MUSCLE", "Progressive"], default="MUSCLE")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--process-timeout", "--timeout", dest="process_timeout", type=float, default=None,
+                        help="timeout in seconds for each external process of a job (not the whole job)")
+    parser.add_argument("--output-dir", default="batch_results")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the result cache")
+    parser.add_argument("--cluster-identity", type=float, default=None,
+                        help="cluster sequences at this identity (0-1) and align representatives only")
+    args = parser.parse_args(argv)
+
+    fasta_files = collect_fasta_files(args.inputs)
+    if not fasta_files:
+        parser.error("no FASTA files found")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    summary = []
+    with BatchAligner(max_workers=args.workers, use_cache=not args.no_cache) as service:
+        job_ids = [service.submit(path, args.algorithm, args.process_timeout, args.cluster_identity) for path in fasta_files]
+        print(f"Submitted {len(job_ids)} {args.algorithm} jobs on {service.max_workers} workers")
+        for job_id in job_ids:
+            try:
+                service.result(job_id)
+            except Exception:
+                pass
+            info = service.info(job_id)
+            if info["status"] == DONE:
+                _export_job(info, args.output_dir)
+            print(f"{job_id} {info['status']:<9} {info['fasta_file']}")
+            summary.append(info)
+
+    with open(os.path.join(args.output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return 0 if all(info["status"] == DONE for info in summary) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 import numpy as np
-from Bio import SeqIO
+from profiling import span, timed
+from alignment_store import MemmapAlignment
+from compact_alignment import GAP_CODE, TILE_BYTES, CompactAlignment, column_tiles
 
 def calculate_percent_identity(seq1, seq2):
     """Calculate the percent identity between two aligned sequences, ignoring gaps."""
@@ -13,36 +15,198 @@ def calculate_percent_identity(seq1, seq2):
 
     return (matches / total * 100) if total > 0 else 0.0
 
-def create_identity_matrix(records):
-    """Create a percent identity matrix from sequence records."""
-    num_sequences = len(records)
-    matrix = np.zeros((num_sequences, num_sequences))
+def encode_alignment(records):
+    """Encode aligned sequence records as an (N, L) uint8 matrix of ASCII codes.
+
+    Shorter rows are padded with gaps so they are ignored like zip() would.
+    A CompactAlignment's buffer is returned as is, without copying.
+    """
+    return CompactAlignment.coerce(records).data
+
+def _round_like_python(values, ndigits=2):
+    """Round an array exactly as the builtin round() would, one unique value at a time."""
+    unique, inverse = np.unique(values, return_inverse=True)
+    rounded = np.array([round(float(v), ndigits) for v in unique])
+    return rounded[inverse].reshape(values.shape)
+
+def identity_rows(encoded, start, stop, tile_bytes=TILE_BYTES):
+    """Percent identity of rows ``start``..``stop`` against every row of ``encoded``, as a (stop - start, N) array.
+
+    Matches and compared positions are counted with one matrix product per
+    residue symbol over column tiles of ``encoded``, which may be a np.memmap.
+    """
+    num_rows = encoded.shape[0]
+    totals = np.zeros((stop - start, num_rows))
+    matches = np.zeros_like(totals)
+    for tile_start, tile_stop in column_tiles(*encoded.shape, tile_bytes):
+        tile = np.asarray(encoded[:, tile_start:tile_stop])
+        non_gap = tile != GAP_CODE
+        # float32 products of 0/1 values are exact below 2**24 columns
+        rows = non_gap.astype(np.float32)
+        totals += rows[start:stop] @ rows.T
+        for symbol in np.unique(tile[non_gap]):
+            rows = (tile == symbol).astype(np.float32)
+            matches += rows[start:stop] @ rows.T
+
+    percent = np.zeros_like(matches)
+    compared = totals > 0
+    percent[compared] = matches[compared] / totals[compared] * 100
+    return _round_like_python(percent)
+
+def iter_identity_blocks(encoded, block_size=256, tile_bytes=TILE_BYTES):
+    """Yield (start, stop, percent) row blocks of the gap-aware percent identity matrix.
 
-    for i in range(num_sequences):
-        seq1 = str(records[i].seq)
-        for j in range(i, num_sequences):
-            seq2 = str(records[j].seq)
-            percent_identity = calculate_percent_identity(seq1, seq2)
-            matrix[i][j] = matrix[j][i] = round(percent_identity, 2) 
+    Peak memory is one tile's float32 mask plus ``block_size * N`` counts.
+    """
+    num_rows = encoded.shape[0]
+    for start in range(0, num_rows, block_size):
+        stop = min(start + block_size, num_rows)
+        yield start, stop, identity_rows(encoded, start, stop, tile_bytes)
 
-    return matrix
+def identity_matrix_from_encoded(encoded, block_size=256, out=None):
+    """Compute the gap-aware percent identity matrix of an encoded alignment.
+
+    ``out`` may be a preallocated (N, N) array, such as a np.memmap, to keep
+    the result itself off the heap.
+    """
+    if out is None:
+        out = np.empty((encoded.shape[0], encoded.shape[0]))
+    for start, stop, block in iter_identity_blocks(encoded, block_size):
+        out[start:stop] = block
+    return out
+
+@timed("create_identity_matrix")
+def create_identity_matrix(records, block_size=256):
+    """Create a percent identity matrix from sequence records."""
+    return identity_matrix_from_encoded(encode_alignment(records), block_size=block_size)
 
 def evaluate_alignment(algorithm, alignment_file):
     """Evaluate the alignment results, returning various metrics."""
-    records = list(SeqIO.parse(alignment_file, "fasta"))
+    from Bio import SeqIO
+
+    with span("seqio.parse"):
+        records = list(SeqIO.parse(alignment_file, "fasta"))
+    return evaluate_records(algorithm, records)
+
+def evaluate_records(algorithm, records, matrix="BLOSUM62", profile=None):
+    """Evaluate already parsed records (e.g. a MultipleSeqAlignment) without touching disk.
+
+    Besides percent identity, reports percent similarity (positive
+    ``matrix`` score) and the sum-of-pairs score; ``profile`` (the
+    alignment's ColumnProfile) is built if not given. For a MemmapAlignment
+    the identity and similarity matrices are returned as memmap arrays.
+    """
+    from column_profile import ColumnProfile
+    from similarity import similarity_matrix_from_encoded, sum_of_pairs_score as profile_sum_of_pairs
 
-    total_sequences = len(records)
-    total_length = max(len(record.seq) for record in records)
-    gap_count = sum(str(record.seq).count('-') for record in records)
+    compact = CompactAlignment.coerce(records)
+    total_sequences = len(compact)
+    total_length = compact.get_alignment_length()
+    gap_count = int(compact.gap_counts().sum())
 
-    identity_matrix = create_identity_matrix(records)
-    sequence_names = [record.id for record in records]  # Get sequence names
+    if isinstance(compact, MemmapAlignment):
+        # Left on disk as a memmap; too large to convert to nested lists
+        identity_matrix = compact.identity_matrix()
+        similarity_matrix = compact.similarity_matrix(matrix)
+    else:
+        identity_matrix = create_identity_matrix(compact).tolist()
+        with span("similarity_matrix", matrix=matrix):
+            similarity_matrix = similarity_matrix_from_encoded(compact.data, matrix).tolist()
+    sequence_names = list(compact.ids)  # Get sequence names
+    if profile is None:
+        profile = ColumnProfile.from_encoded(compact.data)
 
     return {
         'algorithm': algorithm,
         'total_sequences': total_sequences,
         'total_length': total_length,
         'gap_count': gap_count,
-        'identity_matrix': identity_matrix.tolist(),
+        'identity_matrix': identity_matrix,
+        'similarity_matrix': similarity_matrix,
+        'substitution_matrix': matrix,
+        'sp_score': profile_sum_of_pairs(compact, matrix, profile),
         'sequence_names': sequence_names  # Add sequence names to the return dict
     }
+
+def sum_of_pairs_score(alignment, matrix="BLOSUM62"):
+    """Sum-of-pairs substitution score of an alignment; pairs involving a gap score zero (see similarity.py)."""
+    from similarity import sum_of_pairs_score as profile_sum_of_pairs
+
+    return profile_sum_of_pairs(CompactAlignment.coerce(alignment), matrix)
+
+def _residue_columns(aligned):
+    """Map each residue of each sequence to its column index: list of int arrays."""
+    columns = []
+    for row in aligned:
+        codes = np.frombuffer(row.encode(), dtype=np.uint8)
+        columns.append(np.flatnonzero(codes != ord("-")))
+    return columns
+
+def accuracy_scores(test_alignment, true_alignment):
+    """Return (SP, TC) of a test alignment against the true alignment, both in [0, 1].
+
+    SP is the fraction of residue pairs aligned in the truth that the test
+    alignment also aligns; TC is the fraction of true columns (with at least
+    two residues) reproduced exactly. Rows must be in the same order.
+    """
+    true_cols = _residue_columns(true_alignment)
+    test_cols = _residue_columns(test_alignment)
+    n = len(true_alignment)
+    true_length = len(true_alignment[0]) if n else 0
+
+    # For each sequence, the test column of the residue found in each true column (-1 for gaps)
+    mapped = np.full((n, true_length), -1, dtype=np.int64)
+    for i in range(n):
+        mapped[i, true_cols[i]] = test_cols[i]
+
+    correct_pairs = total_pairs = 0
+    for a in range(n):
+        both = (mapped[a] >= 0) & (mapped[a + 1:] >= 0)
+        total_pairs += int(both.sum())
+        correct_pairs += int((both & (mapped[a + 1:] == mapped[a])).sum())
+
+    present = mapped >= 0
+    residues_per_column = present.sum(axis=0)
+    scored = residues_per_column >= 2
+    target = np.where(present, mapped, -2).max(axis=0)
+    same_column = np.all(~present | (mapped == target), axis=0)
+    test_column_sizes = np.zeros(max(len(test_alignment[0]) if n else 0, 1), dtype=np.int64)
+    for row in test_alignment:
+        test_column_sizes[:len(row)] += np.frombuffer(row.encode(), dtype=np.uint8) != ord("-")
+    exact = same_column & (test_column_sizes[np.maximum(target, 0)] == residues_per_column)
+
+    sp = correct_pairs / total_pairs if total_pairs else 1.0
+    tc = float((exact & scored).sum() / scored.sum()) if scored.any() else 1.0
+    return sp, tc
+
+def compare_engines(fasta_file, algorithms=("Progressive", "MUSCLE", "ClustalW")):
+    """Run each engine on ``fasta_file`` and report wall time and SP score per engine."""
+    import time
+    from alignment import run_alignment
+
+    results = []
+    for algorithm in algorithms:
+        start = time.perf_counter()
+        try:
+            alignment, _, _ = run_alignment(algorithm, fasta_file)
+        except (OSError, ValueError) as e:
+            print(f"Error running {algorithm}: {e}")
+            alignment = None
+        elapsed = time.perf_counter() - start
+        results.append({
+            'algorithm': algorithm,
+            'wall_time_s': elapsed,
+            'sp_score': sum_of_pairs_score(alignment) if alignment else None,
+            'alignment_length': alignment.get_alignment_length() if alignment else None,
+        })
+    return results
+
+if __name__ == "__main__":
+    import sys
+
+    fasta_path = sys.argv[1] if len(sys.argv) > 1 else "temp_sequences.fasta"
+    print(f"{'Engine':<12}{'Time (s)':>10}{'SP score':>12}{'Length':>8}")
+    for row in compare_engines(fasta_path):
+        sp = f"{row['sp_score']:.1f}" if row['sp_score'] is not None else "n/a"
+        length = row['alignment_length'] if row['alignment_length'] is not None else "n/a"
+        print(f"{row['algorithm']:<12}{row['wall_time_s']:>10.3f}{sp:>12}{length:>8}")
@@ -0,0 +1,250 @@
+"""Benchmark harness: run alignment engines over simulated protein families.
+
+Families are evolved locally along a random binary tree with substitutions,
+insertions and deletions, so the true alignment is known. Each engine run is
+executed in a fresh worker process and records wall time, peak RSS, CPU time
+spent in external aligner processes, and SP/TC accuracy against the truth.
+
+    python benchmark_suite.py --sizes 10,50 --divergences 0.1,0.4 --output results.json
+    python benchmark_suite.py --output new.json --baseline results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmark import accuracy_scores
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+# Background amino acid frequencies (UniProt)
+BACKGROUND = np.array([
+    8.25, 1.38, 5.46, 6.72, 3.86, 7.07, 2.27, 5.91, 5.80, 9.64,
+    2.41, 4.06, 4.74, 3.93, 5.53, 6.65, 5.36, 6.86, 1.10, 2.92,
+])
+BACKGROUND = BACKGROUND / BACKGROUND.sum()
+
+DEFAULT_ENGINES = ("Progressive", "MUSCLE", "ClustalW")
+
+
+def simulate_family(num_sequences, length, divergence, indel_rate=0.05, seed=None):
+    """Evolve a protein family along a random binary tree.
+
+    ``divergence`` is the expected fraction of substituted sites per branch
+    and ``indel_rate`` the expected number of indel events per site per
+    branch, scaled by divergence. Returns (names, sequences, true_alignment)
+    where the true alignment is a list of gapped strings.
+    """
+    rng = np.random.default_rng(seed)
+    # A sequence is a list of (column id, residue); ``order`` holds every column id in true
+    # alignment order, and an insertion splices its new ids in right after its left neighbour's column
+    root = [(i, AMINO_ACIDS[a]) for i, a in enumerate(rng.choice(20, size=length, p=BACKGROUND))]
+    order = list(range(length))
+
+    def evolve(sequence, branch):
+        sequence = [
+            (column, AMINO_ACIDS[rng.choice(20, p=BACKGROUND)] if rng.random() < branch else residue)
+            for column, residue in sequence
+        ]
+        for _ in range(rng.poisson(indel_rate * branch * max(len(sequence), 1))):
+            size = int(rng.geometric(0.5))
+            position = int(rng.integers(0, len(sequence) + 1))
+            if rng.random() < 0.5 and len(sequence) > size:
+                del sequence[position:position + size]
+            else:
+                at = order.index(sequence[position - 1][0]) + 1 if position > 0 else 0
+                new_ids = list(range(len(order), len(order) + size))
+                order[at:at] = new_ids
+                sequence[position:position] = [
+                    (column, AMINO_ACIDS[rng.choice(20, p=BACKGROUND)]) for column in new_ids
+                ]
+        return sequence
+
+    # Split leaves into random binary clades, evolving along each branch
+    def grow(sequence, count):
+        if count == 1:
+            return [sequence]
+        left = int(rng.integers(1, count))
+        return (grow(evolve(sequence, divergence * rng.uniform(0.5, 1.5)), left)
+                + grow(evolve(sequence, divergence * rng.uniform(0.5, 1.5)), count - left))
+
+    leaves = grow(root, num_sequences)
+    column_index = {column: i for i, column in enumerate(order)}
+
+    names = [f"seq{i + 1}" for i in range(num_sequences)]
+    sequences, true_alignment = [], []
+    for leaf in leaves:
+        row = ["-"] * len(order)
+        for column, residue in leaf:
+            row[column_index[column]] = residue
+        true_alignment.append("".join(row))
+        sequences.append("".join(residue for _, residue in leaf))
+    # Drop columns that every lineage deleted
+    keep = [i for i in range(len(order)) if any(row[i] != "-" for row in true_alignment)]
+    true_alignment = ["".join(row[i] for i in keep) for row in true_alignment]
+    for row, sequence in zip(true_alignment, sequences):
+        assert row.replace("-", "") == sequence, "true alignment row does not match its sequence"
+    return names, sequences, true_alignment
+
+
+def _run_engine(engine, fasta_file):
+    """Worker: run one engine and report timing and memory from inside a fresh process."""
+    from alignment import run_alignment
+
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    start = time.perf_counter()
+    alignment, _, _ = run_alignment(engine, fasta_file)
+    wall_time = time.perf_counter() - start
+
+    result = {"wall_time_s": wall_time, "peak_rss_mb": None, "subprocess_cpu_s": None, "aligned": None}
+    if resource:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        result["peak_rss_mb"] = max(own.ru_maxrss, children.ru_maxrss) / scale
+        result["subprocess_cpu_s"] = (
+            children.ru_utime + children.ru_stime - children_before.ru_utime - children_before.ru_stime
+        )
+    if alignment is not None:
+        result["aligned"] = {record.id: str(record.seq) for record in alignment}
+    return result
+
+
+def run_case(engine, names, sequences, true_alignment):
+    """Align one simulated family with one engine and score the result."""
+    with tempfile.NamedTemporaryFile("w", suffix=".fasta", delete=False) as fasta:
+        for name, sequence in zip(names, sequences):
+            fasta.write(f">{name}\n{sequence}\n")
+        fasta_file = fasta.name
+
+    try:
+        # A spawned (not forked) worker so peak RSS reflects this run alone
+        with multiprocessing.get_context("spawn").Pool(processes=1, maxtasksperchild=1) as pool:
+            result = pool.apply(_run_engine, (engine, fasta_file))
+    except Exception as e:
+        result = {"wall_time_s": None, "peak_rss_mb": None, "subprocess_cpu_s": None,
+                  "aligned": None, "error": str(e)}
+    finally:
+        os.remove(fasta_file)
+
+    aligned = result.pop("aligned")
+    result["sp_score"] = result["tc_score"] = None
+    if aligned and all(name in aligned for name in names):
+        result["sp_score"], result["tc_score"] = accuracy_scores(
+            [aligned[name] for name in names], true_alignment
+        )
+    elif "error" not in result:
+        result["error"] = "no alignment produced"
+    return result
+
+
+def run_suite(engines, sizes, lengths, divergences, replicates=1, seed=0):
+    """Run every engine over every simulated family configuration. Returns a list of records."""
+    records = []
+    for num_sequences in sizes:
+        for length in lengths:
+            for divergence in divergences:
+                for replicate in range(replicates):
+                    case_seed = np.random.SeedSequence(
+                        [seed, num_sequences, length, int(divergence * 1000), replicate]
+                    )
+                    names, sequences, true_alignment = simulate_family(
+                        num_sequences, length, divergence, seed=case_seed
+                    )
+                    for engine in engines:
+                        record = {
+                            "engine": engine,
+                            "num_sequences": num_sequences,
+                            "length": length,
+                            "divergence": divergence,
+                            "replicate": replicate,
+                        }
+                        record.update(run_case(engine, names, sequences, true_alignment))
+                        records.append(record)
+                        print(_format_record(record))
+    return records
+
+
+def _format_record(record):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "n/a"
+
+    return (f"{record['engine']:<12} N={record['num_sequences']:<5} L={record['length']:<5} "
+            f"d={record['divergence']:<5} time={fmt(record['wall_time_s'], '.3f')}s "
+            f"rss={fmt(record['peak_rss_mb'], '.1f')}MB sub={fmt(record['subprocess_cpu_s'], '.3f')}s "
+            f"SP={fmt(record['sp_score'], '.3f')} TC={fmt(record['tc_score'], '.3f')}"
+            + (f" error={record['error']}" if record.get("error") else ""))
+
+
+def compare_to_baseline(records, baseline_records, time_tolerance=1.25, score_tolerance=0.02):
+    """Return human-readable regressions of ``records`` against a previous run."""
+    def key(record):
+        return (record["engine"], record["num_sequences"], record["length"],
+                record["divergence"], record["replicate"])
+
+    baseline = {key(record): record for record in baseline_records}
+    regressions = []
+    for record in records:
+        old = baseline.get(key(record))
+        if old is None:
+            continue
+        label = "{} N={} L={} d={} rep={}".format(*key(record))
+        if old.get("wall_time_s") and record.get("wall_time_s") \
+                and record["wall_time_s"] > old["wall_time_s"] * time_tolerance:
+            regressions.append(f"{label}: time {old['wall_time_s']:.3f}s -> {record['wall_time_s']:.3f}s")
+        for metric in ("sp_score", "tc_score"):
+            if old.get(metric) is not None and record.get(metric) is not None \
+                    and record[metric] < old[metric] - score_tolerance:
+                regressions.append(f"{label}: {metric} {old[metric]:.3f} -> {record[metric]:.3f}")
+    return regressions
+
+
+def _csv_list(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark alignment engines on simulated families.")
+    parser.add_argument("--engines", type=_csv_list(str), default=list(DEFAULT_ENGINES))
+    parser.add_argument("--sizes", type=_csv_list(int), default=[10, 50])
+    parser.add_argument("--lengths", type=_csv_list(int), default=[200])
+    parser.add_argument("--divergences", type=_csv_list(float), default=[0.1, 0.3])
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="previous results file to check for regressions")
+    args = parser.parse_args(argv)
+
+    records = run_suite(args.engines, args.sizes, args.lengths, args.divergences,
+                        replicates=args.replicates, seed=args.seed)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "records": records,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(records, json.load(f)["records"])
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
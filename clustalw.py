@@ -0,0 +1,158 @@
+"""ClustalW jobs in isolated working directories, with an optional in-process pairwise stage.
+
+ClustalW spends most of its time on all-pairs distances before building its
+guide tree, on one core. With MSA_CLUSTALW_GUIDE_TREE=kmer the distances are
+k-mer distances computed as matrix products instead
+(progressive.kmer_distance_matrix, which uses every core through BLAS), the
+neighbor-joining guide tree is built from them and ``clustalw2 -USETREE``
+only runs the progressive alignment. That tree differs from ClustalW's own,
+and so may the alignment; by default ClustalW builds its own tree. Every job
+runs in its own temporary directory, so the .dnd files of concurrent jobs
+never collide and nothing is written next to the input:
+
+    job = prepare_job("input.fasta")
+    returncode, stdout, stderr = run_in(job, timeout=60)
+    alignment_text, tree_text = collect_job(job)
+    remove_job(job)
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from profiling import span
+
+PIPELINE_VERSION = "2"
+
+# MSA_CLUSTALW_GUIDE_TREE values and how each job's guide tree is described
+GUIDE_TREES = {
+    "clustalw": "ClustalW (own pairwise distances)",
+    "kmer": "k-mer distances, neighbor joining (in-process)",
+}
+
+# ClustalW matches -USETREE leaves against the first word of each header and
+# truncates long names; other inputs fall back to ClustalW's own pairwise stage
+_TREE_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.|\-]{1,30}$")
+
+
+def find_clustalw():
+    """Return the path of the ClustalW executable, or None if it is not installed."""
+    from alignment import get_executable
+
+    executable = get_executable("ClustalW")
+    if os.path.isfile(executable) and os.access(executable, os.X_OK):
+        return executable
+    return shutil.which(executable)
+
+
+def guide_tree_method():
+    """The configured guide tree (a GUIDE_TREES key); raises ValueError for unknown values."""
+    method = os.environ.get("MSA_CLUSTALW_GUIDE_TREE", "clustalw") or "clustalw"
+    if method not in GUIDE_TREES:
+        raise ValueError(f"Unknown MSA_CLUSTALW_GUIDE_TREE: {method} (use {' or '.join(GUIDE_TREES)})")
+    return method
+
+
+def guide_tree(fasta_file):
+    """Neighbor-joining Newick tree of a FASTA file from k-mer distances, or None if ClustalW could not use it."""
+    from Bio import SeqIO
+    from progressive import joins_to_newick, kmer_distance_matrix, neighbor_joining
+
+    records = list(SeqIO.parse(fasta_file, "fasta"))
+    names = [record.id for record in records]
+    if len(records) < 3 or len(set(names)) != len(names) or not all(_TREE_SAFE_NAME.match(name) for name in names):
+        return None
+    with span("clustalw.pairwise_distances", sequences=len(records)):
+        distances = kmer_distance_matrix([str(record.seq) for record in records])
+    with span("clustalw.guide_tree"):
+        return joins_to_newick(neighbor_joining(distances), names)
+
+
+class ClustalWJob:
+    """Paths and command line of one ClustalW run inside its own working directory."""
+
+    def __init__(self, workdir, command, tree_text):
+        self.workdir = workdir
+        self.command = command
+        self.tree_text = tree_text
+        self.guide_tree_source = GUIDE_TREES["kmer" if tree_text is not None else "clustalw"]
+        self.output_file = os.path.join(workdir, "alignment.aln")
+
+
+def prepare_job(fasta_file, executable=None, method=None):
+    """Copy the input into a fresh working directory and, for the "kmer" ``method``, build the guide tree.
+
+    ``method`` defaults to guide_tree_method(). Returns a ClustalWJob whose
+    ``command`` runs with that directory as cwd. Raises FileNotFoundError if
+    ClustalW is not installed.
+    """
+    method = method or guide_tree_method()
+    executable = executable or find_clustalw()
+    if executable is None:
+        from alignment import get_executable
+
+        raise FileNotFoundError(f"ClustalW executable not found: {get_executable('ClustalW')} "
+                                "(install ClustalW2 or add it to PATH)")
+    workdir = tempfile.mkdtemp(prefix="clustalw_")
+    try:
+        shutil.copyfile(fasta_file, os.path.join(workdir, "input.fasta"))
+        tree_text = guide_tree(fasta_file) if method == "kmer" else None
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    command = [os.path.abspath(executable), "-INFILE=input.fasta", "-OUTFILE=alignment.aln"]
+    if tree_text is not None:
+        with open(os.path.join(workdir, "guide.dnd"), "w") as f:
+            f.write(tree_text)
+        command.append("-USETREE=guide.dnd")
+    elif method == "kmer":
+        print("ClustalW: k-mer guide tree not usable here (fewer than 3 sequences, or names ClustalW "
+              "would alter), using ClustalW's own pairwise stage")
+    # Otherwise ClustalW computes its own tree and writes it as input.dnd in the working directory
+    return ClustalWJob(workdir, command, tree_text)
+
+
+def run_in(job, timeout=None):
+    """Run a prepared job. Returns (returncode, stdout, stderr); raises subprocess.TimeoutExpired."""
+    with span("clustalw.subprocess"):
+        result = subprocess.run(job.command, cwd=job.workdir, capture_output=True, text=True, timeout=timeout)
+    return result.returncode, result.stdout, result.stderr
+
+
+def collect_job(job):
+    """Return (alignment_text, tree_text) of a finished job; alignment_text is None if nothing was written."""
+    if not os.path.isfile(job.output_file) or not os.path.getsize(job.output_file):
+        return None, None
+    with open(job.output_file) as f:
+        alignment_text = f.read()
+    tree_text = job.tree_text
+    tree_file = os.path.join(job.workdir, "input.dnd")
+    if tree_text is None and os.path.isfile(tree_file):
+        with open(tree_file) as f:
+            tree_text = f.read()
+    return alignment_text, tree_text
+
+
+def remove_job(job):
+    shutil.rmtree(job.workdir, ignore_errors=True)
+
+
+def run_clustalw_job(fasta_file, timeout=None):
+    """Align ``fasta_file`` with ClustalW.
+
+    Returns (alignment_text, raw Newick tree text, guide tree description),
+    or (None, None, None).
+    """
+    try:
+        job = prepare_job(fasta_file)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return None, None, None
+    try:
+        returncode, _, stderr = run_in(job, timeout=timeout)
+        if returncode != 0:
+            print("Error running ClustalW:", stderr)
+            return None, None, None
+        return collect_job(job) + (job.guide_tree_source,)
+    finally:
+        remove_job(job)
@@ -0,0 +1,203 @@
+"""Per-column residue profile of an alignment, shared by the conservation line and scores."""
+import numpy as np
+from benchmark import encode_alignment
+from compact_alignment import TILE_BYTES, column_tiles
+from profiling import timed
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+PROFILE_SYMBOLS = AMINO_ACIDS + "-"
+
+# Groups used by the ClustalW-style "*:." line (see output_manager)
+STRONG_GROUPS = ["STA", "NEQK", "NHQK", "NDEQ", "QHRK", "MILV", "MILF", "HY", "FYW"]
+WEAK_GROUPS = ["CSA", "ATV", "SAG", "STNK", "STPA", "SGND", "SNDEQK", "NDEQHK", "NEQHRK", "FVLIM", "HFY"]
+
+# Groups used by the similarity bonus of the conservation score (see visualization)
+SCORE_GROUPS = ["AILMFWYV", "STNQ", "RHK", "DE", "CGP"]
+
+# BLOSUM62 background amino acid frequencies in AMINO_ACIDS order (Jensen-Shannon reference distribution)
+BLOSUM62_BACKGROUND = np.array([0.074, 0.025, 0.054, 0.054, 0.047, 0.074, 0.026, 0.068, 0.058, 0.099,
+                                0.025, 0.045, 0.039, 0.034, 0.052, 0.057, 0.051, 0.073, 0.013, 0.032])
+
+# Per-column conservation scores: ClustalW-style groups, Shannon entropy, Jensen-Shannon divergence
+CONSERVATION_METHODS = ("groups", "entropy", "jensen-shannon")
+
+
+def _group_masks(symbols, groups):
+    """Return, for each symbol, a bitmask of the groups that contain it."""
+    masks = np.zeros(len(symbols), dtype=np.uint32)
+    for bit, group in enumerate(groups):
+        for index, symbol in enumerate(symbols):
+            if symbol in group:
+                masks[index] |= np.uint32(1 << bit)
+    return masks
+
+
+class ColumnProfile:
+    """Residue counts for every alignment column, built once with vectorized passes.
+
+    ``counts`` has one row per column and one column per distinct character
+    found in the alignment (``symbols``), so non-standard residues are counted
+    exactly rather than folded together. ``residue_counts`` exposes the usual
+    (L, 21) view over the 20 amino acids plus gap.
+    """
+
+    def __init__(self, symbols, counts, num_sequences):
+        self.symbols = symbols
+        self.counts = counts
+        self.num_sequences = num_sequences
+
+        self._strong_masks = _group_masks(symbols, STRONG_GROUPS)
+        self._weak_masks = _group_masks(symbols, WEAK_GROUPS)
+        self._score_masks = _group_masks(symbols, SCORE_GROUPS)
+        self._gap_index = symbols.index("-") if "-" in symbols else None
+
+    @classmethod
+    def from_encoded(cls, encoded, tile_bytes=TILE_BYTES):
+        """Build a profile from an (N, L) uint8 matrix as returned by encode_alignment.
+
+        Columns are counted one tile at a time, so ``encoded`` may be a
+        np.memmap and peak memory stays near ``tile_bytes``.
+        """
+        by_code = np.zeros((256, encoded.shape[1]), dtype=np.int64)
+        for start, stop in column_tiles(*encoded.shape, tile_bytes):
+            tile = np.asarray(encoded[:, start:stop])
+            for code in np.unique(tile):
+                by_code[code, start:stop] = (tile == code).sum(axis=0)
+        codes = np.flatnonzero(by_code.any(axis=1))
+        return cls("".join(map(chr, codes)), by_code[codes].T.copy(), encoded.shape[0])
+
+    @classmethod
+    @timed("column_profile")
+    def from_alignment(cls, alignment):
+        return cls.from_encoded(encode_alignment(alignment))
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    def extend(self, column_position, added):
+        """Profile after inserting columns and appending rows, counting only the new rows.
+
+        ``column_position[j]`` is the new index of column ``j``; the other
+        columns are insertions, gapped in every existing row. ``added`` is the
+        (M, L') uint8 matrix of the appended rows. The result equals a full
+        recount of the extended alignment.
+        """
+        added_profile = ColumnProfile.from_encoded(added)
+        inserted = added.shape[1] - len(column_position)
+        symbols = set(self.symbols) | set(added_profile.symbols)
+        if inserted and self.num_sequences:
+            symbols.add("-")
+        symbols = "".join(sorted(symbols))
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+
+        counts = np.zeros((added.shape[1], len(symbols)), dtype=np.int64)
+        counts[np.ix_(column_position, [index[symbol] for symbol in self.symbols])] = self.counts
+        if inserted and self.num_sequences:
+            is_insertion = np.ones(added.shape[1], dtype=bool)
+            is_insertion[column_position] = False
+            counts[is_insertion, index["-"]] = self.num_sequences
+        counts[:, [index[symbol] for symbol in added_profile.symbols]] += added_profile.counts
+        return ColumnProfile(symbols, counts, self.num_sequences + added.shape[0])
+
+    def region(self, start, end):
+        """Return the profile of columns ``start``..``end`` without recounting."""
+        return ColumnProfile(self.symbols, self.counts[start:end], self.num_sequences)
+
+    @property
+    def residue_counts(self):
+        """(L, 21) counts in ``PROFILE_SYMBOLS`` order; other characters are left out."""
+        profile = np.zeros((len(self), len(PROFILE_SYMBOLS)), dtype=np.int64)
+        for index, symbol in enumerate(PROFILE_SYMBOLS):
+            if symbol in self.symbols:
+                profile[:, index] = self.counts[:, self.symbols.index(symbol)]
+        return profile
+
+    @property
+    def gap_counts(self):
+        if self._gap_index is None:
+            return np.zeros(len(self), dtype=np.int64)
+        return self.counts[:, self._gap_index]
+
+    def _subset_of_any(self, present, masks):
+        """True for columns whose present residues all share at least one group."""
+        shared = np.bitwise_and.reduce(
+            np.where(present, masks[None, :], np.uint32(0xFFFFFFFF)), axis=1
+        )
+        return shared != 0
+
+    def conservation_symbols(self):
+        """Return the ClustalW "*:. " symbol line for every column as a string."""
+        present = self.counts > 0
+        if self._gap_index is not None:
+            present[:, self._gap_index] = False
+        unique_residues = present.sum(axis=1)
+
+        symbols = np.full(len(self), " ", dtype="<U1")
+        weak = self._subset_of_any(present, self._weak_masks)
+        strong = self._subset_of_any(present, self._strong_masks)
+        symbols[weak] = "."
+        symbols[strong] = ":"
+        symbols[unique_residues == 1] = "*"
+        return "".join(symbols)
+
+    def conservation_scores(self):
+        """Return the per-column conservation score used by the heatmap.
+
+        Matches visualization's historical definition: the frequency of the most
+        common character, plus a 0.1-weighted bonus per residue group with more
+        than one member present, minus a 0.2-weighted gap fraction, capped at 1.
+        """
+        n = self.num_sequences
+        basic_score = self.counts.max(axis=1) / n
+
+        similarity_bonus = np.zeros(len(self))
+        for bit in range(len(SCORE_GROUPS)):
+            in_group = (self._score_masks & np.uint32(1 << bit)) != 0
+            group_count = self.counts[:, in_group].sum(axis=1)
+            similarity_bonus = similarity_bonus + np.where(group_count > 1, 0.1 * (group_count / n), 0.0)
+
+        gap_penalty = 0.2 * self.gap_counts / n
+        return np.minimum(1.0, basic_score + similarity_bonus - gap_penalty)
+
+    def _residue_distribution(self, pseudocount=0.0):
+        """(L, 20) amino acid frequencies per column and the fraction of sequences with an amino acid there."""
+        residues = self.residue_counts[:, :len(AMINO_ACIDS)].astype(np.float64)
+        totals = residues.sum(axis=1)
+        frequencies = (residues + pseudocount) / np.maximum(totals + pseudocount * len(AMINO_ACIDS), 1e-12)[:, None]
+        return frequencies, totals / max(self.num_sequences, 1)
+
+    def entropy_scores(self):
+        """Return 1 - H / log2(20) per column, H the Shannon entropy of its amino acids (bits).
+
+        Scores are weighted by the fraction of sequences with an amino acid in
+        the column, so gappy columns score low; 1 means fully conserved.
+        """
+        frequencies, weight = self._residue_distribution()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy = -np.where(frequencies > 0, frequencies * np.log2(frequencies), 0.0).sum(axis=1)
+        return np.where(weight > 0, (1 - entropy / np.log2(len(AMINO_ACIDS))) * weight, 0.0)
+
+    def jensen_shannon_scores(self, background=None, pseudocount=1e-6):
+        """Return the Jensen-Shannon divergence (bits, 0..1) of each column from ``background``.
+
+        ``background`` holds 20 amino acid frequencies in AMINO_ACIDS order
+        (default BLOSUM62_BACKGROUND). As in entropy_scores, scores are weighted
+        by the fraction of sequences with an amino acid in the column.
+        """
+        reference = BLOSUM62_BACKGROUND if background is None else np.asarray(background, dtype=np.float64)
+        reference = reference / reference.sum()
+        frequencies, weight = self._residue_distribution(pseudocount)
+        mixture = 0.5 * (frequencies + reference)
+        divergence = 0.5 * (frequencies * np.log2(frequencies / mixture)).sum(axis=1) \
+            + 0.5 * (reference * np.log2(reference / mixture)).sum(axis=1)
+        return np.where(weight > 0, divergence * weight, 0.0)
+
+    def scores(self, method="groups"):
+        """Per-column conservation scores by one of CONSERVATION_METHODS; raises ValueError otherwise."""
+        if method == "groups":
+            return self.conservation_scores()
+        if method == "entropy":
+            return self.entropy_scores()
+        if method == "jensen-shannon":
+            return self.jensen_shannon_scores()
+        raise ValueError(f"Unknown conservation method: {method}")
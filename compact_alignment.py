@@ -0,0 +1,132 @@
+"""Compact, array-backed alignment container used by the analysis hot paths."""
+import numpy as np
+
+GAP_CODE = ord('-')
+
+# Upper bound on the bytes of alignment touched by one tiled pass
+TILE_BYTES = 32 * 1024 * 1024
+
+
+def column_tiles(num_rows, num_columns, tile_bytes=TILE_BYTES):
+    """Yield (start, stop) column ranges so each (num_rows, stop - start) tile fits ``tile_bytes``."""
+    step = max(1, tile_bytes // max(num_rows, 1))
+    for start in range(0, num_columns, step):
+        yield start, min(start + step, num_columns)
+
+
+def row_tiles(num_rows, num_columns, tile_bytes=TILE_BYTES):
+    """Yield (start, stop) row ranges so each (stop - start, num_columns) tile fits ``tile_bytes``."""
+    step = max(1, tile_bytes // max(num_columns, 1))
+    for start in range(0, num_rows, step):
+        yield start, min(start + step, num_rows)
+
+
+class CompactRecord:
+    """Lightweight stand-in for a SeqRecord: ``id``, ``description`` and a ``seq`` string."""
+
+    __slots__ = ("id", "description", "_row")
+
+    def __init__(self, id, description, row):
+        self.id = id
+        self.description = description
+        self._row = row
+
+    @property
+    def seq(self):
+        return self._row.tobytes().decode("ascii")
+
+    def __len__(self):
+        return len(self._row)
+
+
+class CompactAlignment:
+    """An alignment stored as one contiguous (N, L) uint8 buffer of ASCII codes plus an ID table.
+
+    Rows and columns are NumPy views into the buffer, so slicing a sequence or
+    a column allocates nothing. Iterating yields CompactRecord objects, which
+    keeps code written against MultipleSeqAlignment working.
+    """
+
+    def __init__(self, data, ids, descriptions=None):
+        self.data = np.ascontiguousarray(data, dtype=np.uint8)
+        self.ids = list(ids)
+        self.descriptions = list(descriptions) if descriptions is not None else list(self.ids)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from SeqRecords or a MultipleSeqAlignment; shorter rows are padded with gaps."""
+        records = list(records)
+        seqs = [str(record.seq).encode("ascii", "replace") for record in records]
+        length = max((len(seq) for seq in seqs), default=0)
+        data = np.full((len(seqs), length), GAP_CODE, dtype=np.uint8)
+        for i, seq in enumerate(seqs):
+            data[i, :len(seq)] = np.frombuffer(seq, dtype=np.uint8)
+        return cls(data, [record.id for record in records],
+                   [getattr(record, "description", record.id) for record in records])
+
+    @classmethod
+    def coerce(cls, alignment):
+        """Return ``alignment`` itself if already compact, otherwise convert it."""
+        return alignment if isinstance(alignment, cls) else cls.from_records(alignment)
+
+    def to_alignment(self):
+        """Convert back to a Biopython MultipleSeqAlignment."""
+        from Bio.Align import MultipleSeqAlignment
+        from Bio.Seq import Seq
+        from Bio.SeqRecord import SeqRecord
+
+        return MultipleSeqAlignment([
+            SeqRecord(Seq(self.row_string(i)), id=self.ids[i], description=self.descriptions[i])
+            for i in range(len(self))
+        ])
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def get_alignment_length(self):
+        return self.data.shape[1]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield CompactRecord(self.ids[i], self.descriptions[i], self.data[i])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CompactAlignment(self.data[index], self.ids[index], self.descriptions[index])
+        return CompactRecord(self.ids[index], self.descriptions[index], self.data[index])
+
+    def row(self, i):
+        """Zero-copy view of sequence ``i``."""
+        return self.data[i]
+
+    def column(self, j):
+        """Zero-copy (strided) view of column ``j``."""
+        return self.data[:, j]
+
+    def row_string(self, i, start=0, stop=None):
+        return self.data[i, start:stop].tobytes().decode("ascii")
+
+    def column_string(self, j):
+        return self.data[:, j].tobytes().decode("ascii")
+
+    def select(self, rows=None, columns=None):
+        """Return a sub-alignment; ``rows``/``columns`` are slices (views) or index arrays (copies)."""
+        rows = slice(None) if rows is None else rows
+        columns = slice(None) if columns is None else columns
+        row_indices = range(len(self))[rows] if isinstance(rows, slice) else rows
+        return CompactAlignment(
+            self.data[rows][:, columns],
+            [self.ids[i] for i in row_indices],
+            [self.descriptions[i] for i in row_indices],
+        )
+
+    def gap_counts(self):
+        """Number of gaps in each sequence, counted a row tile at a time."""
+        counts = np.empty(len(self), dtype=np.int64)
+        for start, stop in row_tiles(*self.data.shape):
+            counts[start:stop] = (self.data[start:stop] == GAP_CODE).sum(axis=1)
+        return counts
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
@@ -0,0 +1,157 @@
+"""Head-to-head comparison of two engines run concurrently on the same input.
+
+Both engines go through async_pipeline at the same time; their aligners and
+tree builders are separate processes, so they run on separate cores. The
+comparison reports each engine's wall time, how much the two alignments
+agree and how far apart their guide trees are:
+
+    comparison = run_comparison("input.fasta")["comparison"]
+    comparison["pair_agreement"], comparison["robinson_foulds"]
+"""
+import asyncio
+import io
+import time
+from async_pipeline import pipeline_async
+from benchmark import accuracy_scores
+from profiling import span
+
+DEFAULT_ENGINES = ("MUSCLE", "ClustalW")
+
+
+def alignment_agreement(alignment_a, alignment_b):
+    """Compare two alignments of the same sequences (CompactAlignments, matched by ID).
+
+    Returns (pair agreement, column agreement). Pair agreement is the fraction
+    of residue pairs aligned in either alignment that both align identically,
+    taken symmetrically: the mean of the two directional SP scores. Column
+    agreement is the fraction of ``alignment_b``'s columns that ``alignment_a``
+    reproduces exactly. Raises ValueError unless both hold the same unique IDs.
+    """
+    if len(set(alignment_a.ids)) != len(alignment_a.ids) or sorted(alignment_a.ids) != sorted(alignment_b.ids):
+        raise ValueError("Alignments do not contain the same sequence IDs")
+    row_of = {record_id: i for i, record_id in enumerate(alignment_a.ids)}
+    order = [row_of[record_id] for record_id in alignment_b.ids]
+    rows_a = [alignment_a.row_string(i) for i in order]
+    rows_b = [alignment_b.row_string(i) for i in range(len(alignment_b))]
+    a_in_b, columns = accuracy_scores(rows_a, rows_b)
+    b_in_a, _ = accuracy_scores(rows_b, rows_a)
+    return (a_in_b + b_in_a) / 2, columns
+
+
+def _splits(tree, leaf_bits, full):
+    """Non-trivial bipartitions of a tree as leaf bitmasks, oriented away from the first leaf."""
+    splits = set()
+    size = bin(full).count("1")
+    masks = {}
+    stack = [(tree.root, False)]
+    while stack:
+        clade, expanded = stack.pop()
+        if clade.is_terminal():
+            masks[id(clade)] = leaf_bits.get(clade.name, 0)
+        elif not expanded:
+            stack.append((clade, True))
+            stack.extend((child, False) for child in clade.clades)
+        else:
+            mask = 0
+            for child in clade.clades:
+                mask |= masks.pop(id(child))
+            masks[id(clade)] = mask
+            oriented = full ^ mask if mask & 1 else mask
+            if 1 < bin(oriented).count("1") < size - 1:
+                splits.add(oriented)
+    return splits
+
+
+def robinson_foulds(tree_text_a, tree_text_b):
+    """Unrooted Robinson-Foulds distance between two Newick trees over their shared leaves.
+
+    Returns (distance, normalized distance in [0, 1]).
+    """
+    from Bio import Phylo
+
+    tree_a = Phylo.read(io.StringIO(tree_text_a), "newick")
+    tree_b = Phylo.read(io.StringIO(tree_text_b), "newick")
+    leaves = sorted({leaf.name for leaf in tree_a.get_terminals()}
+                    & {leaf.name for leaf in tree_b.get_terminals()})
+    leaf_bits = {name: 1 << i for i, name in enumerate(leaves)}
+    full = (1 << len(leaves)) - 1
+    distance = len(_splits(tree_a, leaf_bits, full) ^ _splits(tree_b, leaf_bits, full))
+    most = 2 * (len(leaves) - 3)
+    return distance, (distance / most if most > 0 else 0.0)
+
+
+async def compare_async(fasta_file, algorithms=DEFAULT_ENGINES, cache=None, timeout=None,
+                        cluster_threshold=None, col_range=None, seq_range=None):
+    """Run ``algorithms`` concurrently and compare them.
+
+    Returns {"outputs": {algorithm: pipeline_async outputs or None},
+    "comparison": {...}}. An engine that fails, times out or raises is
+    reported as failed with its ``error`` while the others run on. Agreement
+    and tree distance are computed between the first two engines when both
+    succeeded. Raises ValueError unless at least two different algorithms
+    are given.
+    """
+    algorithms = list(algorithms)
+    if len(set(algorithms)) < 2:
+        raise ValueError(f"Comparison needs at least two different algorithms, got {algorithms}")
+
+    async def run_engine(algorithm):
+        start = time.perf_counter()
+        outputs, error = None, None
+        try:
+            with span("compare.engine", algorithm=algorithm):
+                outputs = await pipeline_async(algorithm, fasta_file, cache=cache, timeout=timeout,
+                                               cluster_threshold=cluster_threshold,
+                                               col_range=col_range, seq_range=seq_range)
+            if outputs is None:
+                error = "alignment failed"
+        except Exception as e:
+            print(f"Error running {algorithm}: {e!r}")
+            error = str(e) or type(e).__name__
+        return outputs, time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    runs = await asyncio.gather(*(run_engine(algorithm) for algorithm in algorithms))
+    outputs = {algorithm: run[0] for algorithm, run in zip(algorithms, runs)}
+
+    comparison = {
+        "wall_time_s": time.perf_counter() - start,
+        "engines": [
+            {
+                "algorithm": algorithm,
+                "wall_time_s": wall_time,
+                "succeeded": result is not None,
+                "error": error,
+                "alignment_length": result["result"].alignment.get_alignment_length() if result else None,
+                "gap_count": result["metrics"]["gap_count"] if result else None,
+            }
+            for algorithm, (result, wall_time, error) in zip(algorithms, runs)
+        ],
+        "pair_agreement": None,
+        "column_agreement": None,
+        "robinson_foulds": None,
+        "normalized_robinson_foulds": None,
+    }
+    first, second = (outputs[algorithm] for algorithm in algorithms[:2])
+    if first and second:
+        try:
+            with span("compare.agreement"):
+                comparison["pair_agreement"], comparison["column_agreement"] = alignment_agreement(
+                    first["result"].alignment, second["result"].alignment
+                )
+        except ValueError as e:
+            print(f"Warning: alignments not compared: {e}")
+        if first["result"].tree_text and second["result"].tree_text:
+            with span("compare.robinson_foulds"):
+                comparison["robinson_foulds"], comparison["normalized_robinson_foulds"] = robinson_foulds(
+                    first["result"].tree_text, second["result"].tree_text
+                )
+    return {"outputs": outputs, "comparison": comparison}
+
+
+def run_comparison(fasta_file, algorithms=DEFAULT_ENGINES, cache=None, timeout=None,
+                   cluster_threshold=None, col_range=None, seq_range=None):
+    """Synchronous entry point for compare_async."""
+    return asyncio.run(compare_async(fasta_file, algorithms, cache=cache, timeout=timeout,
+                                     cluster_threshold=cluster_threshold,
+                                     col_range=col_range, seq_range=seq_range))
@@ -0,0 +1,74 @@
+"""Multi-resolution conservation track for long alignments.
+
+Level ``k`` of a ConservationPyramid summarises the per-column conservation
+scores in windows of ``2**k`` columns (min, mean and max), so any column
+range can be served at the coarsest level that still gives at most
+``max_points`` bins. The figure sent to the browser therefore stays the
+same size whether the alignment has 500 or 500,000 columns:
+
+    pyramid = ConservationPyramid(scores, smoothing=15)
+    track = pyramid.window(0, len(scores), max_points=1000)
+"""
+import numpy as np
+
+DEFAULT_MAX_POINTS = 1000
+
+
+def smooth_scores(scores, window):
+    """Centered sliding-window mean; near the ends the window shrinks to the columns available."""
+    scores = np.asarray(scores, dtype=np.float64)
+    if window <= 1 or len(scores) == 0:
+        return scores
+    cumulative = np.concatenate([[0.0], np.cumsum(scores)])
+    index = np.arange(len(scores))
+    lo = np.maximum(index - window // 2, 0)
+    hi = np.minimum(index + (window - 1) // 2 + 1, len(scores))
+    return (cumulative[hi] - cumulative[lo]) / (hi - lo)
+
+
+class ConservationPyramid:
+    """Min/mean/max summaries of conservation scores at every power-of-two window size."""
+
+    def __init__(self, scores, smoothing=1):
+        base = smooth_scores(scores, smoothing)
+        self.smoothing = smoothing
+        self.num_columns = len(base)
+        # Each level keeps (min, max, sum, count); mean is sum / count
+        self.levels = [(base, base, base, np.ones(len(base), dtype=np.int64))]
+        while len(self.levels[-1][0]) > 1:
+            low, high, total, count = self.levels[-1]
+            pairs = np.arange(0, len(low), 2)
+            self.levels.append((np.minimum.reduceat(low, pairs), np.maximum.reduceat(high, pairs),
+                                np.add.reduceat(total, pairs), np.add.reduceat(count, pairs)))
+
+    def level_for(self, start, stop, max_points=DEFAULT_MAX_POINTS):
+        """Finest level at which ``[start, stop)`` spans at most ``max_points`` bins."""
+        span = max(stop - start, 1)
+        level = 0
+        while level < len(self.levels) - 1 and -(-span // (1 << level)) > max_points:
+            level += 1
+        return level
+
+    def window(self, start=0, stop=None, max_points=DEFAULT_MAX_POINTS):
+        """Bins covering columns ``[start, stop)`` at the level chosen by level_for.
+
+        Returns a dict of arrays: ``start``/``stop`` (0-based columns each bin
+        covers, clipped to the range), ``min``, ``mean`` and ``max``, plus the
+        ``bin_width`` in columns. Edge bins may reach past the range, so at
+        most ``max_points + 1`` bins are returned.
+        """
+        stop = self.num_columns if stop is None else min(stop, self.num_columns)
+        start = max(0, min(start, stop))
+        level = self.level_for(start, stop, max_points)
+        width = 1 << level
+        first, last = start // width, -(-stop // width)
+        low, high, total, count = (values[first:last] for values in self.levels[level])
+        bins = np.arange(first, last)
+        return {
+            "start": np.maximum(bins * width, start),
+            "stop": np.minimum((bins + 1) * width, stop),
+            "min": low,
+            "mean": total / np.maximum(count, 1),
+            "max": high,
+            "bin_width": width,
+        }
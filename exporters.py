@@ -0,0 +1,166 @@
+"""Streaming writers for alignments, identity matrices and guide trees.
+
+Every writer takes an open binary handle and writes its output a block of
+rows or columns at a time, assembled with NumPy straight from the
+CompactAlignment buffer, so no output is ever built as one string. Paths
+ending in ``.gz`` are gzip-compressed on the fly:
+
+    with open_output("family.sto.gz") as handle:
+        write_stockholm(alignment, handle)
+    export_alignment(alignment, "family.fa", "fasta")
+"""
+import gzip
+import numpy as np
+from compact_alignment import CompactAlignment, row_tiles
+
+WRAP = 60
+NEWLINE = ord("\n")
+
+
+def open_output(path, compress=None):
+    """Open ``path`` for binary writing, through gzip when ``compress`` (default: path ends in .gz)."""
+    if compress is None:
+        compress = path.endswith(".gz")
+    return gzip.open(path, "wb", compresslevel=6) if compress else open(path, "wb")
+
+
+def _names_block(names, width):
+    """(N, width) uint8 matrix of space-padded names, to prefix alignment lines."""
+    padded = "".join(f"{name[:width]:<{width}}" for name in names).encode("ascii", "replace")
+    return np.frombuffer(padded, dtype=np.uint8).reshape(len(names), width)
+
+
+def _lines(*parts):
+    """Concatenate (N, w) uint8 blocks side by side and end every row with a newline."""
+    newline = np.full((parts[0].shape[0], 1), NEWLINE, dtype=np.uint8)
+    return np.hstack(parts + (newline,)).tobytes()
+
+
+def _column_blocks(alignment, width):
+    for start in range(0, alignment.get_alignment_length(), width):
+        yield start, alignment.data[:, start:start + width]
+
+
+def write_fasta(alignment, handle, line_width=WRAP):
+    """Aligned FASTA, sequences wrapped at ``line_width``, written a row tile at a time."""
+    alignment = CompactAlignment.coerce(alignment)
+    length = alignment.get_alignment_length()
+    breaks = np.arange(line_width, length, line_width)
+    for start, stop in row_tiles(*alignment.data.shape):
+        # Newlines inserted after every line_width columns, plus one at the end of each row
+        rows = np.insert(alignment.data[start:stop], breaks, NEWLINE, axis=1)
+        rows = np.hstack([rows, np.full((stop - start, 1), NEWLINE, dtype=np.uint8)])
+        for row, description in zip(rows, alignment.descriptions[start:stop]):
+            handle.write(f">{description}\n".encode("ascii", "replace"))
+            handle.write(row.tobytes())
+
+
+def write_stockholm(alignment, handle):
+    """Stockholm 1.0 with one line per sequence; descriptions go into #=GS DE lines."""
+    alignment = CompactAlignment.coerce(alignment)
+    width = max((len(record_id) for record_id in alignment.ids), default=0) + 1
+    handle.write(f"# STOCKHOLM 1.0\n#=GF SQ {len(alignment)}\n".encode())
+    for record_id, description in zip(alignment.ids, alignment.descriptions):
+        if description != record_id:
+            text = description[len(record_id):].strip() if description.startswith(record_id) else description
+            handle.write(f"#=GS {record_id} DE {text}\n".encode("ascii", "replace"))
+    for start, stop in row_tiles(*alignment.data.shape):
+        handle.write(_lines(_names_block(alignment.ids[start:stop], width), alignment.data[start:stop]))
+    handle.write(b"//\n")
+
+
+def write_phylip(alignment, handle, relaxed=False, line_width=WRAP):
+    """Interleaved PHYLIP. Strict PHYLIP truncates names to 10 characters and raises
+    ValueError if that makes them collide; relaxed PHYLIP keeps full names.
+    """
+    alignment = CompactAlignment.coerce(alignment)
+    names = ["_".join(record_id.split()) for record_id in alignment.ids]
+    if relaxed:
+        width = max((len(name) for name in names), default=0) + 1
+    else:
+        width = 10
+        if len({name[:width] for name in names}) != len(names):
+            raise ValueError("Sequence names are not unique when truncated to 10 characters; "
+                             "use relaxed PHYLIP")
+    handle.write(f" {len(alignment)} {alignment.get_alignment_length()}\n".encode())
+    padding = np.full((len(alignment), width), ord(" "), dtype=np.uint8)
+    for start, block in _column_blocks(alignment, line_width):
+        if start:
+            handle.write(b"\n")
+        handle.write(_lines(_names_block(names, width) if start == 0 else padding, block))
+
+
+def write_clustal(alignment, handle, profile=None, line_width=WRAP):
+    """CLUSTAL format with the "*:." conservation line, written one block of columns at a time."""
+    from column_profile import ColumnProfile
+
+    alignment = CompactAlignment.coerce(alignment)
+    if profile is None:
+        profile = ColumnProfile.from_encoded(alignment.data)
+    symbols = np.frombuffer(profile.conservation_symbols().encode(), dtype=np.uint8)
+    width = max(max((len(record_id) for record_id in alignment.ids), default=0) + 1, 16)
+    names = _names_block(alignment.ids, width)
+    blank = np.full((1, width), ord(" "), dtype=np.uint8)
+    handle.write(b"CLUSTAL W multiple sequence alignment\n\n\n")
+    for start, block in _column_blocks(alignment, line_width):
+        handle.write(_lines(names, block))
+        handle.write(_lines(blank, symbols[None, start:start + block.shape[1]]))
+        handle.write(b"\n")
+
+
+def write_text_view(alignment, handle, profile=None):
+    """The app's plain-text alignment view (render_alignment_window without color), block by block."""
+    from output_manager import iter_alignment_blocks
+
+    handle.write(b"\n")
+    for block in iter_alignment_blocks(alignment, color=False, profile=profile):
+        handle.write(block.encode())
+
+
+ALIGNMENT_WRITERS = {
+    "fasta": write_fasta,
+    "stockholm": write_stockholm,
+    "phylip": write_phylip,
+    "phylip-relaxed": lambda alignment, handle: write_phylip(alignment, handle, relaxed=True),
+    "clustal": write_clustal,
+    "text": write_text_view,
+}
+
+
+def export_alignment(alignment, path, alignment_format, compress=None):
+    """Write ``alignment`` to ``path`` in one of ALIGNMENT_WRITERS' formats; returns ``path``."""
+    if alignment_format not in ALIGNMENT_WRITERS:
+        raise ValueError(f"Unknown alignment format: {alignment_format}")
+    with open_output(path, compress) as handle:
+        ALIGNMENT_WRITERS[alignment_format](alignment, handle)
+    return path
+
+
+def write_identity_matrix(matrix, sequence_names, handle, matrix_format="txt"):
+    """Write a percent identity matrix row by row as "txt" (the app's table) or "tsv"."""
+    from output_manager import iter_identity_rows
+
+    if matrix_format == "txt":
+        header = "Sequence" + " " * 10 + "".join(f"{i + 1:>10}" for i in range(len(sequence_names)))
+        handle.write(f"Sequence Identity Matrix (%)\n\n{header}\n".encode())
+        for row in iter_identity_rows(matrix, sequence_names):
+            handle.write((row + "\n").encode())
+    elif matrix_format == "tsv":
+        handle.write(("\t".join(["sequence"] + list(sequence_names)) + "\n").encode())
+        for name, row in zip(sequence_names, matrix):
+            handle.write(("\t".join([name] + [f"{val:.2f}" for val in row]) + "\n").encode())
+    else:
+        raise ValueError(f"Unknown matrix format: {matrix_format}")
+
+
+def write_identity_npz(matrix, sequence_names, handle):
+    """Compressed NumPy archive with ``identity`` (float64, N x N) and ``sequence_names`` arrays.
+
+    A np.memmap matrix is copied into the archive in buffered chunks.
+    """
+    np.savez_compressed(handle, identity=matrix if isinstance(matrix, np.ndarray) else np.asarray(matrix),
+                        sequence_names=np.array(sequence_names))
+
+
+def write_tree(tree_text, handle):
+    handle.write(tree_text.encode())
@@ -0,0 +1,114 @@
+"""Streaming FASTA ingestion: validate records and spool them to disk in one pass."""
+
+PROTEIN_ALPHABET = frozenset("ACDEFGHIKLMNPQRSTVWYBJOUXZ*-")
+CHUNK_SIZE = 1 << 20
+
+
+class FastaValidationError(ValueError):
+    """Raised when a FASTA stream fails validation. ``errors`` lists every problem found."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def iter_chunks(file_obj, chunk_size=CHUNK_SIZE):
+    """Yield successive byte chunks from a binary file-like object."""
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk.encode() if isinstance(chunk, str) else chunk
+
+
+def _iter_lines(chunks):
+    """Split a stream of byte chunks into decoded lines without joining the chunks."""
+    remainder = b""
+    for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8", "replace").strip()
+    if remainder:
+        yield remainder.decode("utf-8", "replace").strip()
+
+
+def stream_fasta(chunks, output_file=None, alphabet=PROTEIN_ALPHABET, max_errors=20):
+    """Validate a FASTA byte stream and optionally spool it to ``output_file``.
+
+    Checks that the stream starts with a header, that every record has a
+    non-empty unique ID and at least one residue, and that residues belong
+    to ``alphabet`` (case-insensitive). Sequence lines are written with
+    whitespace removed, so the output is ready for the aligners.
+
+    Returns a dict with ``record_count``, ``total_residues``, ``min_length``,
+    ``max_length`` and ``mean_length``. Raises FastaValidationError listing up
+    to ``max_errors`` problems once the whole stream has been read.
+    """
+    errors = []
+    seen_ids = set()
+    record_count = total_residues = 0
+    min_length = max_length = None
+    current_id, current_length = None, 0
+
+    def error(message):
+        if len(errors) < max_errors:
+            errors.append(message)
+
+    def close_record():
+        nonlocal min_length, max_length, total_residues
+        if current_id is None:
+            return
+        if current_length == 0:
+            error(f"Record '{current_id}' has no sequence")
+        total_residues += current_length
+        min_length = current_length if min_length is None else min(min_length, current_length)
+        max_length = current_length if max_length is None else max(max_length, current_length)
+
+    out = open(output_file, "w") if output_file else None
+    try:
+        for line_number, line in enumerate(_iter_lines(chunks), start=1):
+            if not line:
+                continue
+            if line.startswith(">"):
+                close_record()
+                record_count += 1
+                fields = line[1:].split()
+                current_id = fields[0] if fields else f"<record {record_count}>"
+                current_length = 0
+                if not fields:
+                    error(f"Line {line_number}: header without an ID")
+                elif current_id in seen_ids:
+                    error(f"Line {line_number}: duplicate ID '{current_id}'")
+                seen_ids.add(current_id)
+                if out:
+                    out.write(line + "\n")
+                continue
+
+            if current_id is None:
+                error("Invalid FASTA format. Sequences must start with '>'")
+                current_id = "<no header>"
+            residues = "".join(line.split())
+            invalid = set(residues.upper()) - alphabet
+            if invalid:
+                error(f"Line {line_number}: invalid characters {''.join(sorted(invalid))!r} in '{current_id}'")
+            current_length += len(residues)
+            if out:
+                out.write(residues + "\n")
+        close_record()
+    finally:
+        if out:
+            out.close()
+
+    if record_count == 0 and not errors:
+        error("No FASTA records found")
+    if errors:
+        raise FastaValidationError(errors)
+
+    return {
+        "record_count": record_count,
+        "total_residues": total_residues,
+        "min_length": min_length,
+        "max_length": max_length,
+        "mean_length": total_residues / record_count,
+    }
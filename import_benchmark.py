@@ -0,0 +1,84 @@
+"""Import-time benchmark: cold-import modules in fresh interpreters and enforce budgets.
+
+Alignment-only code paths (workers, the CLI, the pipeline) must not load the
+plotting stack or Streamlit, and must import within a time budget:
+
+    python import_benchmark.py                 # table, exit 1 on a regression
+    python import_benchmark.py --json imports.json --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PLOTTING = ["matplotlib", "seaborn", "plotly", "Bio.Phylo", "streamlit"]
+
+# module -> (time budget in seconds, modules it must not load)
+BUDGETS = {
+    "msa": (0.05, PLOTTING + ["numpy", "Bio"]),
+    "msa.cli": (0.1, PLOTTING + ["numpy", "Bio"]),
+    "alignment": (0.5, PLOTTING),
+    "batch": (0.2, PLOTTING + ["numpy"]),
+    "async_pipeline": (0.5, PLOTTING),
+    "result_cache": (0.2, PLOTTING + ["numpy"]),
+    "benchmark": (0.5, PLOTTING),
+    "progressive": (0.5, PLOTTING),
+    "prefilter": (0.5, PLOTTING),
+    "output_manager": (0.5, PLOTTING),
+    "visualization": (0.5, PLOTTING),
+}
+
+_PROBE = "import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+
+
+def measure(module, repeat=3):
+    """Cold-import ``module`` ``repeat`` times. Returns (median seconds, modules loaded)."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    timings, loaded = [], []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+            capture_output=True, text=True, cwd=root, check=True,
+        )
+        # -X importtime reports "import time: self | cumulative | name" in microseconds
+        cumulative = [
+            int(line.split("|")[1]) for line in result.stderr.splitlines()
+            if line.startswith("import time:") and line.rstrip().endswith(f"| {module}")
+        ]
+        timings.append(cumulative[-1] / 1e6 if cumulative else 0.0)
+        loaded = json.loads(result.stdout)
+    return statistics.median(timings), loaded
+
+
+def check(budgets=BUDGETS, repeat=3):
+    """Measure every module; returns a list of {module, seconds, budget_s, violations} records."""
+    records = []
+    for module, (budget, forbidden) in budgets.items():
+        seconds, loaded = measure(module, repeat)
+        violations = [name for name in forbidden if name in loaded]
+        if seconds > budget:
+            violations.append(f"{seconds:.3f}s > {budget:.3f}s budget")
+        records.append({"module": module, "seconds": seconds, "budget_s": budget, "violations": violations})
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold import times of the pipeline modules.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    records = check(repeat=args.repeat)
+    for record in records:
+        status = "ok" if not record["violations"] else "REGRESSION " + ", ".join(record["violations"])
+        print(f"{record['module']:<16} {record['seconds'] * 1000:>8.1f} ms  (budget {record['budget_s'] * 1000:.0f} ms)  {status}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(records, f, indent=2)
+    return 1 if any(record["violations"] for record in records) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""In-memory memoization of artifacts derived from an alignment.
+
+Streamlit reruns the whole app script on every interaction. An ArtifactMemo
+kept in the session state stores identity matrices, conservation tracks,
+rendered windows and figures under (fingerprint, kind, params), so that
+switching tabs or moving a slider back to an earlier position does not
+recompute them. The fingerprint is any string identifying the alignment; the
+app uses its ResultCache key (input content, algorithm and tool versions).
+
+    memo = ArtifactMemo()
+    metrics = memo.get_or_compute(key, "metrics", lambda: evaluate_records(algorithm, alignment))
+    memo.stats()["hits"]
+"""
+import sys
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Sizes of long lists (e.g. identity matrix rows) are extrapolated from this many items
+_SIZE_SAMPLE = 16
+
+
+def estimate_size(value):
+    """Rough in-memory size of a memoized value in bytes."""
+    if isinstance(value, np.memmap):
+        return sys.getsizeof(value)  # the data stays on disk
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        sample = value[:_SIZE_SAMPLE]
+        per_item = sum(estimate_size(item) for item in sample) / len(sample) if sample else 0
+        return sys.getsizeof(value) + int(per_item * len(value))
+    if hasattr(value, "to_plotly_json"):
+        return estimate_size(value.to_plotly_json())
+    if hasattr(value, "savefig"):
+        # A matplotlib figure is dominated by its RGBA canvas
+        width, height = value.get_size_inches() * value.dpi
+        return int(width * height * 4)
+    if hasattr(value, "nbytes"):
+        # Array-backed containers such as CompactAlignment and AlignmentIndex
+        return sys.getsizeof(value) + value.nbytes
+    return sys.getsizeof(value)
+
+
+class ArtifactMemo:
+    """Least-recently-used memo of derived artifacts, bounded to roughly ``max_bytes``.
+
+    Counts hits and misses overall and per kind; values larger than
+    ``max_bytes`` are computed but not kept.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (fingerprint, kind, params) -> (value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.by_kind = {}
+
+    def _count(self, kind, outcome):
+        counts = self.by_kind.setdefault(kind, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+    def get_or_compute(self, fingerprint, kind, compute, params=(), size=None):
+        """Return the memoized ``kind`` artifact for ``params``, calling ``compute()`` on a miss.
+
+        ``size`` overrides estimate_size for the new value.
+        """
+        key = (fingerprint, kind, params)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._count(kind, "hits")
+            return self._entries[key][0]
+        self.misses += 1
+        self._count(kind, "misses")
+        value = compute()
+        self.put(fingerprint, kind, value, params, size)
+        return value
+
+    def put(self, fingerprint, kind, value, params=(), size=None):
+        """Store an artifact computed elsewhere (e.g. by the concurrent pipeline)."""
+        key = (fingerprint, kind, params)
+        size = estimate_size(value) if size is None else size
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, fingerprint=None):
+        """Drop every artifact of ``fingerprint``, or everything when None."""
+        for key in [key for key in self._entries if fingerprint is None or key[0] == fingerprint]:
+            self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        """Return hit/miss counters, per-kind counters and current memory usage."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "by_kind": {kind: dict(counts) for kind, counts in self.by_kind.items()},
+        }
@@ -0,0 +1,23 @@
+"""Headless alignment pipeline: the same engines, metrics and outputs as the app, without Streamlit.
+
+    import msa
+    result = msa.align("family.fasta", algorithm="MUSCLE")
+    msa.write_outputs(result, "out", "family", alignment_formats=("clustal", "fasta"))
+
+or from the command line:
+
+    python -m msa align families/ --algorithm MUSCLE --format clustal,fasta --output-dir out
+    python -m msa extend out/family.aln new.fasta --identity out/family.identity.json
+
+Importing the package loads nothing else; each function pulls in only the
+modules it needs on first use.
+"""
+
+__all__ = ["align", "evaluate", "extend", "run", "validate", "write_outputs"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from msa import api
+        return getattr(api, name)
+    raise AttributeError(f"module 'msa' has no attribute {name!r}")
@@ -0,0 +1,4 @@
+import sys
+from msa.cli import main
+
+sys.exit(main())
@@ -0,0 +1,200 @@
+"""Python API of the headless pipeline. Heavy modules are imported inside each function."""
+import json
+import os
+import tempfile
+import time
+
+ALIGNMENT_EXTENSIONS = {
+    "clustal": "aln",
+    "fasta": "fasta",
+    "stockholm": "sto",
+    "phylip": "phy",
+    # Distinct from strict PHYLIP so both can be written side by side and read back as written
+    "phylip-relaxed": "phyr",
+    "nexus": "nex",
+    "text": "txt",
+    "html": "html",
+}
+MATRIX_FORMATS = ("txt", "tsv", "json", "npz")
+
+
+def validate(fasta_file, output_file=None):
+    """Stream-validate a FASTA file; returns its stats or raises fasta_io.FastaValidationError.
+
+    With ``output_file`` the cleaned records are written there, ready for the aligners.
+    """
+    from fasta_io import iter_chunks, stream_fasta
+
+    with open(fasta_file, "rb") as f:
+        return stream_fasta(iter_chunks(f), output_file)
+
+
+def align(fasta_file, algorithm="MUSCLE", cache=True, timeout=None, cluster_threshold=None):
+    """Validate and align one FASTA file, building its guide tree. Returns an AlignmentResult.
+
+    ``cache`` is True for the default result cache, False/None for none, or a
+    ResultCache. Raises FastaValidationError for invalid input, ValueError for
+    fewer than two sequences, RuntimeError when the aligner produced nothing
+    and subprocess.TimeoutExpired when an external tool exceeds ``timeout``.
+    """
+    from alignment import run_pipeline
+    from result_cache import get_default_cache
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".fa") as tmp_file:
+        input_file = tmp_file.name
+    try:
+        stats = validate(fasta_file, input_file)
+        if stats["record_count"] <= 1:
+            raise ValueError(f"{fasta_file}: at least two sequences are needed for an alignment")
+        if cache is True:
+            cache = get_default_cache()
+        result = run_pipeline(algorithm, input_file, cache=cache or None, timeout=timeout,
+                              cluster_threshold=cluster_threshold)
+    finally:
+        for path in (input_file, os.path.splitext(input_file)[0] + ".dnd"):
+            if os.path.exists(path):
+                os.remove(path)
+    if result is None:
+        raise RuntimeError(f"{algorithm} produced no alignment for {fasta_file}")
+    return result
+
+
+def extend(alignment_file, fasta_file, alignment_format=None, previous_metrics=None):
+    """Add the sequences of ``fasta_file`` to an existing alignment without realigning it.
+
+    ``alignment_format`` defaults to one guessed from the file extension
+    (ALIGNMENT_EXTENSIONS, or "fasta" for .fa/.fas/.afa). ``previous_metrics``
+    is reused as in profile_extension.extend_alignment_file. Returns an
+    AlignmentResult and the extension's metrics, as (result, metrics). Raises
+    FastaValidationError for invalid new sequences and ValueError for
+    duplicate IDs.
+    """
+    from alignment import AlignmentResult
+    from profile_extension import extend_alignment_file
+
+    if alignment_format is None:
+        extension = os.path.splitext(alignment_file)[1].lstrip(".").lower()
+        formats = {ext: name for name, ext in ALIGNMENT_EXTENSIONS.items() if name not in ("text", "html")}
+        alignment_format = formats.get(extension, "fasta" if extension in ("fa", "fas", "afa") else "clustal")
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".fa") as tmp_file:
+        input_file = tmp_file.name
+    try:
+        validate(fasta_file, input_file)
+        extended = extend_alignment_file(alignment_file, alignment_format, input_file, previous_metrics)
+    finally:
+        os.remove(input_file)
+    result = AlignmentResult(extended["metrics"]["algorithm"], extended["alignment"], extended["alignment_text"],
+                             alignment_format)
+    return result, extended["metrics"]
+
+
+def evaluate(result):
+    """Identity and similarity matrices, SP score and summary counts of an AlignmentResult (see benchmark.evaluate_records)."""
+    from benchmark import evaluate_records
+
+    return evaluate_records(result.algorithm, result.alignment)
+
+
+def _write_alignment(result, alignment_format, handle):
+    from exporters import ALIGNMENT_WRITERS
+
+    if alignment_format == result.alignment_format:
+        # The aligner's own output, byte for byte
+        handle.write(result.alignment_text.encode())
+    elif alignment_format == "html":
+        from output_manager import render_alignment_window
+
+        handle.write(render_alignment_window(result.alignment, color=True).encode())
+    elif alignment_format in ALIGNMENT_WRITERS:
+        ALIGNMENT_WRITERS[alignment_format](result.alignment, handle)
+    else:
+        alignment = result.alignment.to_alignment()
+        # NEXUS (and other typed formats) need the molecule type; every engine aligns proteins
+        for record in alignment:
+            record.annotations["molecule_type"] = "protein"
+        handle.write(format(alignment, alignment_format).encode())
+
+
+def _write_matrix(metrics, matrix_format, handle):
+    from exporters import write_identity_matrix, write_identity_npz
+
+    matrix, names = metrics["identity_matrix"], metrics["sequence_names"]
+    if matrix_format == "npz":
+        write_identity_npz(matrix, names, handle)
+    elif matrix_format == "json":
+        document = {"sequence_names": names, "identity_matrix": [list(row) for row in matrix]}
+        if metrics.get("similarity_matrix") is not None:
+            # Read back by ``msa extend --identity`` to update both matrices
+            document["substitution_matrix"] = metrics["substitution_matrix"]
+            document["similarity_matrix"] = [list(row) for row in metrics["similarity_matrix"]]
+        handle.write(json.dumps(document).encode())
+    else:
+        write_identity_matrix(matrix, names, handle, matrix_format)
+
+
+def write_outputs(result, output_dir, stem, alignment_formats=("clustal",), tree=True,
+                  matrix_format="txt", metrics=None, compress=False):
+    """Write an AlignmentResult's outputs as ``<output_dir>/<stem>.<ext>``; returns {kind: path}.
+
+    ``alignment_formats`` are keys of ALIGNMENT_EXTENSIONS ("text" and "html"
+    are the app's plain and colored views); other Biopython alignment formats
+    are written with their name as extension. Files are streamed by the
+    writers in exporters.py. ``matrix_format`` is one of MATRIX_FORMATS or
+    None; ``metrics`` is reused when already computed. With ``compress``
+    every text output is gzipped and gets a ``.gz`` suffix.
+    """
+    from exporters import open_output, write_tree
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+
+    def write(kind, extension, writer, gzipped=compress):
+        path = os.path.join(output_dir, f"{stem}.{extension}" + (".gz" if gzipped else ""))
+        with open_output(path, gzipped) as handle:
+            writer(handle)
+        paths[kind] = path
+
+    for alignment_format in alignment_formats:
+        write(alignment_format, ALIGNMENT_EXTENSIONS.get(alignment_format, alignment_format),
+              lambda handle: _write_alignment(result, alignment_format, handle))
+    if tree and result.tree_text:
+        write("tree", "dnd", lambda handle: write_tree(result.tree_text, handle))
+    if matrix_format:
+        metrics = metrics or evaluate(result)
+        # .npz archives are compressed already
+        write("identity_matrix", f"identity.{matrix_format}", lambda handle: _write_matrix(metrics, matrix_format, handle),
+              gzipped=compress and matrix_format != "npz")
+    return paths
+
+
+def run(inputs, output_dir, algorithm="MUSCLE", alignment_formats=("clustal",), tree=True,
+        matrix_format="txt", cache=True, timeout=None, cluster_threshold=None, compress=False):
+    """Run the full pipeline over FASTA files and directories, yielding one summary dict per file.
+
+    Failures are reported in the summary (``status`` "failed" or "timeout"
+    with an ``error``) rather than raised, so one bad file does not stop a run.
+    """
+    import subprocess
+    from batch import collect_fasta_files
+    from fasta_io import FastaValidationError
+
+    for fasta_file in collect_fasta_files(inputs):
+        summary = {"fasta_file": fasta_file, "algorithm": algorithm}
+        start = time.perf_counter()
+        try:
+            result = align(fasta_file, algorithm, cache=cache, timeout=timeout,
+                           cluster_threshold=cluster_threshold)
+            metrics = evaluate(result) if matrix_format else None
+            stem = os.path.splitext(os.path.basename(fasta_file))[0]
+            summary["outputs"] = write_outputs(result, output_dir, stem, alignment_formats, tree,
+                                               matrix_format, metrics, compress)
+            summary.update(status="done", num_sequences=len(result.alignment),
+                           alignment_length=result.alignment.get_alignment_length())
+        except subprocess.TimeoutExpired as e:
+            summary.update(status="timeout", error=str(e))
+        except FastaValidationError as e:
+            summary.update(status="failed", error="; ".join(e.errors))
+        except (OSError, ValueError, RuntimeError) as e:
+            summary.update(status="failed", error=str(e))
+        summary["elapsed_s"] = time.perf_counter() - start
+        yield summary
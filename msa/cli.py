@@ -0,0 +1,151 @@
+"""Command line interface: ``python -m msa <command> ...``.
+
+    python -m msa align families/ --algorithm MUSCLE --format clustal,fasta --matrix tsv
+    python -m msa extend family.aln new.fasta --identity family.identity.json
+    python -m msa validate input.fasta
+    python -m msa cache stats
+
+Only argparse is loaded up front; each command imports what it needs.
+"""
+import argparse
+import json
+import os
+import sys
+
+ALGORITHMS = ["ClustalW", "MUSCLE", "Progressive"]
+
+
+def _csv(value):
+    return [item for item in value.split(",") if item]
+
+
+def cmd_align(args):
+    from msa.api import run
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary = []
+    for info in run(args.inputs, args.output_dir, algorithm=args.algorithm, alignment_formats=args.format,
+                    tree=not args.no_tree, matrix_format=None if args.matrix == "none" else args.matrix,
+                    cache=not args.no_cache, timeout=args.timeout, cluster_threshold=args.cluster_identity,
+                    compress=args.gzip):
+        line = f"{info['status']:<8} {info['fasta_file']} ({info['elapsed_s']:.2f}s)"
+        print(line if info["status"] == "done" else f"{line}: {info['error']}")
+        summary.append(info)
+    if not summary:
+        print("No FASTA files found", file=sys.stderr)
+        return 1
+    with open(os.path.join(args.output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return 0 if all(info["status"] == "done" for info in summary) else 1
+
+
+def cmd_extend(args):
+    from fasta_io import FastaValidationError
+    from msa.api import extend, write_outputs
+
+    previous_metrics = None
+    if args.identity:
+        with open(args.identity) as f:
+            previous_metrics = json.load(f)
+    try:
+        result, metrics = extend(args.alignment, args.fasta, alignment_format=args.format,
+                                 previous_metrics=previous_metrics)
+    except FastaValidationError as e:
+        print(f"invalid  {args.fasta}")
+        for message in e.errors:
+            print(f"  - {message}")
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"failed   {args.alignment}: {e}", file=sys.stderr)
+        return 1
+    stem = os.path.splitext(os.path.basename(args.alignment))[0]
+    paths = write_outputs(result, args.output_dir, stem, (result.alignment_format,), tree=False,
+                          matrix_format=None if args.matrix == "none" else args.matrix, metrics=metrics,
+                          compress=args.gzip)
+    print(f"extended {args.alignment}: {metrics['total_sequences']} sequences, "
+          f"{metrics['total_length']} columns -> {', '.join(paths.values())}")
+    return 0
+
+
+def cmd_validate(args):
+    from batch import collect_fasta_files
+    from fasta_io import FastaValidationError
+    from msa.api import validate
+
+    status = 0
+    for fasta_file in collect_fasta_files(args.inputs):
+        try:
+            stats = validate(fasta_file)
+        except FastaValidationError as e:
+            status = 1
+            print(f"invalid  {fasta_file}")
+            for message in e.errors:
+                print(f"  - {message}")
+        except OSError as e:
+            status = 1
+            print(f"error    {fasta_file}: {e}")
+        else:
+            print(f"ok       {fasta_file}: {stats['record_count']} sequences, "
+                  f"lengths {stats['min_length']}-{stats['max_length']}")
+    return status
+
+
+def cmd_cache(args):
+    from result_cache import get_default_cache
+
+    cache = get_default_cache()
+    if args.action == "clear":
+        cache.clear()
+        print(f"Cleared {cache.cache_dir}")
+    else:
+        print(json.dumps(cache.stats(), indent=2))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="msa", description="Headless multiple protein sequence alignment.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    align = commands.add_parser("align", help="align FASTA files and write alignment, tree and matrix outputs")
+    align.add_argument("inputs", nargs="+", help="FASTA files or directories of FASTA files")
+    align.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="MUSCLE")
+    align.add_argument("-o", "--output-dir", default="msa_results")
+    align.add_argument("-f", "--format", type=_csv, default=["clustal"],
+                       help="comma-separated alignment formats: clustal, fasta, stockholm, phylip, "
+                            "phylip-relaxed, nexus, text, html")
+    align.add_argument("--matrix", choices=["txt", "tsv", "json", "npz", "none"], default="txt",
+                       help="identity matrix format")
+    align.add_argument("--gzip", action="store_true", help="gzip the alignment, tree and text matrix outputs")
+    align.add_argument("--no-tree", action="store_true", help="do not write the guide tree")
+    align.add_argument("--no-cache", action="store_true", help="do not read or write the result cache")
+    align.add_argument("--timeout", type=float, default=None, help="per-process timeout in seconds")
+    align.add_argument("--cluster-identity", type=float, default=None,
+                       help="cluster sequences at this identity (0-1) and align representatives only")
+    align.set_defaults(func=cmd_align)
+
+    extend = commands.add_parser("extend", help="add new sequences to an existing alignment without realigning it")
+    extend.add_argument("alignment", help="existing Clustal or FASTA alignment")
+    extend.add_argument("fasta", help="FASTA file of sequences to add")
+    extend.add_argument("-o", "--output-dir", default="msa_results")
+    extend.add_argument("-f", "--format", default=None,
+                        help="alignment format (default: guessed from the file extension)")
+    extend.add_argument("--identity", help="JSON identity matrix of the existing alignment to update "
+                                           "(from align --matrix json)")
+    extend.add_argument("--matrix", choices=["txt", "tsv", "json", "npz", "none"], default="json",
+                        help="identity matrix format")
+    extend.add_argument("--gzip", action="store_true", help="gzip the alignment and text matrix outputs")
+    extend.set_defaults(func=cmd_extend)
+
+    validate = commands.add_parser("validate", help="check FASTA files without aligning them")
+    validate.add_argument("inputs", nargs="+", help="FASTA files or directories of FASTA files")
+    validate.set_defaults(func=cmd_validate)
+
+    cache = commands.add_parser("cache", help="inspect or clear the result cache")
+    cache.add_argument("action", choices=["stats", "clear"])
+    cache.set_defaults(func=cmd_cache)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
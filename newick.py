@@ -0,0 +1,178 @@
+"""Newick text helpers, kept free of plotting and tree-library imports.
+
+``parse_newick`` reads a tree into flat arrays and ``layout_tree`` computes
+rectangular-cladogram coordinates from them; both are linear in the number
+of nodes and iterative, so trees with thousands of leaves need no recursion
+and no Bio.Phylo objects.
+"""
+import re
+import numpy as np
+
+_TOKENS = re.compile(r"[(),;]|[^(),;]+")
+
+
+def format_newick_string(newick_str):
+    """Format a Newick tree string to be more readable with indentation."""
+    parts = []
+    indent = 0
+    for token in re.split(r"([(),])", newick_str):
+        if token == '(':
+            indent += 2
+            parts.append('(\n' + ' ' * indent)
+        elif token == ',':
+            parts.append(',\n' + ' ' * indent)
+        elif token == ')':
+            indent -= 2
+            parts.append('\n' + ' ' * indent + ')')
+        else:
+            parts.append(token)
+    return "".join(parts)
+
+
+class NewickTree:
+    """A tree as flat per-node lists; node 0 is the root and children keep file order."""
+
+    def __init__(self, names, parents, lengths, children):
+        self.names = names
+        self.parents = parents
+        self.lengths = lengths
+        self.children = children
+
+    def __len__(self):
+        return len(self.names)
+
+    def leaves(self):
+        return [node for node in range(len(self)) if not self.children[node]]
+
+    def preorder(self, collapsed=()):
+        """Node indices in preorder, not descending into ``collapsed`` nodes."""
+        order, stack = [], [0]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if node not in collapsed:
+                stack.extend(reversed(self.children[node]))
+        return order
+
+    def depths(self):
+        """Number of edges from the root to every node."""
+        depth = [0] * len(self)
+        for node in self.preorder()[1:]:
+            depth[node] = depth[self.parents[node]] + 1
+        return depth
+
+
+def _parse_label(token):
+    label, _, length = token.strip().partition(":")
+    label = label.strip()
+    if len(label) > 1 and label[0] == label[-1] == "'":
+        label = label[1:-1].replace("''", "'")
+    try:
+        length = float(length) if length.strip() else 0.0
+    except ValueError:
+        length = 0.0
+    return label, length
+
+
+def parse_newick(text):
+    """Parse a Newick string (with or without pretty-printing whitespace) into a NewickTree."""
+    names, parents, lengths, children = [""], [-1], [0.0], [[]]
+
+    def add_child(parent):
+        names.append("")
+        parents.append(parent)
+        lengths.append(0.0)
+        children.append([])
+        children[parent].append(len(names) - 1)
+        return len(names) - 1
+
+    current, stack = 0, []
+    for token in _TOKENS.findall(text):
+        if token == "(":
+            stack.append(current)
+            current = add_child(current)
+        elif token == ",":
+            if not stack:
+                raise ValueError("Malformed Newick: ',' outside parentheses")
+            current = add_child(stack[-1])
+        elif token == ")":
+            if not stack:
+                raise ValueError("Malformed Newick: unbalanced ')'")
+            current = stack.pop()
+        elif token == ";":
+            break
+        elif token.strip():
+            names[current], lengths[current] = _parse_label(token)
+    if stack:
+        raise ValueError("Malformed Newick: unbalanced '('")
+    return NewickTree(names, parents, lengths, children)
+
+
+def clades_at_depth(tree, depth):
+    """Internal nodes exactly ``depth`` edges below the root, e.g. to collapse a tree to its top levels."""
+    return {node for node, node_depth in enumerate(tree.depths())
+            if node_depth == depth and tree.children[node]}
+
+
+def layout_tree(tree, collapsed=()):
+    """Rectangular layout of a NewickTree. Returns a dict of NumPy arrays and lists.
+
+    ``x`` is the distance from the root (negative branch lengths count as 0),
+    ``y`` the row of each visible leaf, with internal nodes centred on their
+    children. ``collapsed`` nodes are drawn as a single row with a triangle
+    reaching their deepest descendant. ``segments`` holds every branch as
+    ((x0, y0), (x1, y1)), ready for one batched line collection, and
+    ``triangles`` one (3, 2) polygon per collapsed clade. ``tips`` lists the
+    visible rows top to bottom with their ``labels`` and ``tip_x``, where a
+    label starts.
+    """
+    collapsed = set(collapsed)
+    size = len(tree)
+    full_order = tree.preorder()
+    x = np.zeros(size)
+    for node in full_order[1:]:
+        x[node] = x[tree.parents[node]] + max(tree.lengths[node], 0.0)
+
+    # Deepest descendant and leaf count of every clade, children before parents
+    reach = x.copy()
+    leaf_count = np.zeros(size, dtype=np.int64)
+    for node in reversed(full_order):
+        if not tree.children[node]:
+            leaf_count[node] = 1
+        parent = tree.parents[node]
+        if parent >= 0:
+            reach[parent] = max(reach[parent], reach[node])
+            leaf_count[parent] += leaf_count[node]
+
+    order = tree.preorder(collapsed)
+    y = np.full(size, np.nan)
+    tips = [node for node in order if node in collapsed or not tree.children[node]]
+    y[tips] = np.arange(len(tips))
+    for node in reversed(order):
+        if node not in collapsed and tree.children[node]:
+            y[node] = (y[tree.children[node][0]] + y[tree.children[node][-1]]) / 2
+
+    segments = []
+    for node in order:
+        if node:
+            segments.append(((x[tree.parents[node]], y[node]), (x[node], y[node])))
+        if node not in collapsed and tree.children[node]:
+            segments.append(((x[node], y[tree.children[node][0]]), (x[node], y[tree.children[node][-1]])))
+    triangles = [
+        ((x[node], y[node]), (reach[node], y[node] - 0.4), (reach[node], y[node] + 0.4))
+        for node in tips if node in collapsed
+    ]
+
+    return {
+        "x": x,
+        "y": y,
+        "tips": tips,
+        "tip_x": np.array([reach[node] if node in collapsed else x[node] for node in tips]),
+        "labels": [
+            f"{tree.names[node] or 'clade'} ({leaf_count[node]} leaves)" if node in collapsed else tree.names[node]
+            for node in tips
+        ],
+        "leaf_count": leaf_count,
+        "segments": np.array(segments, dtype=np.float64).reshape(-1, 2, 2),
+        "triangles": np.array(triangles, dtype=np.float64).reshape(-1, 3, 2),
+    }
@@ -1,7 +1,7 @@
 # output_manager.py
-from Bio import AlignIO
-from io import StringIO
-from Bio.Align import MultipleSeqAlignment
+from column_profile import ColumnProfile
+from compact_alignment import GAP_CODE, CompactAlignment
+from profiling import timed
 
 
 # def save_aligned_output(output_file, alignment, format_type="clustal"):
@@ -15,114 +15,183 @@ from Bio.Align import MultipleSeqAlignment
 #     else:
 #         alignment = AlignIO.read(file_path, "fasta") 
 #     return alignment
-def format_alignment_to_clustal_with_and_without_colors(alignment):
-    """Format a MultipleSeqAlignment object to CLUSTAL format with and without color coding."""
-    
-    # Amino acid colors
-    color_map = {
-        'A': '#FF6347', 'C': '#32CD32', 'D': '#FFD700', 'E': '#4682B4',
-        'F': '#FF69B4', 'G': '#ADFF2F', 'H': '#FF8C00', 'I': '#8A2BE2',
-        'K': '#00FA9A', 'L': '#DA70D6', 'M': '#8B4513', 'N': '#0000CD',
-        'P': '#FFD700', 'Q': '#6A5ACD', 'R': '#20B2AA', 'S': '#D2691E',
-        'T': '#D3D3D3', 'V': '#FF4500', 'W': '#FF1493', 'Y': '#7FFF00',
-        '-': '#B0C4DE',
+# Amino acid colors
+COLOR_MAP = {
+    'A': '#FF6347', 'C': '#32CD32', 'D': '#FFD700', 'E': '#4682B4',
+    'F': '#FF69B4', 'G': '#ADFF2F', 'H': '#FF8C00', 'I': '#8A2BE2',
+    'K': '#00FA9A', 'L': '#DA70D6', 'M': '#8B4513', 'N': '#0000CD',
+    'P': '#FFD700', 'Q': '#6A5ACD', 'R': '#20B2AA', 'S': '#D2691E',
+    'T': '#D3D3D3', 'V': '#FF4500', 'W': '#FF1493', 'Y': '#7FFF00',
+    '-': '#B0C4DE',
+}
+
+LINE_WIDTH = 60
+NAME_WIDTH = 15
+
+
+def _residue_class(aa):
+    return 'r-gap' if aa == '-' else f"r-{aa}"
+
+
+# One CSS class per residue instead of an inline style on every span
+CSS_STYLES = """
+<style>
+    .seq-char {
+        display: inline-block;
+        width: 1.2ch;
+        text-align: center;
+        margin: 0;
+        font-size: 14.5px;
     }
-
-    # Define conservation groups
-    strong_groups = [
-        set("STA"), set("NEQK"), set("NHQK"), set("NDEQ"),
-        set("QHRK"), set("MILV"), set("MILF"), set("HY"), set("FYW")
-    ]
-    weak_groups = [
-        set("CSA"), set("ATV"), set("SAG"), set("STNK"), set("STPA"),
-        set("SGND"), set("SNDEQK"), set("NDEQHK"), set("NEQHRK"),
-        set("FVLIM"), set("HFY")
-    ]
-
-    # Updated CSS styles for better spacing
-    css_styles = """
-    <style>
-        .seq-char {
-            display: inline-block;
-            width: 1.2ch;
-            text-align: center;
-            margin: 0;
-            font-size: 14.5px;
-        }
-        .conservation-char {
-            display: inline-block;
-            width: 1.2ch;
-            text-align: center;
-            margin: 0;
-            font-size: 14.5px;
-        }
-        .sequence-block {
-            font-size: 12px;
-            font-family: monospace;
-        }
-        .header {
-            font-size: 14px;
-            margin-bottom: 10px;
-        }
-    </style>
+    .conservation-char {
+        display: inline-block;
+        width: 1.2ch;
+        text-align: center;
+        margin: 0;
+        font-size: 14.5px;
+    }
+    .sequence-block {
+        font-size: 12px;
+        font-family: monospace;
+    }
+    .header {
+        font-size: 14px;
+        margin-bottom: 10px;
+    }
+    .aln-row {
+        margin: 0;
+        line-height: 1;
+    }
+    .aln-name {
+        display: inline-block;
+        width: %dch;
+    }
+%s
+</style>
+""" % (NAME_WIDTH, "\n".join(
+    f"    .{_residue_class(aa)} {{ color: {color}; }}" for aa, color in COLOR_MAP.items()
+))
+
+
+class _ResidueSpans(dict):
+    """Lazily built, reused <span> markup for each residue character."""
+
+    def __missing__(self, aa):
+        upper = aa.upper()
+        display_char = '&#8209;' if aa == '-' else aa
+        if upper in COLOR_MAP:
+            span = f"<span class='seq-char {_residue_class(upper)}'>{display_char}</span>"
+        else:
+            span = f"<span class='seq-char' style='color:black;'>{display_char}</span>"
+        self[aa] = span
+        return span
+
+
+_RESIDUE_SPANS = _ResidueSpans()
+_CONSERVATION_SPANS = {symbol: f"<span class='conservation-char'>{symbol}</span>" for symbol in "*:. "}
+
+
+def iter_alignment_blocks(alignment, color=True, col_range=None, seq_range=None,
+                          line_width=LINE_WIDTH, name_width=NAME_WIDTH, profile=None,
+                          rows=None, start_positions=None):
+    """Yield the CLUSTAL-style view of an alignment one block of ``line_width`` columns at a time.
+
+    ``col_range`` and ``seq_range`` are (start, end) slices restricting the view
+    to a window, so the work done is proportional to what is rendered; ``rows``
+    (an array of row numbers, e.g. from AlignmentIndex.rows) selects sequences
+    instead of ``seq_range``. When ``color`` is True blocks are HTML that
+    relies on ``CSS_STYLES``; otherwise they are plain text. Residue counts at
+    the end of each line are positions in the full ungapped sequence, not in
+    the window; ``start_positions`` (residues before the window, per row, e.g.
+    AlignmentIndex.residues_before) saves counting them. ``profile`` is the
+    alignment's ColumnProfile; it is built once here when not supplied.
+    Accepts a MultipleSeqAlignment or a CompactAlignment.
     """
-
-    no_color_output = "\n"
-    color_output = f"{css_styles}\n"
-    
+    alignment = CompactAlignment.coerce(alignment)
     seq_length = alignment.get_alignment_length()
-    line_width = 60
-    name_width = 15
-    cumulative_positions = {record.id: 0 for record in alignment}
-
-    for start in range(0, seq_length, line_width):
-        chunk_columns = []
-        for i in range(start, min(start + line_width, seq_length)):
-            chunk_columns.append(set(alignment[:, i].replace("-", "").upper()))
+    col_start, col_end = col_range or (0, seq_length)
+    col_end = min(col_end, seq_length)
+    if rows is None:
+        seq_start, seq_end = seq_range or (0, len(alignment))
+        rows = slice(seq_start, seq_end)
+        row_ids = alignment.ids[rows]
+    else:
+        row_ids = [alignment.ids[i] for i in rows]
+    # A view for a slice of rows; only the window's columns are copied for an array of rows
+    window = alignment.data[rows, col_start:col_end]
+    if profile is None:
+        profile = ColumnProfile.from_alignment(alignment)
+    symbol_line = profile.region(col_start, col_end).conservation_symbols()
+
+    stripped_ids = [record_id.split('|')[0][:name_width] for record_id in row_ids]
+    if start_positions is None:
+        start_positions = col_start - (alignment.data[rows, :col_start] == GAP_CODE).sum(axis=1)
+    cumulative_positions = start_positions
+
+    for start in range(col_start, col_end, line_width):
+        stop = min(start + line_width, col_end)
+        lines = []
 
         # Process sequences
-        for record in alignment:
-            stripped_id = record.id.split('|')[0][:name_width]
-            sequence_chunk = str(record.seq[start:start + line_width])
-            
-            sequence_length = len(sequence_chunk.replace('-', ''))
-            cumulative_positions[record.id] += sequence_length
+        block = window[:, start - col_start:stop - col_start]
+        cumulative_positions = cumulative_positions + (block != GAP_CODE).sum(axis=1)
+        for index, stripped_id in enumerate(stripped_ids):
+            sequence_chunk = block[index].tobytes().decode("ascii")
+            position = cumulative_positions[index]
+
+            if color:
+                lines.append(
+                    f"<pre class='aln-row'><span class='aln-name'>{stripped_id}</span> "
+                    + "".join(_RESIDUE_SPANS[aa] for aa in sequence_chunk)
+                    + f" {position:>4}</pre>"
+                )
+            else:
+                lines.append(f"{stripped_id:<{name_width}} {sequence_chunk} {position:>4}\n")
 
-            # No color output
-            no_color_output += f"{stripped_id:<{name_width}} {sequence_chunk} {cumulative_positions[record.id]:>4}\n"
+        # Add conservation symbols
+        conservation_line_str = symbol_line[start - col_start:stop - col_start]
+        if color:
+            lines.append(
+                "<pre class='aln-row'><span class='aln-name'></span> "
+                + "".join(_CONSERVATION_SPANS[symbol] for symbol in conservation_line_str)
+                + "</pre>\n\n"
+            )
+        else:
+            lines.append(" " * (name_width + 1) + conservation_line_str + "\n\n")
+
+        yield "".join(lines)
+
+
+@timed("format_alignment_window")
+def render_alignment_window(alignment, color=True, col_range=None, seq_range=None, profile=None,
+                            rows=None, start_positions=None):
+    """Render one window of the alignment, including the stylesheet for colored output."""
+    body = "".join(iter_alignment_blocks(
+        alignment, color=color, col_range=col_range, seq_range=seq_range, profile=profile,
+        rows=rows, start_positions=start_positions
+    ))
+    return f"{CSS_STYLES}\n{body}" if color else f"\n{body}"
+
+
+@timed("format_alignment_to_clustal_with_and_without_colors")
+def format_alignment_to_clustal_with_and_without_colors(alignment):
+    """Format a MultipleSeqAlignment object to CLUSTAL format with and without color coding."""
+    alignment = CompactAlignment.coerce(alignment)
+    profile = ColumnProfile.from_alignment(alignment)
+    return (
+        render_alignment_window(alignment, color=False, profile=profile),
+        render_alignment_window(alignment, color=True, profile=profile),
+    )
 
-            # Color output with reduced line height
-            color_output += f"<pre style='margin: 0; line-height: 1;'><span style='display: inline-block; width: {name_width}ch;'>{stripped_id}</span> "
 
-            for pos, aa in enumerate(sequence_chunk):
-                color = color_map.get(aa.upper(), 'black')
-                display_char = '&#8209;' if aa == '-' else aa
-                color_output += f"<span class='seq-char' style='color:{color};'>{display_char}</span>"
+def iter_identity_rows(matrix, sequence_names):
+    """Yield one fixed-width text row per sequence of a percent identity matrix."""
+    for name, row in zip(sequence_names, matrix):
+        yield f"{name[:10]:<10}" + "".join(f"{val:>10.1f}" for val in row)
 
-            color_output += f" {cumulative_positions[record.id]:>4}</pre>"
 
-        # Add conservation symbols
-        conservation_line = []
-        for i in range(start, min(start + line_width, seq_length)):
-            column = alignment[:, i]
-            unique_residues = set(column.replace("-", ""))
-
-            if len(unique_residues) == 1:
-                conservation_line.append("*")
-            elif any(unique_residues <= group for group in strong_groups):
-                conservation_line.append(":")
-            elif any(unique_residues <= group for group in weak_groups):
-                conservation_line.append(".")
-            else:
-                conservation_line.append(" ")
-
-        conservation_line_str = "".join(conservation_line)
-        no_color_output += " " * (name_width + 1) + conservation_line_str + "\n\n"
-        
-        # Update conservation line style to match
-        color_output += f"<pre style='margin: 0; line-height: 1;'><span style='display: inline-block; width: {name_width}ch;'></span> "
-        for symbol in conservation_line_str:
-            color_output += f"<span class='conservation-char'>{symbol}</span>"
-        color_output += "</pre>\n\n"
-
-    return no_color_output, color_output
\ No newline at end of file
+def format_identity_matrix(matrix, sequence_names):
+    """Format a percent identity matrix as the downloadable text table."""
+    header = "Sequence" + " " * 10 + "".join(f"{i + 1:>10}" for i in range(len(sequence_names)))
+    rows = "".join(row + "\n" for row in iter_identity_rows(matrix, sequence_names))
+    return f"Sequence Identity Matrix (%)\n\n{header}\n{rows}"
@@ -0,0 +1,253 @@
+"""Optional k-mer prefilter: cluster similar sequences and align only representatives.
+
+Sequences are clustered greedily, longest first, on compressed-alphabet k-mer
+profiles: a sequence joins the most similar existing representative when
+their estimated identity reaches the threshold, otherwise it becomes a new
+representative. Only representatives go through the chosen engine; members
+are then added back by aligning each one to the profile of the
+representatives' alignment, merging any insertions they introduce. The
+result is an ordinary AlignmentResult, in input order, with members attached
+to their representative in the guide tree.
+"""
+import io
+import os
+import tempfile
+import time
+import numpy as np
+from compact_alignment import GAP_CODE, CompactAlignment
+from profiling import span
+from progressive import (
+    DEFAULT_GAP_EXTEND, DEFAULT_GAP_OPEN, KMER_SIZE,
+    align_columns, encode_sequences, kmer_counts, load_matrix, profile_frequencies,
+)
+
+PREFILTER_VERSION = "1"
+
+# How an engine's run time grows with the number of sequences, used to estimate
+# the savings: ClustalW's pairwise stage is quadratic, the others are dominated
+# by one profile alignment per guide-tree join
+TIME_SCALING = {"ClustalW": 2.0, "MUSCLE": 1.0, "Progressive": 1.0}
+
+
+def kmer_identity(shared, distinct_a, distinct_b, k=KMER_SIZE):
+    """Estimate percent-like identity (0..1) from the number of shared distinct k-mers.
+
+    A k-mer survives only if all k of its residues are conserved, so the
+    shared fraction is roughly identity ** k.
+    """
+    possible = np.maximum(np.minimum.outer(distinct_a, distinct_b), 1)
+    return np.clip(shared / possible, 0.0, 1.0) ** (1.0 / k)
+
+
+def cluster_sequences(sequences, threshold, k=KMER_SIZE, block_size=256):
+    """Greedy, longest-first clustering at estimated identity ``threshold`` (0..1).
+
+    Returns (representatives, rep_of, identity): representative indices in
+    the order they were chosen, the representative of every sequence, and
+    each sequence's estimated identity to it. Each block of ``block_size``
+    sequences is compared against all earlier representatives with a single
+    matrix product of k-mer presence vectors.
+    """
+    counts, lengths = kmer_counts(sequences, k)
+    presence = (counts > 0).astype(np.float32)
+    del counts
+    distinct = presence.sum(axis=1)
+
+    n = len(sequences)
+    rep_of = np.arange(n)
+    identity = np.ones(n)
+    representatives = []
+    rep_presence = np.zeros((0, presence.shape[1]), dtype=np.float32)
+    order = np.argsort(-lengths, kind="stable")
+    for start in range(0, n, block_size):
+        block = order[start:start + block_size]
+        best_rep = np.full(len(block), -1)
+        best_identity = np.zeros(len(block))
+        if representatives:
+            estimate = kmer_identity(presence[block] @ rep_presence.T, distinct[block], distinct[representatives], k)
+            best = estimate.argmax(axis=1)
+            best_identity = estimate[np.arange(len(block)), best]
+            best_rep = np.where(best_identity >= threshold, np.asarray(representatives)[best], -1)
+
+        # Sequences left over are compared with the representatives chosen in this block
+        new_reps = []
+        for position, index in enumerate(block):
+            if best_rep[position] < 0 and new_reps:
+                estimate = kmer_identity((presence[new_reps] @ presence[index])[:, None], distinct[new_reps],
+                                         distinct[index:index + 1], k)[:, 0]
+                if estimate.max() >= threshold:
+                    best_rep[position] = new_reps[int(estimate.argmax())]
+                    best_identity[position] = estimate.max()
+            if best_rep[position] < 0:
+                new_reps.append(index)
+                best_rep[position] = index
+                best_identity[position] = 1.0
+        rep_of[block] = best_rep
+        identity[block] = best_identity
+        representatives.extend(new_reps)
+        rep_presence = np.vstack([rep_presence, presence[new_reps]])
+    return representatives, rep_of, identity
+
+
+def add_to_profile(alignment, sequences, matrix="BLOSUM62",
+                   gap_open=DEFAULT_GAP_OPEN, gap_extend=DEFAULT_GAP_EXTEND):
+    """Align unaligned ``sequences`` to the fixed profile of ``alignment`` (a CompactAlignment).
+
+    Returns the (len(alignment) + len(sequences), L') uint8 matrix of ASCII
+    codes: the original rows first, then the added ones. Residues a new
+    sequence inserts between two profile columns go into insertion columns
+    shared by all added sequences, left-justified, and gaps elsewhere.
+    """
+    return place_on_profile(alignment, sequences, matrix, gap_open, gap_extend)[0]
+
+
+def place_on_profile(alignment, sequences, matrix="BLOSUM62",
+                     gap_open=DEFAULT_GAP_OPEN, gap_extend=DEFAULT_GAP_EXTEND):
+    """Like add_to_profile, but returns (merged, column_position).
+
+    ``column_position[j]`` is the merged column that holds column ``j`` of
+    ``alignment``; every other merged column is an insertion, gapped in all
+    original rows.
+    """
+    alphabet, scores = load_matrix(matrix)
+    profile_block = np.vstack(encode_sequences([alignment.row_string(i) for i in range(len(alignment))], alphabet))
+    profile_scores = profile_frequencies(profile_block, scores.shape[0]) @ scores
+    length = alignment.get_alignment_length()
+
+    # For each added sequence: the profile column of each matched residue, and its insertions
+    placements = []
+    insert_sizes = np.zeros(length + 1, dtype=np.int64)
+    for seq, codes in zip(sequences, encode_sequences(sequences, alphabet)):
+        residues = np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+        cols_profile, cols_seq = align_columns(profile_scores[:, codes], gap_open, gap_extend)
+        matched = (cols_profile >= 0) & (cols_seq >= 0)
+        inserted = cols_profile < 0
+        # Insertion slot = number of profile columns consumed before the inserted residue
+        slots = np.cumsum(cols_profile >= 0)[inserted]
+        slot_sizes = np.bincount(slots, minlength=length + 1)
+        np.maximum(insert_sizes, slot_sizes, out=insert_sizes)
+        offset_in_slot = np.arange(len(slots)) - np.searchsorted(slots, slots)
+        placements.append((cols_profile[matched], residues[cols_seq[matched]],
+                           slots, offset_in_slot, residues[cols_seq[inserted]]))
+
+    # Output position of every profile column and of the start of every insertion slot
+    slot_start = np.arange(length + 1) + np.concatenate([[0], np.cumsum(insert_sizes)[:-1]])
+    column_position = slot_start[:length] + insert_sizes[:length]
+    merged = np.full((len(alignment) + len(sequences), length + int(insert_sizes.sum())), GAP_CODE, dtype=np.uint8)
+    merged[:len(alignment), column_position] = alignment.data
+    for row, (columns, matched_residues, slots, offsets, inserted_residues) in enumerate(placements, len(alignment)):
+        merged[row, column_position[columns]] = matched_residues
+        merged[row, slot_start[slots] + offsets] = inserted_residues
+    return merged, column_position
+
+
+def _attach_members(tree_text, names, members, identity):
+    """Return Newick text where each representative leaf becomes a clade of itself and its members.
+
+    ``names`` maps the leaf names of ``tree_text`` to the representatives' record IDs.
+    """
+    from Bio import Phylo
+    from Bio.Phylo.Newick import Clade
+
+    tree = Phylo.read(io.StringIO(tree_text), "newick")
+    for leaf in tree.get_terminals():
+        leaf.name = names[leaf.name]
+        if members.get(leaf.name):
+            leaf.clades = [Clade(name=leaf.name, branch_length=0.0)] + [
+                Clade(name=name, branch_length=float(1.0 - identity[name])) for name in members[leaf.name]
+            ]
+            leaf.name = None
+    handle = io.StringIO()
+    Phylo.write(tree, handle, "newick")
+    return handle.getvalue().strip()
+
+
+def align_clustered(algorithm, fasta_file, threshold, cache=None, timeout=None):
+    """Cluster ``fasta_file`` at ``threshold``, align representatives with ``algorithm``, add members back.
+
+    Returns an AlignmentResult whose ``prefilter_stats`` reports the reduction
+    factor, stage timings and an estimate of the time saved, or None.
+    """
+    from Bio import SeqIO
+    from alignment import AlignmentResult, run_pipeline
+    from newick import format_newick_string
+
+    records = list(SeqIO.parse(fasta_file, "fasta"))
+    sequences = [str(record.seq).replace("-", "") for record in records]
+    started = time.perf_counter()
+    with span("prefilter.cluster", threshold=threshold):
+        representatives, rep_of, identity = cluster_sequences(sequences, threshold)
+    cluster_time = time.perf_counter() - started
+
+    if len(representatives) < 2 or len(representatives) == len(records):
+        # Nothing to gain (or too few clusters to align): run the engine on everything
+        result = run_pipeline(algorithm, fasta_file, cache=cache, timeout=timeout)
+        if result is not None:
+            result.prefilter_stats = {
+                "input_sequences": len(records),
+                "representatives": len(records),
+                "reduction_factor": 1.0,
+                "cluster_s": cluster_time,
+            }
+        return result
+
+    representatives = sorted(representatives)
+    # The engine sees representatives as r<position>, so its rows and tree leaves map back by
+    # position whatever the record IDs are (ClustalW truncates long names)
+    position_of = {f"r{position}": position for position in range(len(representatives))}
+    with tempfile.NamedTemporaryFile("w", suffix=".fasta", delete=False) as reps_fasta:
+        for name, position in position_of.items():
+            reps_fasta.write(f">{name}\n{sequences[representatives[position]]}\n")
+    try:
+        started = time.perf_counter()
+        reps_result = run_pipeline(algorithm, reps_fasta.name, cache=cache, timeout=timeout)
+        align_time = time.perf_counter() - started
+    finally:
+        os.remove(reps_fasta.name)
+    if reps_result is None:
+        return None
+
+    started = time.perf_counter()
+    with span("prefilter.add_members"):
+        reps_alignment = reps_result.alignment
+        if sorted(reps_alignment.ids) != sorted(position_of):
+            print(f"Error: {algorithm} did not return every cluster representative under its name; "
+                  f"cannot add the cluster members back.")
+            return None
+        members = [i for i in range(len(records)) if rep_of[i] != i]
+        merged = add_to_profile(reps_alignment, [sequences[i] for i in members])
+        rows = np.empty(len(records), dtype=np.int64)
+        for row, name in enumerate(reps_alignment.ids):
+            rows[representatives[position_of[name]]] = row
+        rows[members] = len(reps_alignment) + np.arange(len(members))
+        alignment = CompactAlignment(merged[rows], [record.id for record in records],
+                                     [record.description for record in records])
+    add_time = time.perf_counter() - started
+
+    tree_text = None
+    if reps_result.tree_text:
+        member_names = {}
+        for i in members:
+            member_names.setdefault(records[rep_of[i]].id, []).append(records[i].id)
+        names = {name: records[representatives[position]].id for name, position in position_of.items()}
+        tree_text = format_newick_string(_attach_members(
+            reps_result.tree_text, names, member_names, {records[i].id: identity[i] for i in members}
+        ))
+
+    result = AlignmentResult(algorithm, alignment, format(alignment.to_alignment(), reps_result.alignment_format),
+                             reps_result.alignment_format, tree_text=tree_text,
+                             guide_tree_source=(f"{reps_result.guide_tree_source}, over cluster representatives"
+                                                if tree_text and reps_result.guide_tree_source else None))
+    reduction = len(records) / len(representatives)
+    estimated_full_time = align_time * reduction ** TIME_SCALING.get(algorithm, 1.0)
+    result.prefilter_stats = {
+        "input_sequences": len(records),
+        "representatives": len(representatives),
+        "reduction_factor": reduction,
+        "cluster_s": cluster_time,
+        "align_s": align_time,
+        "add_members_s": add_time,
+        "estimated_full_align_s": estimated_full_time,
+        "estimated_saved_s": estimated_full_time - (cluster_time + align_time + add_time),
+    }
+    return result
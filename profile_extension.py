@@ -0,0 +1,120 @@
+"""Add new sequences to an existing alignment without realigning it.
+
+Each new sequence is aligned to the fixed profile of the existing alignment
+(prefilter.place_on_profile); residues it inserts go into new columns that
+are gaps in every existing row. Because identity only counts columns where
+both rows have residues, such columns leave the existing identities
+unchanged: only the new rows of the identity matrix are computed, and the
+column profile behind the conservation scores only counts the new rows.
+The same holds for the similarity matrix; the sum-of-pairs score is
+recomputed from the extended column profile.
+
+    extension = extend_alignment_file("family.aln", "clustal", "new.fasta")
+    extension["alignment_text"], extension["metrics"]["identity_matrix"]
+"""
+import numpy as np
+from benchmark import create_identity_matrix, identity_rows
+from column_profile import ColumnProfile
+from compact_alignment import CompactAlignment
+from prefilter import place_on_profile
+from profiling import span
+from similarity import DEFAULT_MATRIX, column_sp_scores, similarity_matrix_from_encoded, similarity_rows
+
+
+def extend_alignment(alignment, records, identity_matrix=None, profile=None, algorithm="Profile extension",
+                     similarity_matrix=None, matrix=DEFAULT_MATRIX):
+    """Append unaligned SeqRecords to ``alignment`` (a CompactAlignment or MultipleSeqAlignment).
+
+    ``identity_matrix`` and ``similarity_matrix`` (N x N, nested lists or
+    arrays; similarity by ``matrix``) and ``profile`` (a ColumnProfile) of the
+    existing alignment are reused when given, otherwise computed. Returns a dict with the extended ``alignment``, its
+    ``column_profile`` and ``conservation_scores``, ``metrics`` in the format
+    of benchmark.evaluate_records and the number of ``inserted_columns``.
+    Raises ValueError for duplicate IDs or empty sequences.
+    """
+    alignment = CompactAlignment.coerce(alignment)
+    records = list(records)
+    sequences = [str(record.seq).replace("-", "").upper() for record in records]
+    new_ids = [record.id for record in records]
+    duplicates = sorted(set(new_ids) & set(alignment.ids) | {i for i in new_ids if new_ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Sequence IDs already present: {', '.join(duplicates)}")
+    if not all(sequences):
+        raise ValueError("Cannot add empty sequences")
+
+    num_existing = len(alignment)
+    with span("extend.align_to_profile", added=len(records)):
+        merged, column_position = place_on_profile(alignment, sequences)
+    extended = CompactAlignment(merged, alignment.ids + new_ids,
+                                alignment.descriptions + [record.description for record in records])
+
+    with span("extend.identity"):
+        if identity_matrix is None:
+            identity = create_identity_matrix(extended)
+        else:
+            identity = np.empty((len(extended), len(extended)))
+            identity[:num_existing, :num_existing] = identity_matrix
+            added_rows = identity_rows(merged, num_existing, len(extended))
+            identity[num_existing:] = added_rows
+            identity[:num_existing, num_existing:] = added_rows[:, :num_existing].T
+
+    with span("extend.similarity"):
+        if similarity_matrix is None:
+            similarity = similarity_matrix_from_encoded(merged, matrix)
+        else:
+            similarity = np.empty((len(extended), len(extended)))
+            similarity[:num_existing, :num_existing] = similarity_matrix
+            added_rows = similarity_rows(merged, num_existing, len(extended), matrix)
+            similarity[num_existing:] = added_rows
+            similarity[:num_existing, num_existing:] = added_rows[:, :num_existing].T
+
+    with span("extend.column_profile"):
+        if profile is None:
+            profile = ColumnProfile.from_encoded(merged)
+        else:
+            profile = profile.extend(column_position, merged[num_existing:])
+
+    return {
+        "alignment": extended,
+        "column_profile": profile,
+        "conservation_scores": profile.conservation_scores(),
+        "inserted_columns": merged.shape[1] - alignment.get_alignment_length(),
+        "metrics": {
+            "algorithm": algorithm,
+            "total_sequences": len(extended),
+            "total_length": extended.get_alignment_length(),
+            "gap_count": int(profile.gap_counts.sum()),
+            "identity_matrix": identity.tolist(),
+            "similarity_matrix": similarity.tolist(),
+            "substitution_matrix": matrix,
+            "sp_score": float(column_sp_scores(profile, matrix).sum()),
+            "sequence_names": list(extended.ids),
+        },
+    }
+
+
+def extend_alignment_file(alignment_file, alignment_format, fasta_file, previous_metrics=None):
+    """Extend an aligned file (e.g. run_clustalw's Clustal or run_muscle's FASTA output) with a FASTA file.
+
+    ``previous_metrics`` is a dict with ``sequence_names`` and
+    ``identity_matrix`` (evaluate_records output, or the JSON matrix written
+    by ``msa align --matrix json``), and optionally ``similarity_matrix``; its
+    matrices are reused when the names match the alignment. Returns extend_alignment's dict plus ``alignment_text`` in
+    ``alignment_format``.
+    """
+    from Bio import AlignIO, SeqIO
+
+    with span("alignio.parse", format=alignment_format):
+        alignment = CompactAlignment.from_records(AlignIO.read(alignment_file, alignment_format))
+    identity_matrix = similarity_matrix = None
+    if previous_metrics is not None:
+        if list(previous_metrics["sequence_names"]) == alignment.ids:
+            identity_matrix = previous_metrics["identity_matrix"]
+            if previous_metrics.get("substitution_matrix", DEFAULT_MATRIX) == DEFAULT_MATRIX:
+                similarity_matrix = previous_metrics.get("similarity_matrix")
+        else:
+            print("Warning: identity matrix does not match the alignment's sequences; recomputing it")
+    extension = extend_alignment(alignment, SeqIO.parse(fasta_file, "fasta"), identity_matrix,
+                                 similarity_matrix=similarity_matrix)
+    extension["alignment_text"] = format(extension["alignment"].to_alignment(), alignment_format)
+    return extension
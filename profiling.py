@@ -0,0 +1,142 @@
+"""Lightweight per-request timing spans with an optional cProfile hook.
+
+Library code wraps each pipeline stage in ``span("stage")`` (or decorates it
+with ``@timed("stage")``). Spans are recorded into the Recorder activated for
+the current request, and are a cheap no-op when none is active:
+
+    with request("alignment", profile=True) as recorder:
+        run_alignment(...)
+    print(recorder.breakdown())
+    recorder.export_json("timings.json")
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("msa_recorder", default=None)
+# Span nesting depth, per context so that concurrent tasks and threads do not share it
+_depth = contextvars.ContextVar("msa_span_depth", default=0)
+
+
+class Recorder:
+    """Collects timed spans for one request, and optionally a cProfile run."""
+
+    def __init__(self, name="request", profile=False):
+        self.name = name
+        self.spans = []
+        self.created = time.time()
+        self._origin = time.perf_counter()
+        self.profiler = cProfile.Profile() if profile else None
+
+    def add(self, name, start, duration, depth, attrs):
+        self.spans.append({
+            "name": name,
+            "start_ms": (start - self._origin) * 1000,
+            "duration_ms": duration * 1000,
+            "depth": depth,
+            **attrs,
+        })
+
+    def breakdown(self):
+        """Return per-stage totals, ordered by first occurrence: [{stage, calls, total_ms}]."""
+        totals = {}
+        for entry in self.spans:
+            stage = totals.setdefault(entry["name"], {"stage": entry["name"], "calls": 0, "total_ms": 0.0})
+            stage["calls"] += 1
+            stage["total_ms"] += entry["duration_ms"]
+        return list(totals.values())
+
+    def profile_stats(self, limit=25, sort="cumulative"):
+        """Return the top of the cProfile report as text, or None if profiling is off."""
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "created": self.created,
+            "spans": self.spans,
+            "breakdown": self.breakdown(),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+
+def current_recorder():
+    return _current.get()
+
+
+def start(name="request", profile=None):
+    """Create a Recorder, make it current and start its profiler.
+
+    ``profile`` defaults to the MSA_PROFILE environment variable. Use this
+    where a ``with request(...)`` block is impractical, such as the top of a
+    script that cannot hold a ``with`` block, and call ``stop()`` before
+    reading profile_stats(); ``stop()`` does not reset the current recorder,
+    so prefer ``request()`` wherever the run can end early.
+    """
+    if profile is None:
+        profile = os.environ.get("MSA_PROFILE", "") not in ("", "0")
+    recorder = Recorder(name, profile=profile)
+    recorder._token = _current.set(recorder)
+    if recorder.profiler:
+        recorder.profiler.enable()
+    return recorder
+
+
+def stop(recorder):
+    if recorder.profiler:
+        recorder.profiler.disable()
+
+
+@contextmanager
+def request(name="request", profile=None):
+    """Record every span of one request."""
+    recorder = start(name, profile)
+    try:
+        yield recorder
+    finally:
+        stop(recorder)
+        _current.reset(recorder._token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as stage ``name`` in the active recorder, if any."""
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+        recorder.add(name, start, time.perf_counter() - start, depth, attrs)
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,320 @@
+"""Built-in progressive multiple sequence aligner (no external binaries).
+
+Pipeline: compressed-alphabet k-mer distances -> UPGMA or NJ guide tree ->
+profile-profile Gotoh alignment with BLOSUM62 and affine gaps, merging
+profiles bottom-up along the guide tree.
+"""
+import re
+import numpy as np
+from profiling import span
+
+ENGINE_VERSION = "2"
+
+GAP = 255
+NEG_INF = -1e18
+
+# Dayhoff six-letter alphabet used for k-mer counting
+COMPRESSED_ALPHABET = ["AGPST", "C", "DENQ", "HKR", "ILMV", "FWY"]
+KMER_SIZE = 4
+
+DEFAULT_GAP_OPEN = 10.0
+DEFAULT_GAP_EXTEND = 0.5
+
+_matrices = {}
+
+
+def load_matrix(name="BLOSUM62"):
+    """Return (alphabet, scores) for a Biopython substitution matrix, cached per name."""
+    if name not in _matrices:
+        from Bio.Align import substitution_matrices
+        matrix = substitution_matrices.load(name)
+        _matrices[name] = (matrix.alphabet, np.array(matrix, dtype=np.float64))
+    return _matrices[name]
+
+
+def symbol_lookup(alphabet, gap=GAP, gap_symbols="-."):
+    """256-entry table of uint8 indices into ``alphabet`` by ASCII code; ``gap_symbols`` map to ``gap``, unknown letters to 'X'."""
+    lookup = np.full(256, alphabet.index("X") if "X" in alphabet else 0, dtype=np.uint8)
+    for index, letter in enumerate(alphabet):
+        lookup[ord(letter)] = index
+        lookup[ord(letter.lower())] = index
+    for symbol in gap_symbols:
+        lookup[ord(symbol)] = gap
+    return lookup
+
+
+def encode_sequences(sequences, alphabet):
+    """Encode strings as uint8 indices into ``alphabet``; '-' becomes GAP, unknown letters 'X'."""
+    lookup = symbol_lookup(alphabet)
+    return [lookup[np.frombuffer(str(seq).encode("ascii", "replace"), dtype=np.uint8)] for seq in sequences]
+
+
+def kmer_counts(sequences, k=KMER_SIZE):
+    """Return an (N, 6**k) matrix of compressed-alphabet k-mer counts, and sequence lengths."""
+    lookup = np.full(256, 255, dtype=np.uint8)
+    for group_index, group in enumerate(COMPRESSED_ALPHABET):
+        for letter in group:
+            lookup[ord(letter)] = lookup[ord(letter.lower())] = group_index
+    size = len(COMPRESSED_ALPHABET)
+
+    counts = np.zeros((len(sequences), size ** k), dtype=np.int32)
+    lengths = np.zeros(len(sequences), dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        codes = lookup[np.frombuffer(str(seq).replace("-", "").encode("ascii", "replace"), dtype=np.uint8)]
+        codes = codes[codes != 255].astype(np.int64)
+        lengths[row] = len(codes)
+        if len(codes) < k:
+            continue
+        kmers = np.zeros(len(codes) - k + 1, dtype=np.int64)
+        for offset in range(k):
+            kmers = kmers * size + codes[offset:len(codes) - k + 1 + offset]
+        counts[row] = np.bincount(kmers, minlength=size ** k)
+    return counts, lengths
+
+
+def shared_kmer_counts(counts):
+    """Return the (N, N) matrix of shared k-mers, sum(min(counts[i], counts[j])), as matrix products.
+
+    sum_t min(a_t, b_t) equals the number of (t, v) with a_t >= v and b_t >= v,
+    so each count level v contributes one product of 0/1 matrices, restricted
+    to the k-mers still present at that level. The products run in BLAS and
+    use every core.
+    """
+    shared = np.zeros((len(counts), len(counts)))
+    level = 1
+    while counts.shape[1]:
+        present = counts >= level
+        keep = present.any(axis=0)
+        # Later levels only need the k-mers that reach this one
+        counts, present = counts[:, keep], present[:, keep].astype(np.float32)
+        # float32 sums of 0/1 products are exact below 2**24 k-mers per pair
+        shared += present @ present.T
+        level += 1
+    return shared
+
+
+def kmer_distance_matrix(sequences, k=KMER_SIZE):
+    """Fractional common k-mer distance (1 - shared / possible) between every pair of sequences."""
+    counts, lengths = kmer_counts(sequences, k)
+    shared = shared_kmer_counts(counts)
+    possible = np.maximum(np.minimum.outer(lengths, lengths) - k + 1, 1)
+    distances = np.clip(1.0 - shared / possible, 0.0, 1.0)
+    np.fill_diagonal(distances, 0.0)
+    return distances
+
+
+def upgma(distances):
+    """Build a UPGMA tree. Returns a list of (left, right, left_length, right_length) joins.
+
+    Leaves are numbered 0..N-1 and the i-th join creates node N + i.
+    """
+    n = len(distances)
+    dist = distances.astype(np.float64).copy()
+    np.fill_diagonal(dist, np.inf)
+    sizes = np.ones(n)
+    heights = np.zeros(n)
+    node_ids = list(range(n))
+    active = np.ones(n, dtype=bool)
+    joins = []
+
+    for step in range(n - 1):
+        masked = np.where(active[:, None] & active[None, :], dist, np.inf)
+        i, j = np.unravel_index(np.argmin(masked), masked.shape)
+        height = dist[i, j] / 2
+        joins.append((node_ids[i], node_ids[j], max(height - heights[i], 0.0), max(height - heights[j], 0.0)))
+
+        merged = (dist[i] * sizes[i] + dist[j] * sizes[j]) / (sizes[i] + sizes[j])
+        dist[i, :] = dist[:, i] = merged
+        dist[i, i] = np.inf
+        sizes[i] += sizes[j]
+        heights[i] = height
+        node_ids[i] = n + step
+        active[j] = False
+    return joins
+
+
+def neighbor_joining(distances):
+    """Build a neighbor-joining tree, returned in the same join format as upgma()."""
+    n = len(distances)
+    dist = distances.astype(np.float64).copy()
+    node_ids = list(range(n))
+    active = np.ones(n, dtype=bool)
+    joins = []
+
+    for step in range(n - 1):
+        idx = np.flatnonzero(active)
+        m = len(idx)
+        sub = dist[np.ix_(idx, idx)]
+        if m == 2:
+            a, b = idx
+            joins.append((node_ids[a], node_ids[b], sub[0, 1] / 2, sub[0, 1] / 2))
+            break
+        totals = sub.sum(axis=1)
+        q = (m - 2) * sub - totals[:, None] - totals[None, :]
+        np.fill_diagonal(q, np.inf)
+        qi, qj = np.unravel_index(np.argmin(q), q.shape)
+        a, b = idx[qi], idx[qj]
+        length_a = sub[qi, qj] / 2 + (totals[qi] - totals[qj]) / (2 * (m - 2))
+        length_b = sub[qi, qj] - length_a
+        joins.append((node_ids[a], node_ids[b], max(length_a, 0.0), max(length_b, 0.0)))
+
+        merged = (dist[a] + dist[b] - dist[a, b]) / 2
+        dist[a, :] = dist[:, a] = merged
+        dist[a, a] = 0.0
+        node_ids[a] = n + step
+        active[b] = False
+    return joins
+
+
+def joins_to_newick(joins, names):
+    """Render a join list as a Newick string."""
+    labels = {i: re.sub(r"[\s:;,()\[\]]", "_", name) for i, name in enumerate(names)}
+    if not joins:
+        return f"{labels[0]};" if labels else ";"
+    n = len(names)
+    for step, (left, right, left_length, right_length) in enumerate(joins):
+        labels[n + step] = f"({labels.pop(left)}:{left_length:.5f},{labels.pop(right)}:{right_length:.5f})"
+    return labels[n + len(joins) - 1] + ";"
+
+
+def profile_frequencies(block, alphabet_size):
+    """Return the (L, alphabet_size) residue frequencies of an encoded block; gaps count as zero."""
+    freqs = np.zeros((block.shape[1], alphabet_size))
+    for code in np.unique(block):
+        if code != GAP:
+            freqs[:, code] = (block == code).sum(axis=0)
+    return freqs / block.shape[0]
+
+
+def align_profiles(block_a, block_b, scores, gap_open=DEFAULT_GAP_OPEN, gap_extend=DEFAULT_GAP_EXTEND):
+    """Align two encoded blocks with profile-profile Gotoh DP and return the merged block.
+
+    Column scores are the expected substitution score between the two
+    profiles (one matrix product).
+    """
+    size = scores.shape[0]
+    column_scores = profile_frequencies(block_a, size) @ scores @ profile_frequencies(block_b, size).T
+    cols_a, cols_b = align_columns(column_scores, gap_open, gap_extend)
+    merged = np.full((block_a.shape[0] + block_b.shape[0], len(cols_a)), GAP, dtype=np.uint8)
+    merged[:block_a.shape[0], cols_a >= 0] = block_a[:, cols_a[cols_a >= 0]]
+    merged[block_a.shape[0]:, cols_b >= 0] = block_b[:, cols_b[cols_b >= 0]]
+    return merged
+
+
+def align_columns(column_scores, gap_open=DEFAULT_GAP_OPEN, gap_extend=DEFAULT_GAP_EXTEND):
+    """Gotoh global alignment over an (len_a, len_b) column score matrix.
+
+    Returns (cols_a, cols_b): for each output column, the aligned column of
+    each side, or -1 for a gap. The recurrences are evaluated a row at a
+    time, with the horizontal gap state solved by a running-max scan.
+    """
+    len_a, len_b = column_scores.shape
+
+    # Trace pointers: which state (0=M, 1=X, 2=Y) each cell came from
+    trace_m = np.zeros((len_a + 1, len_b + 1), dtype=np.uint8)
+    trace_x = np.zeros((len_a + 1, len_b + 1), dtype=np.uint8)
+    trace_y = np.zeros((len_a + 1, len_b + 1), dtype=np.uint8)
+
+    steps = np.arange(len_b + 1, dtype=np.float64)
+    # Row 0: only horizontal gaps are possible
+    m_row = np.full(len_b + 1, NEG_INF)
+    m_row[0] = 0.0
+    x_row = np.full(len_b + 1, NEG_INF)
+    y_row = np.full(len_b + 1, NEG_INF)
+    y_row[1:] = -gap_open - gap_extend * (steps[1:] - 1)
+    trace_y[0, 2:] = 2
+
+    for i in range(1, len_a + 1):
+        # M: diagonal move from any state of the previous row
+        prev = np.stack([m_row[:-1], x_row[:-1], y_row[:-1]])
+        new_m = np.full(len_b + 1, NEG_INF)
+        new_m[1:] = column_scores[i - 1] + prev.max(axis=0)
+        trace_m[i, 1:] = prev.argmax(axis=0)
+
+        # X: vertical move (gap in B)
+        candidates = np.stack([m_row - gap_open, x_row - gap_extend, y_row - gap_open])
+        new_x = candidates.max(axis=0)
+        trace_x[i] = candidates.argmax(axis=0)
+
+        # Y: horizontal move (gap in A), a running max over the row
+        best = np.maximum(new_m, new_x)
+        opened = best - gap_open + gap_extend * steps
+        new_y = np.full(len_b + 1, NEG_INF)
+        new_y[1:] = np.maximum.accumulate(opened[:-1]) - gap_extend * steps[:-1]
+        y_candidates = np.stack([new_m[:-1] - gap_open, new_x[:-1] - gap_open, new_y[:-1] - gap_extend])
+        trace_y[i, 1:] = y_candidates.argmax(axis=0)
+
+        m_row, x_row, y_row = new_m, new_x, new_y
+
+    # Traceback into aligned column indices (-1 marks a gap column)
+    state = int(np.argmax([m_row[-1], x_row[-1], y_row[-1]]))
+    i, j = len_a, len_b
+    cols_a, cols_b = [], []
+    while i > 0 or j > 0:
+        if i == 0:
+            state = 2
+        elif j == 0:
+            state = 1
+        if state == 0:
+            cols_a.append(i - 1)
+            cols_b.append(j - 1)
+            state = trace_m[i, j]
+            i, j = i - 1, j - 1
+        elif state == 1:
+            cols_a.append(i - 1)
+            cols_b.append(-1)
+            state = trace_x[i, j]
+            i -= 1
+        else:
+            cols_a.append(-1)
+            cols_b.append(j - 1)
+            state = trace_y[i, j]
+            j -= 1
+
+    return np.array(cols_a[::-1], dtype=np.int64), np.array(cols_b[::-1], dtype=np.int64)
+
+
+def progressive_align(records, tree_method="upgma", matrix="BLOSUM62",
+                      gap_open=DEFAULT_GAP_OPEN, gap_extend=DEFAULT_GAP_EXTEND):
+    """Align sequence records progressively. Returns (MultipleSeqAlignment, newick string).
+
+    The output keeps the input record order and residue letters; letters
+    outside the matrix alphabet are scored as 'X' but written back unchanged.
+    """
+    from Bio.Align import MultipleSeqAlignment
+    from Bio.Seq import Seq
+    from Bio.SeqRecord import SeqRecord
+
+    records = list(records)
+    sequences = [str(record.seq).replace("-", "").replace(".", "") for record in records]
+    alphabet, scores = load_matrix(matrix)
+
+    with span("progressive.kmer_distances"):
+        distances = kmer_distance_matrix(sequences)
+    with span("progressive.guide_tree", method=tree_method):
+        joins = upgma(distances) if tree_method == "upgma" else neighbor_joining(distances)
+
+    # Each node holds (row indices into records, encoded block)
+    nodes = {i: ([i], code[None, :]) for i, code in enumerate(encode_sequences(sequences, alphabet))}
+    n = len(records)
+    with span("progressive.profile_alignment"):
+        for step, (left, right, _, _) in enumerate(joins):
+            rows_a, block_a = nodes.pop(left)
+            rows_b, block_b = nodes.pop(right)
+            nodes[n + step] = (rows_a + rows_b, align_profiles(block_a, block_b, scores, gap_open, gap_extend))
+
+    (rows, block), = nodes.values()
+    # The codes only drive scoring: put the input bytes back at the non-gap positions, row by row
+    residues = [np.frombuffer(sequences[i].encode("ascii", "replace"), dtype=np.uint8) for i in rows]
+    letters = np.full(block.shape, ord("-"), dtype=np.uint8)
+    letters[block != GAP] = np.concatenate(residues)
+    aligned = [None] * n
+    for row, record_index in enumerate(rows):
+        record = records[record_index]
+        aligned[record_index] = SeqRecord(
+            Seq(letters[row].tobytes().decode()), id=record.id, description=record.description
+        )
+
+    newick = joins_to_newick(joins, [record.id for record in records])
+    return MultipleSeqAlignment(aligned), newick
+
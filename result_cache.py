@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "MSA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "msa_result_cache")
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+ALIGNMENT_FORMATS = {"ClustalW": "clustal", "MUSCLE": "fasta", "Progressive": "fasta"}
+TOOLS_BY_ALGORITHM = {"ClustalW": ["ClustalW"], "MUSCLE": ["MUSCLE", "FastTree"], "Progressive": []}
+# Version of the derived metrics stored with each entry; bump it whenever
+# benchmark.evaluate_records changes, so metrics written by older code are recomputed
+METRICS_VERSION = "3"
+
+
+def normalize_sequences(fasta_file):
+    """Return a canonical text form of a FASTA file: one header and uppercase sequence per record."""
+    from Bio import SeqIO
+
+    parts = []
+    for record in SeqIO.parse(fasta_file, "fasta"):
+        sequence = "".join(str(record.seq).split()).upper()
+        parts.append(f">{record.description.strip()}\n{sequence}\n")
+    return "".join(parts)
+
+
+def binary_version(executable):
+    """Identify an executable by its resolved path, size and modification time."""
+    path = shutil.which(executable) or executable
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f"{executable}:missing"
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+class ResultCache:
+    """On-disk cache of alignment results keyed on input content, algorithm and binary version.
+
+    Each entry is a directory holding the aligner output, the formatted guide
+    tree and a meta.json with derived metrics. Entries are evicted least
+    recently used first once the cache grows beyond ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, fasta_file, algorithm, cluster_threshold=None):
+        """Compute the cache key of a job from its normalized input, tool versions and prefilter setting."""
+        from alignment import get_executable
+
+        digest = hashlib.sha256()
+        digest.update(algorithm.encode())
+        for tool in TOOLS_BY_ALGORITHM.get(algorithm, []):
+            digest.update(b"\0" + binary_version(get_executable(tool)).encode())
+        if algorithm == "Progressive":
+            from progressive import ENGINE_VERSION
+            digest.update(b"\0progressive-" + ENGINE_VERSION.encode())
+        if algorithm == "ClustalW":
+            from clustalw import PIPELINE_VERSION, guide_tree_method
+            digest.update(f"\0clustalw-{PIPELINE_VERSION}-{guide_tree_method()}".encode())
+        if cluster_threshold is not None:
+            from prefilter import PREFILTER_VERSION
+            digest.update(f"\0cluster-{PREFILTER_VERSION}-{cluster_threshold:g}".encode())
+        digest.update(b"\0" + normalize_sequences(fasta_file).encode())
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, key):
+        meta_file = os.path.join(self._entry_dir(key), "meta.json")
+        try:
+            with open(meta_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        meta_file = os.path.join(self._entry_dir(key), "meta.json")
+        with open(meta_file + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_file + ".tmp", meta_file)
+
+    def load(self, key):
+        """Return the cached entry for ``key`` as in-memory text, or None, counting hits and misses.
+
+        The returned dict holds ``alignment_text``, ``tree_text`` (or None),
+        ``format``, ``metrics`` and ``guide_tree_source`` (or None).
+        """
+        meta = self._read_meta(key)
+        if meta is None:
+            self.misses += 1
+            return None
+
+        entry_dir = self._entry_dir(key)
+        os.utime(os.path.join(entry_dir, "meta.json"))
+        self.hits += 1
+
+        with open(os.path.join(entry_dir, "alignment.aln"), "r") as f:
+            alignment_text = f.read()
+        tree_text = None
+        if meta.get("has_tree"):
+            with open(os.path.join(entry_dir, "guide_tree.dnd"), "r") as f:
+                tree_text = f.read()
+        return {"format": meta["format"], "metrics": _metrics_of(meta),
+                "alignment_text": alignment_text, "tree_text": tree_text,
+                "guide_tree_source": meta.get("guide_tree_source")}
+
+    def put(self, key, algorithm, alignment_file=None, guide_tree_file=None, metrics=None,
+            alignment_text=None, tree_text=None, guide_tree_source=None):
+        """Store an alignment result and evict old entries if the cache is over budget.
+
+        The alignment and tree can be given either as file paths or as text;
+        ``guide_tree_source`` is AlignmentResult.guide_tree_source.
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        if alignment_text is not None:
+            with open(os.path.join(entry_dir, "alignment.aln"), "w") as f:
+                f.write(alignment_text)
+        else:
+            shutil.copyfile(alignment_file, os.path.join(entry_dir, "alignment.aln"))
+        has_tree = bool(tree_text) or bool(guide_tree_file and os.path.exists(guide_tree_file))
+        if tree_text:
+            with open(os.path.join(entry_dir, "guide_tree.dnd"), "w") as f:
+                f.write(tree_text)
+        elif has_tree:
+            shutil.copyfile(guide_tree_file, os.path.join(entry_dir, "guide_tree.dnd"))
+        self._write_meta(key, {
+            "algorithm": algorithm,
+            "format": ALIGNMENT_FORMATS.get(algorithm, "fasta"),
+            "has_tree": has_tree,
+            "guide_tree_source": guide_tree_source,
+            "metrics": metrics,
+            "metrics_version": METRICS_VERSION,
+        })
+        self.evict()
+
+    def get_metrics(self, key):
+        """Return cached derived metrics for ``key`` without touching hit counters.
+
+        Metrics stored under another METRICS_VERSION count as missing.
+        """
+        meta = self._read_meta(key)
+        return _metrics_of(meta) if meta else None
+
+    def put_metrics(self, key, metrics):
+        """Attach derived metrics (JSON-serializable) to an existing entry."""
+        meta = self._read_meta(key)
+        if meta is not None:
+            meta["metrics"] = metrics
+            meta["metrics_version"] = METRICS_VERSION
+            self._write_meta(key, meta)
+
+    def invalidate(self, key):
+        """Remove a single entry. Returns True if it existed."""
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return False
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return True
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        for key in os.listdir(self.cache_dir):
+            self.invalidate(key)
+        self.hits = self.misses = 0
+
+    def _entries(self):
+        """Yield (last_access, size, key) for every entry in the cache."""
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            meta_file = os.path.join(entry_dir, "meta.json")
+            if not os.path.exists(meta_file):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+            yield os.path.getmtime(meta_file), size, key
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in ``max_bytes``."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.invalidate(key)
+            total -= size
+
+    def stats(self):
+        """Return hit/miss counters and current cache usage."""
+        entries = list(self._entries())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _metrics_of(meta):
+    if meta.get("metrics_version") != METRICS_VERSION:
+        return None
+    return meta.get("metrics")
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """Return the process-wide cache shared by run_alignment callers."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
@@ -0,0 +1,105 @@
+"""Substitution-matrix similarity and sum-of-pairs scores of an encoded alignment.
+
+Residues are mapped to substitution matrix indices (BLOSUM62, PAM250 or any
+other matrix Biopython ships) with a 256-entry lookup table applied to the
+CompactAlignment buffer. Pairwise similarity, the share of compared
+positions whose substitution score is positive, is then counted with one
+matrix product per residue symbol over column tiles, like identity_rows:
+the rows of the substitution matrix are gathered over the tile instead of
+building one mask per symbol pair. Sum-of-pairs scores only need the
+ColumnProfile's per-column counts.
+
+    percent = similarity_matrix_from_encoded(alignment.data, "PAM250")
+    sum_of_pairs_score(alignment, profile=profile)
+"""
+import numpy as np
+from compact_alignment import GAP_CODE, TILE_BYTES, column_tiles
+
+DEFAULT_MATRIX = "BLOSUM62"
+
+_tables = {}
+
+
+def score_table(matrix=DEFAULT_MATRIX):
+    """Return (lookup, scores) for a substitution matrix, cached per name.
+
+    ``lookup`` maps ASCII codes to matrix indices (lowercase like uppercase,
+    unknown characters to 'X', '-' to the gap index K); ``scores`` is
+    the (K + 1, K + 1) float32 matrix with a zero gap row and column.
+    """
+    if matrix not in _tables:
+        from progressive import load_matrix, symbol_lookup
+
+        alphabet, scores = load_matrix(matrix)
+        gap = len(alphabet)
+        # Only GAP_CODE is a gap, as in identity_rows and ColumnProfile
+        lookup = symbol_lookup(alphabet, gap, gap_symbols=chr(GAP_CODE))
+        table = np.zeros((gap + 1, gap + 1), dtype=np.float32)
+        table[:gap, :gap] = scores
+        _tables[matrix] = (lookup, table)
+    return _tables[matrix]
+
+
+def similarity_rows(encoded, start, stop, matrix=DEFAULT_MATRIX, tile_bytes=TILE_BYTES):
+    """Percent similarity of rows ``start``..``stop`` against every row of ``encoded``, as a (stop - start, N) array.
+
+    Positions where either sequence has a gap are not compared, as for
+    identity; ``encoded`` may be a np.memmap.
+    """
+    from benchmark import _round_like_python
+
+    lookup, table = score_table(matrix)
+    gap = len(table) - 1
+    num_rows = encoded.shape[0]
+    totals = np.zeros((stop - start, num_rows))
+    positives = np.zeros_like(totals)
+    positive_table = (table > 0).astype(np.float32)
+    for tile_start, tile_stop in column_tiles(*encoded.shape, tile_bytes):
+        codes = lookup[np.asarray(encoded[:, tile_start:tile_stop])]
+        rows = (codes != gap).astype(np.float32)
+        totals += rows[start:stop] @ rows.T
+        block = codes[start:stop]
+        for symbol in np.unique(block[block != gap]):
+            # Row ``symbol`` of the table, gathered over the tile: 1 where pairing with it scores > 0
+            positives += (block == symbol).astype(np.float32) @ positive_table[symbol][codes].T
+
+    percent = np.zeros_like(positives)
+    compared = totals > 0
+    percent[compared] = positives[compared] / totals[compared] * 100
+    return _round_like_python(percent)
+
+
+def similarity_matrix_from_encoded(encoded, matrix=DEFAULT_MATRIX, block_size=256, out=None):
+    """Percent similarity matrix of an encoded alignment; ``out`` may be a preallocated (N, N) np.memmap."""
+    num_rows = encoded.shape[0]
+    if out is None:
+        out = np.empty((num_rows, num_rows))
+    for start in range(0, num_rows, block_size):
+        stop = min(start + block_size, num_rows)
+        out[start:stop] = similarity_rows(encoded, start, stop, matrix)
+    return out
+
+
+def column_sp_scores(profile, matrix=DEFAULT_MATRIX):
+    """Sum-of-pairs substitution score of every column of a ColumnProfile; pairs with a gap score zero.
+
+    Per column, the score over all sequence pairs is 0.5 * (c.S.c - c.diag(S))
+    for residue counts c, so it is computed from column counts rather than pairs.
+    """
+    lookup, table = score_table(matrix)
+    gap = len(table) - 1
+    counts = np.zeros((len(profile), gap + 1))
+    for index, symbol in enumerate(profile.symbols):
+        counts[:, lookup[ord(symbol)]] += profile.counts[:, index]
+    counts[:, gap] = 0
+    scores = table.astype(np.float64)
+    return 0.5 * (np.einsum("lk,kj,lj->l", counts, scores, counts) - counts @ np.diag(scores))
+
+
+def sum_of_pairs_score(alignment, matrix=DEFAULT_MATRIX, profile=None):
+    """Sum-of-pairs substitution score of an alignment; ``profile`` (its ColumnProfile) is built if not given."""
+    if profile is None:
+        from column_profile import ColumnProfile
+
+        profile = ColumnProfile.from_alignment(alignment)
+    return float(column_sp_scores(profile, matrix).sum())
@@ -1,102 +1,168 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+"""Conservation scores and the app's plots.
+
+Plotting and tree libraries (matplotlib, plotly, Bio.Phylo) are imported
+inside the functions that draw, so importing this module stays cheap and
+they load only when a tab actually renders a figure.
+"""
 import os
-from Bio import Phylo
-import plotly.express as px
 import numpy as np
+from column_profile import ColumnProfile
+from conservation_pyramid import DEFAULT_MAX_POINTS, ConservationPyramid
+from newick import NewickTree, format_newick_string, layout_tree, parse_newick
+from profiling import timed
 
-def calculate_conservation_score(alignment):
+@timed("calculate_conservation_score")
+def calculate_conservation_score(alignment, profile=None, method="groups"):
     """
     Calculate conservation score at each position of the alignment with improved scoring.
+
+    Scores are derived from the alignment's ColumnProfile; pass ``profile`` to
+    reuse one that was already built. ``method`` is one of
+    column_profile.CONSERVATION_METHODS.
     """
-    alignment_array = np.array([list(rec) for rec in alignment])
-    n_positions = alignment_array.shape[1]
-    conservation_scores = []
-
-    # Define amino acid groups for similarity scoring
-    aa_groups = {
-        'hydrophobic': set('AILMFWYV'),
-        'polar': set('STNQ'),
-        'positive': set('RHK'),
-        'negative': set('DE'),
-        'special': set('CGP')
-    }
-
-    for i in range(n_positions):
-        column = alignment_array[:, i]
-        unique_aas, counts = np.unique(column, return_counts=True)
-        
-        # Calculate basic conservation
-        most_common = np.max(counts)
-        basic_score = most_common / len(column)
-        
-        # Add similarity bonus
-        similarity_bonus = 0
-        for group in aa_groups.values():
-            group_count = sum(1 for aa in column if aa in group)
-            if group_count > 1:
-                similarity_bonus += 0.1 * (group_count / len(column))
-        
-        # Penalize gaps
-        gap_penalty = 0.2 * (column == '-').sum() / len(column)
-        
-        # Combine scores
-        final_score = min(1.0, basic_score + similarity_bonus - gap_penalty)
-        conservation_scores.append(final_score)
-
-    return np.array(conservation_scores)
-
-
-
-def plot_guide_tree(guide_tree_file):
-    if not os.path.exists(guide_tree_file):
-        return None
+    if profile is None:
+        profile = ColumnProfile.from_alignment(alignment)
+    return profile.scores(method)
+
+
+
+def _as_newick_tree(guide_tree):
+    """NewickTree from a NewickTree, a Newick file path, Newick text or a Bio.Phylo tree; None if missing."""
+    if isinstance(guide_tree, NewickTree):
+        return guide_tree
+    if isinstance(guide_tree, str):
+        if os.path.exists(guide_tree):
+            with open(guide_tree) as f:
+                return parse_newick(f.read())
+        return parse_newick(guide_tree) if "(" in guide_tree else None
+    return parse_newick(format(guide_tree, "newick"))
+
+
+@timed("plot_guide_tree")
+def plot_guide_tree(guide_tree, collapsed=(), max_labels=300):
+    """Draw a guide tree (see _as_newick_tree for accepted inputs) as a static matplotlib figure.
+
+    All branches are one LineCollection, so drawing time grows linearly with
+    the tree. ``collapsed`` node ids are drawn as triangles; leaf labels are
+    left out when more than ``max_labels`` rows are visible.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection, PolyCollection
 
     try:
-        guide_tree_data = Phylo.read(guide_tree_file, "newick")
-        
-        # Create figure with custom background
-        fig, ax = plt.subplots(figsize=(12, 8))
-        
-        # Set the background colors first
+        tree = _as_newick_tree(guide_tree)
+        if tree is None:
+            return None
+        layout = layout_tree(tree, collapsed)
+        rows = len(layout["tips"])
+        right = max(float(layout["tip_x"].max()), 1e-9)
+
+        # Create figure with custom background, taller for more leaves
+        fig, ax = plt.subplots(figsize=(12, min(max(8, rows * 0.3), 80)))
         ax.set_facecolor('#0F1117')  # Dark navy/black background
         fig.patch.set_facecolor('#0F1117')  # Dark navy/black background
-        
-        # Draw the tree
-        Phylo.draw(guide_tree_data, 
-                  axes=ax, 
-                  do_show=False,
-                  label_func=lambda x: x.name,
-                  show_confidence=False)
-        
-        # Force all elements to be white
-        for c in ax.get_children():
-            try:
-                c.set_color('#ffffff')  # Set everything to white
-                if isinstance(c, plt.Line2D):
-                    c.set_linewidth(2)  # Make lines thicker
-                elif isinstance(c, plt.Text):
-                    c.set_fontsize(17)  # Set text size
-            except:
-                continue
-        
-        # Remove axes
+
+        linewidth = 2 if rows <= 100 else 0.5
+        ax.add_collection(LineCollection(layout["segments"], colors='#ffffff', linewidths=linewidth))
+        if len(layout["triangles"]):
+            ax.add_collection(PolyCollection(layout["triangles"], facecolors='#ffffff', edgecolors='#ffffff',
+                                             alpha=0.4, linewidths=linewidth))
+
+        if rows <= max_labels:
+            fontsize = 17 if rows <= 40 else 8
+            offset = right * 0.01
+            for node, tip_x, label in zip(layout["tips"], layout["tip_x"], layout["labels"]):
+                ax.text(tip_x + offset, layout["y"][node], label,
+                        color='#ffffff', fontsize=fontsize, va='center')
+
+        ax.set_xlim(-right * 0.02, right * (1.3 if rows <= max_labels else 1.02))
+        ax.set_ylim(rows - 0.5, -0.5)
         ax.axis('off')
-        
-        # Add title with light color
-        
-        # Adjust layout
         plt.tight_layout()
-        
         return fig
     except Exception as e:
         print(f"Error plotting guide tree: {str(e)}")
         return None
-    
-def plot_plotly_heatmap(conservation_scores):
+
+
+@timed("plot_plotly_tree")
+def plot_plotly_tree(guide_tree, collapsed=(), max_labels=300):
+    """Interactive guide tree: every branch in a single WebGL line trace, leaves as hoverable markers.
+
+    Stays responsive for thousands of leaves; zoom to read labels, which are
+    only drawn as text when at most ``max_labels`` rows are visible.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    tree = _as_newick_tree(guide_tree)
+    if tree is None:
+        return None
+    layout = layout_tree(tree, collapsed)
+    rows = len(layout["tips"])
+
+    def flat(shapes):
+        # Shapes separated by NaN break the line, so one trace draws them all
+        padded = np.concatenate([shapes, np.full((len(shapes), 1, 2), np.nan)], axis=1)
+        return padded[:, :, 0].ravel(), padded[:, :, 1].ravel()
+
+    branch_x, branch_y = flat(layout["segments"])
+    tips = layout["tips"]
+    fig = go.Figure(go.Scattergl(x=branch_x, y=branch_y, mode="lines", line=dict(color="#ffffff", width=1),
+                                 hoverinfo="skip", showlegend=False))
+    if len(layout["triangles"]):
+        # Close each triangle back to its apex before the NaN break
+        triangles = np.concatenate([layout["triangles"], layout["triangles"][:, :1]], axis=1)
+        clade_x, clade_y = flat(triangles)
+        fig.add_trace(go.Scatter(x=clade_x, y=clade_y, mode="lines", fill="toself", hoverinfo="skip",
+                                 line=dict(color="#ffffff", width=1), fillcolor="rgba(255,255,255,0.4)",
+                                 showlegend=False))
+    fig.add_trace(go.Scattergl(x=layout["tip_x"], y=layout["y"][tips], hovertext=layout["labels"],
+                               hoverinfo="text", showlegend=False,
+                               mode="markers+text" if rows <= max_labels else "markers",
+                               text=layout["labels"] if rows <= max_labels else None,
+                               textposition="middle right", textfont=dict(color="#ffffff"),
+                               marker=dict(color="#ffffff", size=4)))
+    fig.update_layout(
+        plot_bgcolor='#0F1117',
+        paper_bgcolor='#0F1117',
+        height=min(max(400, rows * 14), 4000),
+        margin=dict(l=10, r=10, t=10, b=10),
+        dragmode="zoom",
+    )
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False, autorange="reversed")
+    return fig
+
+
+@timed("plot_plotly_heatmap")
+def plot_plotly_heatmap(conservation_scores, col_range=None, smoothing=1, max_points=DEFAULT_MAX_POINTS):
+    """Conservation heatmap of ``col_range`` with at most ``max_points`` (+1) cells per row.
+
+    ``conservation_scores`` is a list of per-column scores or a prebuilt
+    ConservationPyramid (reuse one across reruns; ``smoothing`` only applies
+    when building). Beyond ``max_points`` columns each cell summarises a
+    window of columns and the max, mean and min rows are all shown.
+    """
+    import plotly.express as px
+
+    pyramid = conservation_scores
+    if not isinstance(pyramid, ConservationPyramid):
+        pyramid = ConservationPyramid(conservation_scores, smoothing)
+    start, stop = col_range or (0, pyramid.num_columns)
+    track = pyramid.window(start, stop, max_points)
+    if track["bin_width"] == 1:
+        rows, row_names = [track["mean"]], ["score"]
+    else:
+        rows, row_names = [track["max"], track["mean"], track["min"]], ["max", "mean", "min"]
+
     # Create a more detailed heatmap
     fig = px.imshow(
-        [conservation_scores],
+        rows,
+        x=track["start"],
+        y=row_names,
+        zmin=0,
+        zmax=1,
         color_continuous_scale=[
             [0, 'rgb(255,255,255)'],      # White for low conservation
             [0.3, 'rgb(166,206,227)'],    # Light blue
@@ -106,15 +172,20 @@ def plot_plotly_heatmap(conservation_scores):
         ],
         aspect='auto'
     )
+    fig.update_traces(
+        customdata=np.tile(np.stack([track["start"], track["stop"] - 1], axis=-1), (len(rows), 1, 1)),
+        hovertemplate="Columns %{customdata[0]}–%{customdata[1]}<br>%{y}: %{z:.2f}<extra></extra>",
+    )
 
     # Customize layout
     fig.update_layout(
 
         xaxis_title={
-            'text': "Position in Alignment",
+            'text': "Position in Alignment" if track["bin_width"] == 1
+                    else f"Position in Alignment ({track['bin_width']} columns per cell)",
             'font': dict(size=16)
         },
-        yaxis_showticklabels=False,
+        yaxis_showticklabels=len(rows) > 1,
         # plot_bgcolor='white',
         width=1000,
         height=300,  # Increased height from 250 to 400
@@ -137,7 +208,7 @@ def plot_plotly_heatmap(conservation_scores):
         gridwidth=1,
         gridcolor='lightgrey',
         zeroline=False,
-        dtick=10,
+        dtick=10 if stop - start <= 200 else None,
         showline=False,  # Remove x-axis line
         mirror=False     # Remove mirror effect
     )
@@ -152,23 +223,3 @@ def plot_plotly_heatmap(conservation_scores):
 
 
     return fig
-
-def format_newick_string(newick_str):
-    """Format a Newick tree string to be more readable with indentation."""
-    formatted = ""
-    indent = 0
-    
-    for char in newick_str:
-        if char == '(':
-            formatted += '(\n' + ' ' * (indent + 2)
-            indent += 2
-        elif char == ',':
-            formatted += ',\n' + ' ' * indent
-        elif char == ')':
-            indent -= 2
-            formatted += '\n' + ' ' * indent + ')'
-        else:
-            formatted += char
-            
-    return formatted
-